@@ -4,7 +4,9 @@ from dotenv import load_dotenv
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.models.mistral import MistralModel
+from opentelemetry.trace import Status, StatusCode
 from models import InterviewConfig, COMPANY_PROFILES, INTERVIEWER_PERSONAS
+from telemetry import FALLBACK_DEPTH, MODEL, tracer
 
 load_dotenv()
 
@@ -208,36 +210,40 @@ improvement_agent = Agent(
 )
 
 
-async def run_interview_with_fallback(prompt: str, deps: InterviewConfig):
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+async def _run_with_fallback(kind: str, pool, prompt: str, **run_kwargs):
+    """Try each model of `pool` in order, moving on only for rate limits and server errors."""
     last_exc: Optional[Exception] = None
-    for model_name, agent in INTERVIEW_AGENT_POOL:
-        try:
-            return await agent.run(prompt, deps=deps)
-        except Exception as exc:
-            last_exc = exc
-            if isinstance(exc, ModelHTTPError) and exc.status_code in {429, 500, 502, 503, 504}:
-                print(f"⚠️ Interview model {model_name} failed with status {exc.status_code}, trying next fallback model...")
-                continue
-            raise
-    if last_exc:
-        raise last_exc
-    raise RuntimeError("No interview model available")
+    with tracer.start_as_current_span(f"agent.{kind}") as run_span:
+        for depth, (model_name, agent) in enumerate(pool):
+            with tracer.start_as_current_span(
+                f"agent.{kind}.attempt", attributes={MODEL: model_name, FALLBACK_DEPTH: depth}
+            ) as attempt_span:
+                try:
+                    result = await agent.run(prompt, **run_kwargs)
+                except ModelHTTPError as exc:
+                    if exc.status_code not in _RETRYABLE_STATUS:
+                        raise
+                    last_exc = exc
+                    attempt_span.record_exception(exc)
+                    attempt_span.set_status(Status(StatusCode.ERROR, f"HTTP {exc.status_code}"))
+                    print(f"⚠️ {kind.capitalize()} model {model_name} failed with status {exc.status_code}, trying next fallback model...")
+                    continue
+            run_span.set_attributes({MODEL: model_name, FALLBACK_DEPTH: depth})
+            return result
+        if last_exc:
+            raise last_exc
+        raise RuntimeError(f"No {kind} model available")
+
+
+async def run_interview_with_fallback(prompt: str, deps: InterviewConfig):
+    return await _run_with_fallback("interview", INTERVIEW_AGENT_POOL, prompt, deps=deps)
 
 
 async def run_feedback_with_fallback(prompt: str):
-    last_exc: Optional[Exception] = None
-    for model_name, agent in FEEDBACK_AGENT_POOL:
-        try:
-            return await agent.run(prompt)
-        except Exception as exc:
-            last_exc = exc
-            if isinstance(exc, ModelHTTPError) and exc.status_code in {429, 500, 502, 503, 504}:
-                print(f"⚠️ Feedback model {model_name} failed with status {exc.status_code}, trying next fallback model...")
-                continue
-            raise
-    if last_exc:
-        raise last_exc
-    raise RuntimeError("No feedback model available")
+    return await _run_with_fallback("feedback", FEEDBACK_AGENT_POOL, prompt)
 
 
 def get_panel_interviewer(interviewer_type: str) -> dict:
@@ -1,5 +1,10 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -9,12 +14,41 @@ import os
 
 # Import Beanie models (documents)
 from models import User, UserSettings
+from cache import TTLCache
+from repositories import DuplicateEmail, get_repositories
+from tasks import BackgroundTaskQueue
+from user_stats import empty_stats
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes with a different cost are re-hashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads doing bcrypt work (bcrypt releases the GIL) and how many calls may wait for one.
+# The queue holds a burst of 100+ logins; past it, logins get a 503 with Retry-After.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 128))
+
+# How long an authenticated user is served from memory before re-reading Firestore
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+# Upper bound on how long a decoded token is trusted without re-verifying it
+JWT_CACHE_TTL_SECONDS = int(os.getenv("JWT_CACHE_TTL_SECONDS", 600))
+
+# Registrations whose Firebase Auth record failed (or never ran) are retried this often
+FIREBASE_AUTH_REPAIR_INTERVAL_MINUTES = float(os.getenv("FIREBASE_AUTH_REPAIR_INTERVAL_MINUTES", 15))
+_FIREBASE_AUTH_REPAIR_BATCH = 200
+
+_token_cache = TTLCache(maxsize=10000, ttl=JWT_CACHE_TTL_SECONDS)
+_principal_cache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 security = HTTPBearer(auto_error=False)
 
 
@@ -70,6 +104,97 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification on a small dedicated thread pool so a burst
+    of logins cannot stall the event loop. Calls beyond the queue limit are
+    rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # Only touched on the event loop
+        self._pending = 0
+        # Worker threads update these too, so every access holds the lock
+        self._lock = threading.Lock()
+        self._running = 0
+        self._stats = {
+            "runs": 0, "completed": 0, "failed": 0, "rejected": 0, "rehashed": 0,
+            "wait_ms_total": 0.0, "run_ms_total": 0.0,
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _timed(self, queued_at: float, fn, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._stats["runs"] += 1
+                self._stats["wait_ms_total"] += (started - queued_at) * 1000
+                self._stats["run_ms_total"] += (finished - started) * 1000
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self._count("rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in attempts in progress, please retry",
+                headers={"Retry-After": "2"},
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, self._timed, time.perf_counter(), fn, *args)
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            self._pending -= 1
+        self._count("completed")
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated parameters."""
+        valid, new_hash = await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+        if new_hash:
+            self._count("rehashed")
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            running = self._running
+        runs = stats["runs"] or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queued": max(0, self._pending - running),
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "rejected": stats["rejected"],
+            "rehashed": stats["rehashed"],
+            "avg_wait_ms": round(stats["wait_ms_total"] / runs, 2),
+            "avg_run_ms": round(stats["run_ms_total"] / runs, 2),
+        }
+
+
+password_hasher = PasswordHasher()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -82,76 +207,149 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 
+def _decode_token_subject(token: str) -> Optional[str]:
+    """Verify a JWT and return its subject, skipping verification for recently seen tokens."""
+    cached = _token_cache.get(token)
+    if cached is not None:
+        subject, expires_at = cached
+        if expires_at > time.time():
+            return subject
+        _token_cache.pop(token)
+        return None
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    if subject is None:
+        return None
+
+    expires_at = payload.get("exp") or (time.time() + JWT_CACHE_TTL_SECONDS)
+    ttl = min(JWT_CACHE_TTL_SECONDS, expires_at - time.time())
+    if ttl > 0:
+        _token_cache.set(token, (subject, expires_at), ttl=ttl)
+    return subject
+
+
+async def _get_principal(email: str) -> Optional[User]:
+    user = _principal_cache.get(email)
+    if user is None:
+        user = await get_user_by_email(email=email)
+        if user is None:
+            return None
+        _principal_cache.set(email, user)
+    # Handlers get their own copy so they cannot mutate the cached principal
+    return user.model_copy()
+
+
+def invalidate_cached_user(email: str) -> None:
+    """Drop a user from the auth cache; call after any write to their user document."""
+    _principal_cache.pop(email)
+
+
 async def get_user_by_email(email: str) -> Optional[User]:
-    from db import get_db
-    db = get_db()
-    users_ref = db.collection('users')
-    docs = users_ref.where('email', '==', email).stream()
-    
-    for doc in docs:
-        user_data = doc.to_dict()
-        user_data['id'] = doc.id
-        # Convert created_at to datetime if needed (Firestore timestamp to datetime)
-        # Firestore returns datetime objects, so it should be fine
-        return User(**user_data)
-    
-    return None
+    return await get_repositories().users.get_by_email(email)
 
 
-async def create_user(user_data: UserCreate) -> User:
-    from db import get_db
+def provision_firebase_auth_user(uid: str, email: str, password_hash: str, full_name: Optional[str]) -> None:
+    """
+    Create the Firebase Authentication record (shows up in Console) for a user
+    registered through our API. Blocking; the bcrypt hash is imported so the
+    plaintext password never leaves the request.
+    """
     from firebase_admin import auth
     
-    db = get_db()
-    hashed_password = get_password_hash(user_data.password)
-    
-    # 1. Create user in Firebase Authentication (shows up in Console)
-    try:
-        firebase_user = auth.create_user(
-            email=user_data.email,
+    result = auth.import_users(
+        [auth.ImportUserRecord(
+            uid=uid,
+            email=email,
             email_verified=False,
-            password=user_data.password,
-            display_name=user_data.full_name,
-            disabled=False
+            display_name=full_name,
+            password_hash=password_hash.encode(),
+        )],
+        hash_alg=auth.UserImportHash.bcrypt()
+    )
+    if result.failure_count:
+        raise RuntimeError(f"Firebase Auth import failed: {result.errors[0].reason}")
+    print(f"✅ Created Firebase Auth user: {uid}")
+
+
+class FirebaseAuthQueue(BackgroundTaskQueue):
+    """Creates Firebase Auth records after registration, with retries."""
+
+    def _error_summary(self, exc: Exception) -> str:
+        # Firebase errors can quote the email; dead letters are shown on /api/metrics
+        return type(exc).__name__
+
+
+firebase_auth_queue = FirebaseAuthQueue(workers=2)
+
+
+async def provision_pending_user(uid: str, email: str, password_hash: str, full_name: Optional[str]) -> None:
+    """Create the Auth record and clear the user's firebase_auth_pending flag."""
+    # import_users replaces a record with the same uid, so a retry after a lost reply is harmless
+    await asyncio.to_thread(provision_firebase_auth_user, uid, email, password_hash, full_name)
+    await get_repositories().users.update(uid, {"firebase_auth_pending": False})
+    invalidate_cached_user(email)
+
+
+def _pending_firebase_auth_users(db, limit: int) -> list:
+    query = db.collection("users").where("firebase_auth_pending", "==", True).limit(limit)
+    return [{**doc.to_dict(), "id": doc.id} for doc in query.stream()]
+
+
+async def repair_firebase_auth(fence=None) -> dict:
+    """
+    Scheduled job: queue Auth provisioning for users still flagged as pending
+    (the registration's task was dead-lettered or lost in a restart).
+    """
+    from db import get_db
+
+    db = get_db()
+    if db is None or get_repositories().name != "firestore":
+        return {"queued": 0, "provisioned": 0}
+    pending = await asyncio.to_thread(_pending_firebase_auth_users, db, _FIREBASE_AUTH_REPAIR_BATCH)
+    if fence is not None:
+        await fence()
+    results = await asyncio.gather(*[
+        firebase_auth_queue.enqueue(
+            f"firebase-auth {user['id']}", provision_pending_user,
+            user["id"], user["email"], user["hashed_password"], user.get("full_name"),
         )
-        print(f"✅ Created Firebase Auth user: {firebase_user.uid}")
-    except auth.EmailAlreadyExistsError:
-        # Should be caught by main.py check, but safety net
-        raise HTTPException(status_code=400, detail="Email already registered in Firebase Auth")
-    except Exception as e:
-        print(f"⚠️ Failed to create Firebase Auth user: {e}")
-        # Proceeding to create Firestore document anyway for our app logic, 
-        # or we could raise error. Let's raise to ensure consistency.
-        raise HTTPException(status_code=500, detail=f"Firebase Auth Error: {str(e)}")
-
-    # 2. Create user document in Firestore (our custom DB)
+        for user in pending
+    ])
+    return {"queued": len(pending), "provisioned": sum(results)}
+
+
+async def create_user(user_data: UserCreate) -> User:
+    hashed_password = await password_hasher.hash(user_data.password)
+    
+    # Our UID doubles as the Firebase Auth UID
+    uid = uuid.uuid4().hex
+    repos = get_repositories()
+    firebase_auth = repos.name == "firestore"
     user_model = User(
+        id=uid,
         email=user_data.email,
         hashed_password=hashed_password,
-        full_name=user_data.full_name
+        full_name=user_data.full_name,
+        firebase_auth_pending=firebase_auth,
     )
     
-    # Exclude None fields and id (Firestore generates id)
-    user_dict = user_model.model_dump(exclude={"id"})
-    
-    # We could use firebase_user.uid as the document ID for consistency!
-    # user_ref = db.collection('users').document(firebase_user.uid)
-    # user_ref.set(user_dict)
-    # user_model.id = firebase_user.uid
-    
-    # BUT to avoid breaking existing references to auto-generated IDs, 
-    # let's stick to auto-id for now or decide?
-    # Actually, using firebase_user.uid is MUCH better practice. 
-    # Let's switch to using the UID from Auth as the Doc ID.
-    
-    doc_ref = db.collection('users').document(firebase_user.uid)
-    doc_ref.set(user_dict)
-    user_model.id = firebase_user.uid
-    
-    # Create default settings linked to user ID
-    settings = UserSettings(user_id=user_model.id)
-    settings_dict = settings.model_dump(exclude={"id"})
-    db.collection('user_settings').add(settings_dict)
+    # User, email index entry, default settings and dashboard stats are written atomically,
+    # so two concurrent registrations for the same email cannot both succeed. This is the
+    # only write the request waits for.
+    try:
+        await repos.users.create(user_model, UserSettings(user_id=uid), empty_stats())
+    except DuplicateEmail:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    if firebase_auth:
+        # Retried by the queue; repair_firebase_auth picks up whatever is still pending
+        firebase_auth_queue.enqueue(
+            f"firebase-auth {uid}", provision_pending_user, uid, user_data.email, hashed_password, user_data.full_name
+        )
     
     return user_model
 
@@ -160,8 +358,14 @@ async def authenticate_user(email: str, password: str) -> Optional[User]:
     user = await get_user_by_email(email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # Cost parameters changed since this hash was created; upgrade it transparently
+        await get_repositories().users.update(user.id, {'hashed_password': new_hash})
+        user.hashed_password = new_hash
+        invalidate_cached_user(user.email)
     return user
 
 
@@ -171,17 +375,11 @@ async def get_current_user(
     if not credentials:
         return None
     
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        token_data = TokenData(email=email)
-    except JWTError:
+    email = _decode_token_subject(credentials.credentials)
+    if email is None:
         return None
     
-    user = await get_user_by_email(email=token_data.email)
-    return user
+    return await _get_principal(email)
 
 
 async def require_auth(
@@ -194,15 +392,11 @@ async def require_auth(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
+    email = _decode_token_subject(credentials.credentials)
+    if email is None:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await get_user_by_email(email=email)
+    user = await _get_principal(email)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
@@ -0,0 +1,376 @@
+"""
+Local micro-benchmarks for backend hot paths.
+
+Usage (from backend/):
+    python bench.py pdf --iterations 50
+    python bench.py pdf-load --exports 16
+    python bench.py auth-load --logins 100
+    python bench.py mail --messages 200      # needs `pip install aiosmtpd`
+    python bench.py email-templates --messages 100000
+    python bench.py dashboard --page-size 20 [--user UID]   # --user reads from Firestore
+    python bench.py db-load --session SID --concurrency 1,8,32   # reads from Firestore
+"""
+import argparse
+import asyncio
+import time
+
+from loop_monitor import percentile
+
+SAMPLE_REPORT = dict(
+    session_id="bench-0000-0000",
+    role="Backend Engineer",
+    experience_level="Mid-Level",
+    score=78,
+    summary="Solid fundamentals with clear communication. " * 6,
+    strengths=["Structured answers", "Good API design instincts", "Clear trade-off reasoning"],
+    improvements=["Quantify impact", "Go deeper on failure modes", "Tighter time management"],
+    communication_score=82,
+    technical_score=74,
+    problem_solving_score=77,
+    culture_fit_score=80,
+    improvement_tips=["Use the STAR method", "Practice capacity estimates", "Review caching strategies"],
+    transcript=[
+        {"role": "model" if i % 2 == 0 else "user", "content": "A reasonably long interview turn. " * 12}
+        for i in range(24)
+    ],
+    voice_metrics={
+        "pace_rating": "Normal",
+        "words_per_minute": 142,
+        "filler_word_count": 6,
+        "confidence_score": 71,
+        "feedback": ["Good pace", "Fewer fillers in technical answers"],
+    },
+)
+
+
+def _rate(label: str, fn, iterations: int) -> float:
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed if elapsed else float("inf")
+    print(f"  {label:<28} {rate:10.1f} renders/s  ({elapsed / iterations * 1000:.2f} ms each)")
+    return rate
+
+
+def _render_with_per_call_setup() -> bytes:
+    """The render as it was before styles and the wordmark moved to module level."""
+    import pdf_generator
+
+    pdf_generator.STYLES = pdf_generator._build_styles()
+    pdf_generator.WORDMARK_BYTES, pdf_generator.WORDMARK_READER = pdf_generator._load_wordmark()
+    return pdf_generator.generate_pdf_report(**SAMPLE_REPORT)
+
+
+def bench_pdf(args):
+    from pdf_generator import generate_pdf_report, get_cached_pdf_report, invalidate_pdf_cache
+
+    print(f"📄 PDF report rendering ({args.iterations} iterations)")
+    before = _rate("per-call styles + wordmark", _render_with_per_call_setup, args.iterations)
+    cold = _rate("full render (uncached)", lambda: generate_pdf_report(**SAMPLE_REPORT), args.iterations)
+    print(f"  speed-up from module-level styles + wordmark: {cold / before:.2f}x")
+
+    invalidate_pdf_cache(SAMPLE_REPORT["session_id"])
+    warm = _rate("cached export", lambda: get_cached_pdf_report(**SAMPLE_REPORT), args.iterations)
+    print(f"  speed-up for repeat exports: {warm / cold:.0f}x")
+
+
+async def _chat_latency_during(exports, chat_latency: float):
+    """
+    Simulated chat turns (await on a fake LLM call) while `exports` run.
+    Returns (turn latencies, export results); a failed export's result is its exception.
+    """
+    latencies = []
+    done = asyncio.Event()
+
+    async def chat_turns():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(chat_latency)
+            latencies.append(time.perf_counter() - start)
+
+    chatter = asyncio.create_task(chat_turns())
+    results = await asyncio.gather(*exports, return_exceptions=True)
+    done.set()
+    await chatter
+    return latencies, results
+
+
+def bench_pdf_load(args):
+    import pdf_pool
+    from pdf_generator import generate_pdf_report
+
+    def fields(i):
+        return {**SAMPLE_REPORT, "session_id": f"bench-{i:04d}"}
+
+    async def inline_export(i):
+        # What export_pdf did before: render synchronously inside the handler
+        generate_pdf_report(**fields(i))
+
+    async def run(mode):
+        if mode == "inline":
+            exports = [inline_export(i) for i in range(args.exports)]
+        else:
+            exports = [pdf_pool.render_pdf_report(**fields(i)) for i in range(args.exports)]
+        start = time.perf_counter()
+        latencies, results = await _chat_latency_during(exports, args.chat_latency)
+        elapsed = time.perf_counter() - start
+        p50, p99 = percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+        failed = sum(isinstance(result, BaseException) for result in results)
+        print(
+            f"  {mode:<8} exports done in {elapsed:5.2f}s   chat p50 {p50:7.1f} ms   p99 {p99:7.1f} ms"
+            f"   failed {failed}/{len(results)}"
+        )
+
+    print(f"🖨️ Chat latency while {args.exports} PDFs export in parallel (fake LLM {args.chat_latency * 1000:.0f} ms)")
+    asyncio.run(run("inline"))
+    pdf_pool.start_pdf_pool()
+    try:
+        asyncio.run(run("pool"))
+    finally:
+        pdf_pool.shutdown_pdf_pool()
+    print(f"  pool stats: {pdf_pool.pdf_pool_stats()}")
+
+
+def bench_auth_load(args):
+    from auth import password_hasher, pwd_context
+
+    stored_hash = pwd_context.hash("correct horse battery staple")
+
+    async def inline_login():
+        # What /api/auth/login did before: bcrypt directly on the event loop
+        pwd_context.verify("correct horse battery staple", stored_hash)
+
+    async def pooled_login():
+        await password_hasher.verify_and_update("correct horse battery staple", stored_hash)
+
+    async def run(mode, login) -> int:
+        from fastapi import HTTPException
+
+        start = time.perf_counter()
+        latencies, results = await _chat_latency_during([login() for _ in range(args.logins)], args.chat_latency)
+        elapsed = time.perf_counter() - start
+        p50, p99 = percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+        rejected = sum(isinstance(result, HTTPException) and result.status_code == 503 for result in results)
+        failed = sum(isinstance(result, BaseException) for result in results) - rejected
+        print(
+            f"  {mode:<8} logins done in {elapsed:5.2f}s   chat p50 {p50:7.1f} ms   p99 {p99:7.1f} ms"
+            f"   rejected {rejected}   failed {failed}"
+        )
+        return rejected + failed
+
+    print(f"🔐 Chat latency during {args.logins} concurrent logins (fake LLM {args.chat_latency * 1000:.0f} ms)")
+    unsuccessful = asyncio.run(run("inline", inline_login)) + asyncio.run(run("pool", pooled_login))
+    print(f"  hasher stats: {password_hasher.stats()}")
+    if unsuccessful:
+        # Chat latency measured while logins were shed says nothing about a full burst
+        raise SystemExit(f"{unsuccessful} logins did not complete; raise PASSWORD_HASH_MAX_QUEUE above --logins")
+
+
+def bench_mail(args):
+    import os
+
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.handlers import Sink
+    except ImportError:
+        raise SystemExit("bench.py mail needs a local SMTP sink: pip install aiosmtpd")
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=args.port)
+    controller.start()
+    os.environ.update({
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(args.port), "MAIL_STARTTLS": "False",
+        "MAIL_REQUIRE_AUTH": "False", "MAIL_RATE_PER_MINUTE": "0",
+    })
+    from email_service import EmailService
+
+    async def per_message_connection(service):
+        # Previous behaviour: connect (+STARTTLS/login) for every message
+        for i in range(args.messages):
+            smtp = await service._connect()
+            await smtp.send_message(service._build_message([f"user{i}@example.com"], "Reminder", "<p>hi</p>"))
+            await smtp.quit()
+
+    async def pooled_queue(service):
+        futures = [
+            service.queue_email([f"user{i}@example.com"], "Reminder", "<p>hi</p>")
+            for i in range(args.messages)
+        ]
+        results = await asyncio.gather(*futures)
+        await service.close()
+        assert all(results), "some messages were dead-lettered"
+
+    print(f"📧 Sending {args.messages} messages to a local aiosmtpd sink")
+    try:
+        for label, run in [("connection per message", per_message_connection), ("pooled queue", pooled_queue)]:
+            service = EmailService()
+            start = time.perf_counter()
+            asyncio.run(run(service))
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<24} {args.messages / elapsed:8.1f} msg/s   connections opened: {service.pool.connections_opened or args.messages}")
+    finally:
+        controller.stop()
+
+
+def bench_email_templates(args):
+    from email_service import EmailService
+
+    service = EmailService()
+    names = [f"Candidate {i} <&>" for i in range(1000)]
+
+    def timed(label, fn, count=args.messages):
+        fn(0)  # warm-up
+        start = time.perf_counter()
+        for i in range(count):
+            fn(i)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<32} {count / elapsed:10.0f} msg/s  ({elapsed:.2f}s for {count})")
+
+    print(f"✉️ Rendering {args.messages} reminder emails")
+    reminder = service._reminder
+    timed("html+text bodies", lambda i: (
+        reminder.html_template.render(name=names[i % 1000]),
+        reminder.text_template.render(name=names[i % 1000]),
+    ))
+    timed("complete MIME message", lambda i: service.reminder_message(f"user{i}@example.com", names[i % 1000]))
+    timed("generic layout (EmailMessage)", lambda i: service._build_message(
+        [f"user{i}@example.com"], "Reminder", f"<p>Hi {names[i % 1000]},</p>", "Start", "http://localhost:3000",
+    ), count=min(args.messages, 5000))
+
+
+def bench_dashboard(args):
+    import json
+    from datetime import datetime
+    from models import Interview, InterviewSummary
+    from repositories import INTERVIEW_SUMMARY_FIELDS as fields
+
+    def page_bytes(docs):
+        return sum(len(json.dumps(d, default=str).encode()) for d in docs)
+
+    def measure(label, load, model):
+        load()  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            docs = load()
+            [model(**d) for d in docs]
+        elapsed = (time.perf_counter() - start) / args.iterations
+        print(f"  {label:<22} {page_bytes(docs) / 1024:8.1f} KiB/page   {elapsed * 1000:8.2f} ms/page")
+
+    if args.user:
+        import asyncio as _asyncio
+        from db import init_db, get_db
+
+        _asyncio.run(init_db())
+        db = get_db()
+        if not db:
+            raise SystemExit("Database not initialized")
+        query = db.collection("interviews").where("user_id", "==", args.user).limit(args.page_size)
+        full = lambda: [doc.to_dict() for doc in query.stream()]
+        projected = lambda: [doc.to_dict() for doc in query.select(fields).stream()]
+        print(f"📊 Dashboard page of {args.page_size} interviews for {args.user} (Firestore, incl. network)")
+    else:
+        doc = {
+            **{k: v for k, v in SAMPLE_REPORT.items() if k != "session_id"},
+            "interview_type": "Mixed", "interviewer_style": "Friendly", "company": "google", "language": "en",
+            "resume_data": {"context": "Experienced backend engineer. " * 80},
+            "config_json": {"role": "Backend Engineer", "resume_context": "Experienced backend engineer. " * 80},
+            "audio_urls": {str(i): f"uploads/bench/{i}.webm" for i in range(12)},
+            "started_at": datetime.utcnow(), "completed_at": datetime.utcnow(),
+        }
+        docs = [{**doc, "session_id": f"bench-{i:04d}", "user_id": "bench"} for i in range(args.page_size)]
+        full = lambda: [dict(d) for d in docs]
+        projected = lambda: [{k: d[k] for k in fields if k in d} for d in docs]
+        print(f"📊 Dashboard page of {args.page_size} synthetic interviews (payload size + model validation)")
+
+    measure("full documents", full, Interview)
+    measure("select() projection", projected, InterviewSummary)
+
+
+def bench_db_load(args):
+    from db import init_db, get_db
+    from repositories import get_repositories, init_repositories
+
+    async def run(mode, concurrency):
+        db, interviews = get_db(), get_repositories().interviews
+
+        async def sync_read():
+            # What the handlers did before: a blocking stream() on the event loop
+            query = db.collection("interviews").where("session_id", "==", args.session).limit(1)
+            return [doc.to_dict() for doc in query.stream()]
+
+        async def async_read():
+            return await interviews.get_by_session(args.session)
+
+        read = sync_read if mode == "sync" else async_read
+        remaining = args.requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await read()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return args.requests / (time.perf_counter() - start)
+
+    async def main_async():
+        await init_db()
+        if not get_db():
+            raise SystemExit("Database not initialized")
+        await init_repositories("firestore")
+        print(f"🗄️ Interview reads by session id, {args.requests} per run (Firestore, incl. network)")
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            rates = {mode: await run(mode, concurrency) for mode in ("sync", "async")}
+            print(f"  concurrency {concurrency:<4} sync client {rates['sync']:8.1f} reads/s   "
+                  f"AsyncClient {rates['async']:8.1f} reads/s")
+
+    asyncio.run(main_async())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pdf = sub.add_parser("pdf", help="PDF report renders per second, uncached vs cached")
+    pdf.add_argument("--iterations", type=int, default=50)
+    pdf.set_defaults(func=bench_pdf)
+
+    pdf_load = sub.add_parser("pdf-load", help="chat p50/p99 while PDFs export concurrently, inline vs process pool")
+    pdf_load.add_argument("--exports", type=int, default=16)
+    pdf_load.add_argument("--chat-latency", type=float, default=0.05, help="simulated LLM latency per chat turn (s)")
+    pdf_load.set_defaults(func=bench_pdf_load)
+
+    auth_load = sub.add_parser("auth-load", help="chat p50/p99 during a login storm, inline bcrypt vs hashing pool")
+    auth_load.add_argument("--logins", type=int, default=100)
+    auth_load.add_argument("--chat-latency", type=float, default=0.05, help="simulated LLM latency per chat turn (s)")
+    auth_load.set_defaults(func=bench_auth_load)
+
+    mail = sub.add_parser("mail", help="message throughput against a local aiosmtpd sink")
+    mail.add_argument("--messages", type=int, default=200)
+    mail.add_argument("--port", type=int, default=8025)
+    mail.set_defaults(func=bench_mail)
+
+    templates = sub.add_parser("email-templates", help="reminder email renders per second")
+    templates.add_argument("--messages", type=int, default=100000)
+    templates.set_defaults(func=bench_email_templates)
+
+    dashboard = sub.add_parser("dashboard", help="bytes and time per dashboard page, full documents vs projection")
+    dashboard.add_argument("--page-size", type=int, default=20)
+    dashboard.add_argument("--iterations", type=int, default=200)
+    dashboard.add_argument("--user", help="measure against Firestore for this user id instead of synthetic data")
+    dashboard.set_defaults(func=bench_dashboard)
+
+    db_load = sub.add_parser("db-load", help="concurrent Firestore reads/s, sync client on the loop vs AsyncClient")
+    db_load.add_argument("--session", required=True, help="session id of an existing interview")
+    db_load.add_argument("--requests", type=int, default=200)
+    db_load.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    db_load.set_defaults(func=bench_db_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from firebase_admin import credentials, firestore, firestore_async, storage
 import os
 
 db = None
+# Request handlers use the asyncio client (through repositories.py); the sync
+# client is left for scripts and jobs that run in worker threads
+async_db = None
 bucket = None
 
 async def init_db():
-    global db, bucket
+    global db, async_db, bucket
+    # Without Firebase the API can still run on DATA_BACKEND=sqlite|memory (see repositories.py)
+    from repositories import DATA_BACKEND
     try:
         if os.path.exists("serviceAccountKey.json"):
             cred = credentials.Certificate("serviceAccountKey.json")
@@ -15,7 +20,8 @@ async def init_db():
             cred_dict = json.loads(os.environ.get("FIREBASE_CREDENTIALS_JSON"))
             cred = credentials.Certificate(cred_dict)
         else:
-            print("❌ No serviceAccountKey.json or FIREBASE_CREDENTIALS_JSON found.")
+            if DATA_BACKEND == "firestore":
+                print("❌ No serviceAccountKey.json or FIREBASE_CREDENTIALS_JSON found.")
             return
 
         project_id = cred.project_id if hasattr(cred, 'project_id') else None
@@ -27,6 +33,7 @@ async def init_db():
             'storageBucket': f"{project_id}.appspot.com"
         })
         db = firestore.client()
+        async_db = firestore_async.client()
         bucket = storage.bucket()
         print("🔥 Firebase Firestore and Storage initialized successfully")
     except Exception as e:
@@ -35,5 +42,8 @@ async def init_db():
 def get_db():
     return db
 
+def get_async_db():
+    return async_db
+
 def get_bucket():
     return bucket
@@ -0,0 +1,134 @@
+"""
+emails/{normalized_email} -> {uid} index used for direct user lookups by email.
+
+Maintenance (from backend/):
+    python email_index.py backfill   # index existing users
+    python email_index.py check      # report missing, stale and conflicting entries
+    python email_index.py check --fix
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, List
+
+EMAILS_COLLECTION = "emails"
+_BATCH_SIZE = 400
+_PAGE_SIZE = 500
+
+
+def normalize_email(email: str) -> str:
+    """Index key for an email; '/' is escaped because it is not allowed in document IDs."""
+    return (email or "").strip().lower().replace("/", "%2F")
+
+
+def _iter_collection(db, name: str, fields: List[str]):
+    """Stream a whole collection in document-id order, one page per query."""
+    query = db.collection(name).select(fields).order_by("__name__").limit(_PAGE_SIZE)
+    last_doc = None
+    while True:
+        page = list((query.start_after(last_doc) if last_doc else query).stream())
+        yield from page
+        if len(page) < _PAGE_SIZE:
+            return
+        last_doc = page[-1]
+
+
+def backfill_email_index(db) -> Dict[str, int]:
+    """Create index entries for users that do not have one yet."""
+    existing = {doc.id: doc.get("uid") for doc in _iter_collection(db, EMAILS_COLLECTION, ["uid"])}
+    stats = {"users": 0, "created": 0, "already_indexed": 0, "conflicts": 0}
+
+    batch = db.batch()
+    pending = 0
+    for user_doc in _iter_collection(db, "users", ["email"]):
+        stats["users"] += 1
+        key = normalize_email(user_doc.get("email"))
+        if not key:
+            continue
+        if key in existing:
+            if existing[key] == user_doc.id:
+                stats["already_indexed"] += 1
+            else:
+                stats["conflicts"] += 1
+                print(f"⚠️ {key} already indexed to {existing[key]}, skipping user {user_doc.id}")
+            continue
+
+        batch.set(db.collection(EMAILS_COLLECTION).document(key), {
+            "uid": user_doc.id,
+            "created_at": datetime.utcnow(),
+        })
+        existing[key] = user_doc.id
+        stats["created"] += 1
+        pending += 1
+        if pending >= _BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    return stats
+
+
+def check_email_index(db, fix: bool = False) -> Dict[str, int]:
+    """
+    Compare users and the email index. Reports users without an entry,
+    entries pointing at missing users or at a user with a different email,
+    and emails shared by several users. With fix=True stale entries are deleted.
+    """
+    users = {doc.id: normalize_email(doc.get("email")) for doc in _iter_collection(db, "users", ["email"])}
+    index = {doc.id: doc.get("uid") for doc in _iter_collection(db, EMAILS_COLLECTION, ["uid"])}
+
+    by_email: Dict[str, List[str]] = {}
+    for uid, email in users.items():
+        by_email.setdefault(email, []).append(uid)
+
+    missing = [email for email in by_email if email and email not in index]
+    stale = [email for email, uid in index.items() if users.get(uid) != email]
+    duplicates = [email for email, uids in by_email.items() if email and len(uids) > 1]
+
+    for email in missing[:20]:
+        print(f"  missing index entry: {email}")
+    for email in stale[:20]:
+        print(f"  stale index entry: {email} -> {index[email]}")
+    for email in duplicates[:20]:
+        print(f"  email shared by users: {email} {by_email[email]}")
+
+    if fix and stale:
+        for start in range(0, len(stale), _BATCH_SIZE):
+            batch = db.batch()
+            for email in stale[start:start + _BATCH_SIZE]:
+                batch.delete(db.collection(EMAILS_COLLECTION).document(email))
+            batch.commit()
+
+    return {
+        "users": len(users),
+        "index_entries": len(index),
+        "missing": len(missing),
+        "stale": len(stale),
+        "duplicates": len(duplicates),
+        "deleted": len(stale) if fix else 0,
+    }
+
+
+def main():
+    from db import init_db, get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["backfill", "check"])
+    parser.add_argument("--fix", action="store_true", help="delete stale entries (check only)")
+    args = parser.parse_args()
+
+    asyncio.run(init_db())
+    db = get_db()
+    if not db:
+        raise SystemExit("Database not initialized")
+
+    if args.command == "backfill":
+        print(f"✅ Backfill finished: {backfill_email_index(db)}")
+    else:
+        print(f"🔎 Check finished: {check_email_index(db, fix=args.fix)}")
+
+
+if __name__ == "__main__":
+    main()
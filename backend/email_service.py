@@ -1,9 +1,17 @@
+import asyncio
 import os
 import aiosmtplib
 from email.message import EmailMessage
 from pydantic import EmailStr
 from typing import List
 
+from email_templates import BUTTON_HTML, LAYOUT_HTML, LAYOUT_TEXT, compile_reminder, html_to_text
+from mailer import MailQueue, OutboundMessage, RawMessage, SMTPConnectionPool
+from telemetry import span
+
+# Link used by call-to-action buttons in automated mails
+APP_URL = os.getenv("APP_URL", "http://localhost:3000")
+
 class EmailService:
     def __init__(self):
         # Default to Gmail for convenience, but configurable
@@ -13,94 +21,91 @@ class EmailService:
         self.password = os.getenv("MAIL_PASSWORD")
         self.use_tls = os.getenv("MAIL_STARTTLS", "True").lower() == "true"
         self.mail_from = os.getenv("MAIL_FROM", "noreply@interviewflow.ai")
+        # Set to False to send without login, e.g. to a local aiosmtpd sink
+        self.require_auth = os.getenv("MAIL_REQUIRE_AUTH", "True").lower() == "true"
+        
+        # Connections are reused across messages; queued mail is sent by a few workers
+        self.pool = SMTPConnectionPool(self._connect)
+        self.queue = MailQueue(self._deliver)
+        # Reminders only differ by recipient name, so everything else is compiled once
+        self._reminder = compile_reminder(self.mail_from, APP_URL)
         
         print(f"📧 EmailService Config: Server={self.smtp_server}:{self.smtp_port}, User={self.username}, TLS={self.use_tls}")
         
-        if not self.username or not self.password:
+        if not self.configured:
             print("⚠️ EmailService: MAIL_USERNAME or MAIL_PASSWORD not set. Emails will fail to send.")
 
-    def _get_template(self, title: str, content: str, cta_text: str = None, cta_link: str = None) -> str:
-        """
-        Returns a premium, Apple-inspired HTML email template.
-        """
-        button_html = ""
-        if cta_text and cta_link:
-            button_html = f"""
-            <div style="text-align: center; margin-top: 32px; margin-bottom: 32px;">
-                <a href="{cta_link}" style="background-color: #000000; color: #ffffff; padding: 12px 24px; border-radius: 9999px; text-decoration: none; font-weight: 600; font-size: 14px; display: inline-block;">
-                    {cta_text} &rarr;
-                </a>
-            </div>
-            """
-
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif; line-height: 1.5; color: #1d1d1f; margin: 0; padding: 0; background-color: #f5f5f7; }}
-                .container {{ max-width: 600px; margin: 40px auto; background: #ffffff; border-radius: 18px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.02); }}
-                .header {{ background: #fafafa; padding: 24px 32px; border-bottom: 1px solid #f0f0f0; text-align: center; }}
-                .logo {{ font-weight: 700; font-size: 18px; color: #000000; text-decoration: none; letter-spacing: -0.5px; }}
-                .content {{ padding: 40px 32px; }}
-                .footer {{ background: #f5f5f7; padding: 24px 32px; text-align: center; font-size: 12px; color: #86868b; }}
-                h1 {{ font-size: 24px; font-weight: 600; margin-bottom: 16px; letter-spacing: -0.5px; color: #1d1d1f; }}
-                p {{ font-size: 16px; margin-bottom: 16px; color: #333333; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <span class="logo">InterviewFlow.ai</span>
-                </div>
-                <div class="content">
-                    <h1>{title}</h1>
-                    <div style="font-size: 16px; color: #333333;">
-                        {content}
-                    </div>
-                    {button_html}
-                </div>
-                <div class="footer">
-                    <p>&copy; 2026 InterviewFlow.ai. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+    @property
+    def configured(self) -> bool:
+        return bool(self.username and self.password) or not self.require_auth
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        print(f"📧 Connecting to SMTP {self.smtp_server}:{self.smtp_port} as {self.username}...")
+        smtp = aiosmtplib.SMTP(hostname=self.smtp_server, port=self.smtp_port)
+        await smtp.connect()
+        if self.use_tls:
+            try:
+                await smtp.starttls()
+            except Exception as tls_error:
+                if "already using TLS" in str(tls_error):
+                    print("ℹ️ Connection is already TLS, skipping starttls()")
+                else:
+                    smtp.close()
+                    raise tls_error
+        
+        if self.username and self.password:
+            await smtp.login(self.username, self.password)
+        return smtp
+
+    def _assemble(self, recipients: List[str], subject: str, html_body: bytes, text_body: bytes) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.mail_from
+        message["To"] = ", ".join(recipients)
+        message["Subject"] = subject
+        # Bodies are already UTF-8 bytes; plain text first so HTML is the preferred part
+        message.set_content(text_body, maintype="text", subtype="plain", params={"charset": "utf-8"})
+        message.add_alternative(html_body, maintype="text", subtype="html", params={"charset": "utf-8"})
+        return message
+
+    def _build_message(self, recipients: List[str], subject: str, body_content: str, cta_text: str = None, cta_link: str = None) -> EmailMessage:
+        # Wrap the HTML fragment in the Apple-style layout
+        button = BUTTON_HTML.render(cta_link=cta_link, cta_text=cta_text) if cta_text and cta_link else b""
+        html_body = LAYOUT_HTML.render(title=subject, content=body_content, button=button)
+        cta = f"\n{cta_text}: {cta_link}\n" if cta_text and cta_link else ""
+        text_body = LAYOUT_TEXT.render(title=subject, content=html_to_text(body_content), cta=cta)
+        return self._assemble(recipients, subject, html_body, text_body)
+
+    def reminder_message(self, email: str, name: str) -> RawMessage:
+        return self._reminder.render(email, name=name or "there")
+
+    async def _send(self, smtp: aiosmtplib.SMTP, message: OutboundMessage):
+        if isinstance(message, RawMessage):
+            await smtp.sendmail(message.sender, message.recipients, message.data)
+        else:
+            await smtp.send_message(message)
+
+    async def _deliver(self, message: OutboundMessage):
+        with span("smtp.send", **{"server.address": self.smtp_server, "server.port": self.smtp_port}):
+            try:
+                async with self.pool.connection() as smtp:
+                    await self._send(smtp, message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # A pooled connection went stale between the keep-alive check and use
+                async with self.pool.connection() as smtp:
+                    await self._send(smtp, message)
 
     async def send_email(self, recipients: List[str], subject: str, body_content: str, cta_text: str = None, cta_link: str = None):
         """
-        Send an HTML email using the premium template.
+        Send an HTML email using the premium template and wait for the result.
         """
-        if not self.username or not self.password:
+        if not self.configured:
             print("❌ Cannot send email: Credentials missing.")
             return False
             
-        # Wrap content in the Apple-style template
-        full_html = self._get_template(subject, body_content, cta_text, cta_link)
-        
-        message = EmailMessage()
-        message["From"] = self.mail_from
-        message["To"] = ", ".join(recipients)
-        message["Subject"] = subject
-        message.set_content(full_html, subtype="html")
+        message = self._build_message(recipients, subject, body_content, cta_text, cta_link)
 
         try:
-            print(f"📧 Connecting to SMTP {self.smtp_server}:{self.smtp_port} as {self.username}...")
-            async with aiosmtplib.SMTP(hostname=self.smtp_server, port=self.smtp_port) as smtp:
-                if self.use_tls:
-                    try:
-                        await smtp.starttls()
-                    except Exception as tls_error:
-                        if "already using TLS" in str(tls_error):
-                            print("ℹ️ Connection is already TLS, skipping starttls()")
-                        else:
-                            raise tls_error
-                
-                await smtp.login(self.username, self.password)
-                await smtp.send_message(message)
-                
+            await self._deliver(message)
             print(f"✅ Email sent to {recipients}")
             return True
         except Exception as e:
@@ -109,22 +114,48 @@ class EmailService:
             traceback.print_exc()
             return False
 
+    def queue_email(self, recipients: List[str], subject: str, body_content: str, cta_text: str = None, cta_link: str = None) -> "asyncio.Future[bool]":
+        """
+        Queue an HTML email for background delivery (retried with backoff,
+        rate limited). The returned future resolves to whether it was sent.
+        """
+        if not self.configured:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        message = self._build_message(recipients, subject, body_content, cta_text, cta_link)
+        return self.queue.enqueue_message(message)
+
+    def queue_reminder(self, email: str, name: str) -> "asyncio.Future[bool]":
+        """Queue a practice reminder; resolves to whether it was sent."""
+        if not self.configured:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        return self.queue.enqueue_message(self.reminder_message(email, name))
+
+    async def close(self):
+        await self.queue.stop()
+        await self.pool.close()
+
+    def stats(self) -> dict:
+        return {
+            **self.queue.stats(),
+            "pool_size": self.pool.size,
+            "connections_opened": self.pool.connections_opened,
+        }
+
     async def send_reminder(self, email: str, name: str):
         """
         Send a practice reminder email.
         """
-        subject = "Time to Practice! 🚀"
-        body = f"""
-        <html>
-            <body>
-                <h1>Hi {name or 'There'},</h1>
-                <p>It's been a while since your last mock interview on InterviewFlow.ai.</p>
-                <p>Consistency is key to landing your dream job!</p>
-                <br>
-                <a href="http://localhost:3000" style="background-color: #4F46E5; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">Start Practice Session</a>
-                <br><br>
-                <p>Keep grinding,<br>The InterviewFlow Team</p>
-            </body>
-        </html>
-        """
-        return await self.send_email([email], subject, body)
+        if not self.configured:
+            print("❌ Cannot send email: Credentials missing.")
+            return False
+        try:
+            await self._deliver(self.reminder_message(email, name))
+            print(f"✅ Reminder sent to {email}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to send reminder: {e}")
+            return False
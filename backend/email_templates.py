@@ -0,0 +1,206 @@
+import base64
+import html
+import re
+import secrets
+from email.header import Header
+from typing import List, Tuple, Union
+
+from mailer import RawMessage
+
+_SLOT = re.compile(r"\{\{\s*(\w+)(\|raw)?\s*\}\}")
+
+
+class CompiledTemplate:
+    """
+    Template split once into pre-encoded static byte chunks and named slots.
+    Rendering only escapes/encodes the slot values and joins the pieces.
+
+    Slots are written {{ name }} (HTML-escaped) or {{ name|raw }} (inserted
+    as-is, for trusted HTML fragments). Bytes values are always inserted as-is.
+    """
+
+    def __init__(self, source: str, escape: bool = True):
+        self.escape = escape
+        self._parts: List[Union[bytes, Tuple[str, bool]]] = []
+        pos = 0
+        for match in _SLOT.finditer(source):
+            if match.start() > pos:
+                self._parts.append(source[pos:match.start()].encode("utf-8"))
+            self._parts.append((match.group(1), bool(match.group(2))))
+            pos = match.end()
+        if pos < len(source):
+            self._parts.append(source[pos:].encode("utf-8"))
+        self.slots = {part[0] for part in self._parts if isinstance(part, tuple)}
+
+    def _encode(self, value, raw: bool) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        text = "" if value is None else str(value)
+        if self.escape and not raw:
+            text = html.escape(text, quote=True)
+        return text.encode("utf-8")
+
+    def render(self, **values) -> bytes:
+        return b"".join(
+            part if isinstance(part, bytes) else self._encode(values.get(part[0]), part[1])
+            for part in self._parts
+        )
+
+    def partial(self, **values) -> "CompiledTemplate":
+        """Fill some slots now and return a template with the rest still open."""
+        compiled = CompiledTemplate.__new__(CompiledTemplate)
+        compiled.escape = self.escape
+        compiled._parts = []
+        for part in self._parts:
+            if isinstance(part, tuple) and part[0] in values:
+                part = self._encode(values[part[0]], part[1])
+            if isinstance(part, bytes) and compiled._parts and isinstance(compiled._parts[-1], bytes):
+                compiled._parts[-1] += part
+            else:
+                compiled._parts.append(part)
+        compiled.slots = {part[0] for part in compiled._parts if isinstance(part, tuple)}
+        return compiled
+
+
+_CRLF = re.compile(r"[\r\n]")
+
+
+class CompiledMessage:
+    """
+    multipart/alternative message with headers and MIME structure encoded
+    once. Per message only the recipient and the two bodies are rendered,
+    skipping EmailMessage header parsing, which costs far more than the
+    template itself.
+    """
+
+    def __init__(self, sender: str, subject: str, html_template: CompiledTemplate, text_template: CompiledTemplate):
+        self.sender = sender
+        self.subject = subject
+        self.html_template = html_template
+        self.text_template = text_template
+        boundary = f"=_{secrets.token_hex(16)}"
+        encoded_subject = Header(subject, "utf-8").encode()
+        self._skeleton = CompiledTemplate(
+            f"From: {sender}\n"
+            "To: {{ to }}\n"
+            f"Subject: {encoded_subject}\n"
+            "MIME-Version: 1.0\n"
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\n'
+            "\n"
+            f"--{boundary}\n"
+            'Content-Type: text/plain; charset="utf-8"\n'
+            "Content-Transfer-Encoding: base64\n"
+            "\n"
+            "{{ text }}"
+            f"--{boundary}\n"
+            'Content-Type: text/html; charset="utf-8"\n'
+            "Content-Transfer-Encoding: base64\n"
+            "\n"
+            "{{ html }}"
+            f"--{boundary}--\n",
+            escape=False,
+        )
+
+    def render(self, to: str, **values) -> RawMessage:
+        to = _CRLF.sub("", to)
+        data = self._skeleton.render(
+            to=to,
+            text=base64.encodebytes(self.text_template.render(**values)),
+            html=base64.encodebytes(self.html_template.render(**values)),
+        )
+        return RawMessage(self.sender, [to], self.subject, data)
+
+
+_BLOCK_TAGS = re.compile(r"<\s*(br|/p|/div|/h\d|/li|/tr)\s*/?\s*>", re.IGNORECASE)
+_TAGS = re.compile(r"<[^>]+>")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*(\n\s*)+")
+
+
+def html_to_text(fragment: str) -> str:
+    """Plain-text alternative for a small, trusted HTML fragment."""
+    text = _BLOCK_TAGS.sub("\n", fragment or "")
+    text = html.unescape(_TAGS.sub("", text))
+    lines = [line.strip() for line in text.splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+LAYOUT_HTML = CompiledTemplate("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <style>
+        body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif; line-height: 1.5; color: #1d1d1f; margin: 0; padding: 0; background-color: #f5f5f7; }
+        .container { max-width: 600px; margin: 40px auto; background: #ffffff; border-radius: 18px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.02); }
+        .header { background: #fafafa; padding: 24px 32px; border-bottom: 1px solid #f0f0f0; text-align: center; }
+        .logo { font-weight: 700; font-size: 18px; color: #000000; text-decoration: none; letter-spacing: -0.5px; }
+        .content { padding: 40px 32px; }
+        .footer { background: #f5f5f7; padding: 24px 32px; text-align: center; font-size: 12px; color: #86868b; }
+        h1 { font-size: 24px; font-weight: 600; margin-bottom: 16px; letter-spacing: -0.5px; color: #1d1d1f; }
+        p { font-size: 16px; margin-bottom: 16px; color: #333333; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <span class="logo">InterviewFlow.ai</span>
+        </div>
+        <div class="content">
+            <h1>{{ title }}</h1>
+            <div style="font-size: 16px; color: #333333;">
+                {{ content|raw }}
+            </div>
+            {{ button|raw }}
+        </div>
+        <div class="footer">
+            <p>&copy; 2026 InterviewFlow.ai. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+BUTTON_HTML = CompiledTemplate("""<div style="text-align: center; margin-top: 32px; margin-bottom: 32px;">
+                <a href="{{ cta_link }}" style="background-color: #000000; color: #ffffff; padding: 12px 24px; border-radius: 9999px; text-decoration: none; font-weight: 600; font-size: 14px; display: inline-block;">
+                    {{ cta_text }} &rarr;
+                </a>
+            </div>""")
+
+LAYOUT_TEXT = CompiledTemplate("""InterviewFlow.ai
+
+{{ title }}
+
+{{ content }}
+{{ cta }}
+--
+(c) 2026 InterviewFlow.ai. All rights reserved.
+""", escape=False)
+
+REMINDER_SUBJECT = "Time to Practice! 🚀"
+REMINDER_CTA_TEXT = "Start Practice Session"
+
+_REMINDER_BODY = """<p>Hi {{ name }},</p>
+                <p>It's been a while since your last mock interview on InterviewFlow.ai.</p>
+                <p>Consistency is key to landing your dream job!</p>
+                <p>Keep grinding,<br>The InterviewFlow Team</p>"""
+
+
+def compile_reminder(sender: str, app_url: str) -> CompiledMessage:
+    """
+    Reminder message with everything but the recipient and their name
+    already baked into the static chunks.
+    """
+    body = _REMINDER_BODY
+    button = BUTTON_HTML.render(cta_link=app_url, cta_text=REMINDER_CTA_TEXT).decode("utf-8")
+    html_template = CompiledTemplate(
+        LAYOUT_HTML.partial(title=REMINDER_SUBJECT, button=button).render(content="\x00BODY\x00")
+        .decode("utf-8").replace("\x00BODY\x00", body)
+    )
+    text_template = CompiledTemplate(
+        LAYOUT_TEXT.render(
+            title=REMINDER_SUBJECT,
+            content=html_to_text(body.replace("{{ name }}", "\x00NAME\x00")),
+            cta=f"\n{REMINDER_CTA_TEXT}: {app_url}\n",
+        ).decode("utf-8").replace("\x00NAME\x00", "{{ name }}"),
+        escape=False,
+    )
+    return CompiledMessage(sender, REMINDER_SUBJECT, html_template, text_template)
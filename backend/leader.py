@@ -0,0 +1,285 @@
+"""
+Lease-based leader election so scheduled jobs run in exactly one worker.
+
+Every uvicorn worker and replica starts a LeaderElector. One of them holds
+the lease and keeps renewing it; the others retry every renewal interval and
+take over once the lease expires (or is released on shutdown). Scheduled
+jobs are wrapped with `run_job`, which is a no-op outside the leader.
+
+A job can outlive the lease it started under (a stalled renewal, a long
+run), so `run_job` hands it a fence: `await fence()` renews the lease and
+raises LeadershipLost if another worker took over in the meantime. Jobs call
+it before each batch of side effects.
+
+Lease stores (LEADER_LEASE_BACKEND, defaulting to DATA_BACKEND):
+    firestore  leases/{name} documents, updated in a transaction
+    sqlite     a local database file shared by workers on the same host
+    memory     single process only; for tests and local runs
+"""
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from repositories import DATA_BACKEND
+
+logger = logging.getLogger(__name__)
+
+# Follows DATA_BACKEND unless set: firestore, sqlite (workers on one host) or memory (one worker)
+LEADER_LEASE_BACKEND = os.getenv("LEADER_LEASE_BACKEND", DATA_BACKEND).lower()
+LEADER_LEASE_TTL_SECONDS = float(os.getenv("LEADER_LEASE_TTL_SECONDS", 60))
+LEADER_LEASE_SQLITE_PATH = os.getenv("LEADER_LEASE_SQLITE_PATH", "leases.db")
+LEASES_COLLECTION = "leases"
+
+Fence = Callable[[], Awaitable[None]]
+
+
+class LeadershipLost(Exception):
+    """The lease a job started under is gone; another worker may be running it."""
+
+
+def _grant(current: Optional[Dict[str, Any]], holder: str, ttl: float, now: float) -> Optional[Dict[str, Any]]:
+    """New lease for `holder`, or None while someone else holds an unexpired one."""
+    if current and current["holder"] != holder and current["expires_at"] > now:
+        return None
+    acquired_at = current["acquired_at"] if current and current["holder"] == holder else now
+    return {"holder": holder, "acquired_at": acquired_at, "expires_at": now + ttl}
+
+
+class MemoryLeaseStore:
+    def __init__(self):
+        self._leases: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, name: str, holder: str, ttl: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            lease = _grant(self._leases.get(name), holder, ttl, time.time())
+            if lease:
+                self._leases[name] = lease
+            return lease
+
+    def release(self, name: str, holder: str) -> None:
+        with self._lock:
+            if self._leases.get(name, {}).get("holder") == holder:
+                del self._leases[name]
+
+    def current(self, name: str) -> Optional[Dict[str, Any]]:
+        return self._leases.get(name)
+
+
+class SQLiteLeaseStore:
+    def __init__(self, path: str = LEADER_LEASE_SQLITE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, holder TEXT NOT NULL, acquired_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _read(self, conn: sqlite3.Connection, name: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute("SELECT holder, acquired_at, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        return {"holder": row[0], "acquired_at": row[1], "expires_at": row[2]} if row else None
+
+    def try_acquire(self, name: str, holder: str, ttl: float) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so read-check-write is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            lease = _grant(self._read(conn, name), holder, ttl, time.time())
+            if lease:
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, holder, acquired_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (name, lease["holder"], lease["acquired_at"], lease["expires_at"]),
+                )
+            conn.execute("COMMIT")
+            return lease
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def release(self, name: str, holder: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+        finally:
+            conn.close()
+
+    def current(self, name: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return self._read(conn, name)
+        finally:
+            conn.close()
+
+
+class FirestoreLeaseStore:
+    def __init__(self, db):
+        self.db = db
+
+    def try_acquire(self, name: str, holder: str, ttl: float) -> Optional[Dict[str, Any]]:
+        from firebase_admin import firestore
+
+        ref = self.db.collection(LEASES_COLLECTION).document(name)
+
+        @firestore.transactional
+        def acquire(transaction):
+            snapshot = ref.get(transaction=transaction)
+            lease = _grant(snapshot.to_dict() if snapshot.exists else None, holder, ttl, time.time())
+            if lease:
+                transaction.set(ref, lease)
+            return lease
+
+        return acquire(self.db.transaction())
+
+    def release(self, name: str, holder: str) -> None:
+        from firebase_admin import firestore
+
+        ref = self.db.collection(LEASES_COLLECTION).document(name)
+
+        @firestore.transactional
+        def release(transaction):
+            snapshot = ref.get(transaction=transaction)
+            if snapshot.exists and snapshot.get("holder") == holder:
+                transaction.delete(ref)
+
+        release(self.db.transaction())
+
+    def current(self, name: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.db.collection(LEASES_COLLECTION).document(name).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+
+def get_lease_store(db=None):
+    if LEADER_LEASE_BACKEND == "memory":
+        return MemoryLeaseStore()
+    if LEADER_LEASE_BACKEND == "sqlite":
+        return SQLiteLeaseStore()
+    if db is None:
+        # An in-memory fallback would make every worker a leader
+        raise RuntimeError(
+            "LEADER_LEASE_BACKEND=firestore needs Firestore; set LEADER_LEASE_BACKEND=sqlite "
+            "(workers on one host) or memory (single worker)"
+        )
+    return FirestoreLeaseStore(db)
+
+
+class LeaderElector:
+    """
+    Holds (or waits for) the `name` lease. The lease is renewed every ttl/3,
+    so a leader that stops renewing is replaced within one ttl.
+    """
+
+    def __init__(self, name: str = "scheduler", ttl: float = LEADER_LEASE_TTL_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.store = None
+        self.lease: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def is_leader(self) -> bool:
+        # Stop acting as leader a little before expiry in case a renewal is late
+        return bool(self.lease) and self.lease["expires_at"] - self.ttl / 6 > time.time()
+
+    def start(self, store) -> None:
+        self.store = store
+        if self._task is None:
+            self._task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.lease:
+            # Let another worker take over right away instead of after expiry
+            self.lease = None
+            try:
+                await asyncio.to_thread(self.store.release, self.name, self.holder_id)
+            except Exception as e:
+                logger.warning("Could not release %s lease: %s", self.name, e)
+
+    async def _renew_loop(self) -> None:
+        while True:
+            was_leader = self.is_leader
+            try:
+                self.lease = await asyncio.to_thread(self.store.try_acquire, self.name, self.holder_id, self.ttl)
+            except Exception as e:
+                logger.warning("Lease renewal for %s failed: %s", self.name, e)
+                if self.lease and self.lease["expires_at"] <= time.time():
+                    self.lease = None
+            if self.is_leader and not was_leader:
+                logger.info("%s is now the %s leader", self.holder_id, self.name)
+            elif was_leader and not self.is_leader:
+                logger.warning("%s lost the %s lease", self.holder_id, self.name)
+            await asyncio.sleep(self.ttl / 3)
+
+    async def _fence(self, acquired_at: float) -> None:
+        """Renew now; raise LeadershipLost unless this is still the lease acquired at `acquired_at`."""
+        try:
+            lease = await asyncio.to_thread(self.store.try_acquire, self.name, self.holder_id, self.ttl)
+        except Exception as e:
+            # A failed renewal is fine while the lease we hold has not run out
+            if self.is_leader and self.lease["acquired_at"] == acquired_at:
+                logger.warning("Lease renewal for %s failed, continuing on the current lease: %s", self.name, e)
+                return
+            raise LeadershipLost(f"could not renew the {self.name} lease: {e}") from e
+        self.lease = lease
+        if not lease or lease["acquired_at"] != acquired_at:
+            raise LeadershipLost(f"the {self.name} lease changed hands since the job started")
+
+    async def run_job(self, job_name: str, job: Callable[[Fence], Awaitable[Any]]) -> None:
+        """
+        Scheduler entry point: runs `job(fence)` only in the leader and records
+        its duration. A job stopped by its fence counts as fenced, not failed.
+        """
+        if not self.is_leader:
+            return
+        acquired_at = self.lease["acquired_at"]
+
+        async def fence() -> None:
+            await self._fence(acquired_at)
+
+        stats = self.jobs.setdefault(job_name, {"runs": 0, "failures": 0, "fenced": 0})
+        started = time.perf_counter()
+        stats["last_started_at"] = time.time()
+        try:
+            await job(fence)
+        except LeadershipLost as e:
+            stats["fenced"] += 1
+            logger.warning("Scheduled job %s stopped: %s", job_name, e)
+        except Exception as e:
+            stats["failures"] += 1
+            stats["last_error"] = str(e)
+            logger.exception("Scheduled job %s failed", job_name)
+        finally:
+            stats["runs"] += 1
+            stats["last_duration_seconds"] = round(time.perf_counter() - started, 3)
+            stats["max_duration_seconds"] = max(stats.get("max_duration_seconds", 0), stats["last_duration_seconds"])
+
+    async def stats(self) -> dict:
+        current = None
+        if self.store is not None:
+            try:
+                current = await asyncio.to_thread(self.store.current, self.name)
+            except Exception as e:
+                current = {"error": str(e)}
+        return {
+            "lease": self.name,
+            "worker": self.holder_id,
+            "is_leader": self.is_leader,
+            "holder": current,
+            "jobs": self.jobs,
+        }
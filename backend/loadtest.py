@@ -0,0 +1,320 @@
+"""
+End-to-end API load test with a fake LLM, in-process (no server, no network).
+
+Simulated candidates run start -> chat turns -> feedback -> export-pdf
+concurrently against the ASGI app through httpx.ASGITransport. The Mistral
+agents are overridden with a seeded FunctionModel with configurable latency
+and error rate; errors are 503s, so the model fallback loop is exercised.
+Data lives in the memory (or sqlite) backend and audio in local storage.
+
+Client and app share one event loop, so the reported latencies include the
+client's (small) overhead, and event-loop lag covers both.
+
+Usage (from backend/):
+    python loadtest.py --candidates 50 --concurrency 20 --turns 4
+    python loadtest.py --model-latency 0.4 --model-error-rate 0.05 --backend sqlite
+    python loadtest.py --json report.json --max-p99-ms 2000 --max-error-rate 0.01   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from loop_monitor import percentile
+
+END_OF_INTERVIEW = "That's all from me, thank you for your time."
+# The RNG of the candidate whose request is calling the model (set in run_candidate)
+_candidate_rng: ContextVar[Optional[random.Random]] = ContextVar("loadtest_candidate_rng", default=None)
+ANSWER_WORDS = (
+    "designed built migrated scaled measured profiled reduced latency throughput service queue cache "
+    "database index partition rollout incident postmortem customers team trade-off consistency"
+).split()
+
+
+class FakeLLM:
+    """
+    Stand-in for the Mistral models: sleeps for a jittered latency, then
+    answers or raises a 503. Draws come from the calling candidate's RNG, so
+    each candidate sees the same latencies and failures whatever the
+    interleaving with other candidates.
+    """
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    @property
+    def rng(self) -> random.Random:
+        return _candidate_rng.get() or self._rng
+
+    def model(self, name: str, respond: Callable[[str], str]):
+        from pydantic_ai.exceptions import ModelHTTPError
+        from pydantic_ai.messages import ModelResponse, TextPart, UserPromptPart
+        from pydantic_ai.models.function import FunctionModel
+
+        async def run(messages, info):
+            self.calls += 1
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter))
+            fail = self.rng.random() < self.error_rate
+            await asyncio.sleep(delay)
+            if fail:
+                self.failures += 1
+                raise ModelHTTPError(status_code=503, model_name=name, body="injected by loadtest")
+            prompt = " ".join(
+                part.content for part in messages[-1].parts
+                if isinstance(part, UserPromptPart) and isinstance(part.content, str)
+            )
+            return ModelResponse(parts=[TextPart(respond(prompt))], model_name=name)
+
+        return FunctionModel(run, model_name=f"fake-{name}")
+
+    def interview_reply(self, prompt: str) -> str:
+        from main import INTERVIEW_COMPLETE_TOKEN
+
+        if END_OF_INTERVIEW in prompt:
+            return f"Thank you, the interview is over. The call will end in 30 seconds. {INTERVIEW_COMPLETE_TOKEN}"
+        return f"Thanks for sharing. Question {self.rng.randint(1, 999)}: how did you measure the impact of that work?"
+
+    def feedback_reply(self, prompt: str) -> str:
+        scores = {
+            field: self.rng.randint(40, 95)
+            for field in ("score", "communication_score", "technical_score", "problem_solving_score", "culture_fit_score")
+        }
+        return json.dumps({
+            **scores,
+            "summary": "Structured answers with concrete examples.",
+            "strengths": ["Clear structure", "Quantified impact"],
+            "improvements": ["Discuss failure modes"],
+            "improvement_tips": ["Practice capacity estimates"],
+            "recommended_resources": ["Designing Data-Intensive Applications"],
+        })
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Override every agent in the fallback pools with a fake model of the same name."""
+        from agent import FEEDBACK_AGENT_POOL, INTERVIEW_AGENT_POOL
+
+        with contextlib.ExitStack() as stack:
+            for name, agent in INTERVIEW_AGENT_POOL:
+                stack.enter_context(agent.override(model=self.model(name, self.interview_reply)))
+            for name, agent in FEEDBACK_AGENT_POOL:
+                stack.enter_context(agent.override(model=self.model(name, self.feedback_reply)))
+            yield self
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client, method: str, path: str, label: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except Exception:
+            self.errors[label] += 1
+            self.latencies[label].append(time.perf_counter() - started)
+            raise
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+
+async def run_candidate(client, recorder: Recorder, index: int, turns: int, rng: random.Random) -> bool:
+    """One simulated candidate; returns False if the flow stopped on an error."""
+    # Requests run in this task's context, so the fake model draws from this RNG too
+    _candidate_rng.set(rng)
+    config = {"role": f"Backend Engineer {index}", "interview_type": rng.choice(["Technical", "Behavioral", "Mixed"])}
+    response = await recorder.call(client, "POST", "/api/interview/start", "POST /api/interview/start", json={"config": config})
+    if response.status_code != 200:
+        return False
+    session_id = response.json()["session_id"]
+
+    for turn in range(turns):
+        # Long, specific answers keep the follow-up heuristic out of the way
+        answer = " ".join(rng.choice(ANSWER_WORDS) for _ in range(40))
+        if turn == turns - 1:
+            answer += " " + END_OF_INTERVIEW
+        response = await recorder.call(
+            client, "POST", "/api/interview/chat", "POST /api/interview/chat",
+            json={"session_id": session_id, "content": answer},
+        )
+        if response.status_code != 200:
+            return False
+        if response.json().get("is_interview_ended"):
+            break
+
+    response = await recorder.call(
+        client, "POST", "/api/interview/feedback", "POST /api/interview/feedback", json={"session_id": session_id}
+    )
+    if response.status_code != 200:
+        return False
+    response = await recorder.call(
+        client, "POST", "/api/interview/export-pdf", "POST /api/interview/export-pdf", json={"session_id": session_id}
+    )
+    return response.status_code == 200
+
+
+async def run_load(args) -> Dict[str, Any]:
+    import httpx
+    from loop_monitor import LoopLagSampler, loop_monitor
+    from main import app
+
+    llm = FakeLLM(args.model_latency, args.model_jitter, args.model_error_rate, args.seed)
+    recorder = Recorder()
+    sampler = LoopLagSampler(interval=0.01)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def candidate(index: int) -> bool:
+        async with semaphore:
+            try:
+                return await run_candidate(client, recorder, index, args.turns, random.Random(f"{args.seed}:{index}"))
+            except Exception as e:
+                print(f"⚠️ Candidate {index} failed: {e}")
+                return False
+
+    await app.router.startup()
+    # The report lists the routes that blocked the loop, so the (opt-in) monitor is always on here
+    loop_monitor.start()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            with llm.installed():
+                sampler.start()
+                started = time.perf_counter()
+                results = await asyncio.gather(*(candidate(i) for i in range(args.candidates)))
+                elapsed = time.perf_counter() - started
+                await sampler.stop()
+    finally:
+        await app.router.shutdown()
+
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "config": {
+            "candidates": args.candidates, "concurrency": args.concurrency, "turns": args.turns,
+            "backend": args.backend, "model_latency": args.model_latency, "model_jitter": args.model_jitter,
+            "model_error_rate": args.model_error_rate, "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "completed_candidates": sum(results),
+        "requests": total_requests,
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "candidates_per_second": round(args.candidates / elapsed, 3),
+        "endpoints": {
+            label: {
+                "count": len(values),
+                "errors": recorder.errors[label],
+                "statuses": dict(recorder.statuses[label]),
+                **{f"p{pct}_ms": round(percentile(values, pct) * 1000, 2) for pct in (50, 95, 99)},
+                "max_ms": round(max(values) * 1000, 2),
+            }
+            for label, values in recorder.latencies.items()
+        },
+        "loop_lag_ms": {
+            **{f"p{pct}": round(percentile(sampler.samples, pct) * 1000, 2) for pct in (50, 95, 99)},
+            "max": round(max(sampler.samples, default=0) * 1000, 2),
+            "samples": len(sampler.samples),
+        },
+        "model": {"calls": llm.calls, "injected_failures": llm.failures},
+        "blocking_routes": [row for row in loop_monitor.worst_routes(3) if row["blocks"]],
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    config = report["config"]
+    print(
+        f"🏁 {config['candidates']} candidates, concurrency {config['concurrency']}, {config['turns']} turns, "
+        f"fake model {config['model_latency'] * 1000:.0f}±{config['model_jitter'] * 1000:.0f} ms "
+        f"({config['model_error_rate']:.0%} errors), {config['backend']} backend"
+    )
+    print(f"  {'endpoint':<32} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for label, stats in report["endpoints"].items():
+        print(
+            f"  {label:<32} {stats['count']:>6} {stats['errors']:>6} {stats['p50_ms']:>9.1f} "
+            f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}"
+        )
+        if stats["errors"]:
+            print(f"  {'':<32} statuses {stats['statuses']}")
+    lag = report["loop_lag_ms"]
+    print(
+        f"  throughput {report['throughput_rps']} req/s, {report['candidates_per_second']} candidates/s "
+        f"({report['completed_candidates']}/{config['candidates']} completed in {report['elapsed_seconds']} s)"
+    )
+    print(f"  event loop lag p50 {lag['p50']} ms, p99 {lag['p99']} ms, max {lag['max']} ms")
+    print(f"  model calls {report['model']['calls']} ({report['model']['injected_failures']} injected failures)")
+    for row in report["blocking_routes"]:
+        stack = row["top_stacks"][0]["stack"] if row["top_stacks"] else []
+        print(
+            f"  blocked loop: {row['route']} {row['blocks']}x, max {row['max_block_ms']} ms"
+            + (f" at {stack[-1]}" if stack else "")
+        )
+
+
+def check_thresholds(report: Dict[str, Any], max_p99_ms: float, max_error_rate: float) -> List[str]:
+    problems = []
+    for label, stats in report["endpoints"].items():
+        if max_p99_ms and stats["p99_ms"] > max_p99_ms:
+            problems.append(f"{label} p99 {stats['p99_ms']} ms > {max_p99_ms} ms")
+        if max_error_rate is not None and stats["errors"] / stats["count"] > max_error_rate:
+            problems.append(f"{label} error rate {stats['errors'] / stats['count']:.2%} > {max_error_rate:.2%}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=4, help="answers per interview (the last one ends it)")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="mean fake model latency (s)")
+    parser.add_argument("--model-jitter", type=float, default=0.05, help="standard deviation of the latency (s)")
+    parser.add_argument("--model-error-rate", type=float, default=0.0, help="fraction of model calls failing with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-p99-ms", type=float, default=0, help="exit 1 if any endpoint's p99 is above this")
+    parser.add_argument("--max-error-rate", type=float, help="exit 1 if any endpoint's error rate is above this")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="interviewflow-loadtest-")
+    # Must be set before main (and the modules it imports) read their configuration
+    os.environ["DATA_BACKEND"] = args.backend
+    os.environ["DATA_SQLITE_PATH"] = os.path.join(workdir, "data.db")
+    os.environ["AUDIO_STORAGE_BACKEND"] = "local"
+    os.environ["LEADER_LEASE_BACKEND"] = "memory"
+    os.environ.setdefault("MISTRAL_API_KEY", "loadtest")
+    # Keep per-request library logging out of the report
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    try:
+        report = asyncio.run(run_load(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    problems = check_thresholds(report, args.max_p99_ms, args.max_error_rate)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Event-loop lag and blocking-call detection.
+
+- Every event-loop callback is timed (asyncio.Handle._run is wrapped). Time
+  is charged to the request whose task ran it (through a context variable set
+  by LoopMonitorMiddleware), or to "background" for scheduler jobs, queues
+  and other tasks outside a request.
+- A callback running longer than LOOP_BLOCK_THRESHOLD_MS is a block. A
+  watchdog thread samples the loop thread's stack while it is stuck, so the
+  report points at the blocking call (bcrypt, ReportLab, a sync client...).
+- A sampler task measures how late a short sleep wakes up (loop lag).
+
+Off unless LOOP_MONITOR_ENABLED=true; nothing is patched while it is off.
+Summaries are in GET /api/metrics under "event_loop". The worst routes with
+their most common blocking stacks are at GET /api/debug/event-loop (only
+with DEBUG_ENDPOINTS=true).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# Opt-in: wrapping Handle._run adds a little work to every callback on the loop
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 50))
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", 100))
+_LAG_SAMPLES = 600
+_STACK_DEPTH = 12
+_TOP_STACKS = 3
+BACKGROUND = "background"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100) of unsorted samples; 0.0 when empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoopLagSampler:
+    """Measures how late a sleep(interval) wakes up; anything holding the loop shows up as lag."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_MS / 1000, maxlen: Optional[int] = None):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=maxlen)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        samples = list(self.samples)
+        return {
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            "max_ms": round(max(samples, default=0) * 1000, 2),
+        }
+
+
+class RequestTiming:
+    """Loop time charged to one request; `route` is set once the response is sent."""
+
+    __slots__ = ("route", "busy", "blocked", "blocks", "block_max", "stacks")
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.blocks = 0
+        self.block_max = 0.0
+        self.stacks: List[tuple] = []
+
+
+_current_request: ContextVar[Optional[RequestTiming]] = ContextVar("loop_monitor_request", default=None)
+
+
+def _route_totals() -> Dict[str, Any]:
+    return {
+        "requests": 0, "wall_total": 0.0, "wall_max": 0.0, "busy_total": 0.0,
+        "blocked_total": 0.0, "blocks": 0, "block_max": 0.0, "stacks": Counter(),
+    }
+
+
+def _format_stack(frame) -> tuple:
+    """Innermost frames of the loop thread, without asyncio and monitor plumbing."""
+    entries = [
+        f"{os.path.basename(f.filename)}:{f.lineno} {f.name}"
+        for f in traceback.extract_stack(frame)
+        if f"{os.sep}asyncio{os.sep}" not in f.filename and f.filename != __file__
+    ]
+    return tuple(entries[-_STACK_DEPTH:])
+
+
+class LoopMonitor:
+    def __init__(self, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.lag = LoopLagSampler(maxlen=_LAG_SAMPLES)
+        self.routes: Dict[str, Dict[str, Any]] = {}
+        self._original_run = None
+        self._loop_thread_id: Optional[int] = None
+        # (started_at, handle) of the callback running on the loop, read by the watchdog
+        self._running: Optional[tuple] = None
+        self._sampled: Optional[tuple] = None
+        self._sampled_stack: tuple = ()
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._original_run is not None
+
+    def start(self) -> None:
+        """Install the callback timer, watchdog thread and lag sampler (call from the event loop)."""
+        if self.started:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._original_run = original_run = asyncio.events.Handle._run
+        monitor = self
+
+        def timed_run(handle):
+            started = time.perf_counter()
+            running = monitor._running = (started, handle)
+            try:
+                original_run(handle)
+            finally:
+                monitor._running = None
+                monitor._record_callback(handle, running, time.perf_counter() - started)
+
+        asyncio.events.Handle._run = timed_run
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        self.lag.start()
+
+    async def stop(self) -> None:
+        if not self.started:
+            return
+        await self.lag.stop()
+        self._stop.set()
+        asyncio.events.Handle._run = self._original_run
+        self._original_run = None
+
+    def _watch(self) -> None:
+        """Sample the loop thread's stack once per callback that is still running past the threshold."""
+        while not self._stop.wait(self.threshold / 2):
+            running = self._running
+            if running is None or running is self._sampled:
+                continue
+            if time.perf_counter() - running[0] < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._sampled_stack = _format_stack(frame)
+                self._sampled = running
+
+    def _record_callback(self, handle, running: tuple, elapsed: float) -> None:
+        context = getattr(handle, "_context", None)
+        timing = context.get(_current_request) if context is not None else None
+        if timing is not None and timing.route is not None:
+            # A request without real I/O finishes inside one callback, so the
+            # step is only timed after end_request; charge the route directly
+            self._add_late(timing.route, running, handle, elapsed)
+            return
+        if timing is not None:
+            timing.busy += elapsed
+        if elapsed < self.threshold:
+            return
+
+        stack = self._stack_for(running, handle)
+        if timing is not None:
+            timing.blocked += elapsed
+            timing.blocks += 1
+            timing.block_max = max(timing.block_max, elapsed)
+            timing.stacks.append(stack)
+        else:
+            with self._lock:
+                self._add_block(self.routes.setdefault(BACKGROUND, _route_totals()), elapsed, stack)
+
+    def _stack_for(self, running: tuple, handle) -> tuple:
+        if self._sampled is running:
+            return self._sampled_stack
+        # Finished before the watchdog looked; the callback itself is the best hint
+        return (f"{getattr(handle, '_callback', handle)!r}"[:200],)
+
+    @staticmethod
+    def _add_block(totals: Dict[str, Any], elapsed: float, stack: tuple) -> None:
+        totals["blocked_total"] += elapsed
+        totals["blocks"] += 1
+        totals["block_max"] = max(totals["block_max"], elapsed)
+        totals["stacks"][stack] += 1
+
+    def _add_late(self, route: str, running: tuple, handle, elapsed: float) -> None:
+        blocked = elapsed >= self.threshold
+        stack = self._stack_for(running, handle) if blocked else None
+        with self._lock:
+            totals = self.routes.setdefault(route, _route_totals())
+            totals["busy_total"] += elapsed
+            if blocked:
+                self._add_block(totals, elapsed, stack)
+
+    def end_request(self, route: str, timing: RequestTiming, wall: float) -> None:
+        timing.route = route
+        with self._lock:
+            totals = self.routes.setdefault(route, _route_totals())
+            totals["requests"] += 1
+            totals["wall_total"] += wall
+            totals["wall_max"] = max(totals["wall_max"], wall)
+            totals["busy_total"] += timing.busy
+            totals["blocked_total"] += timing.blocked
+            totals["blocks"] += timing.blocks
+            totals["block_max"] = max(totals["block_max"], timing.block_max)
+            totals["stacks"].update(timing.stacks)
+
+    def worst_routes(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Routes ordered by total time they held the loop in blocking callbacks."""
+        with self._lock:
+            ranked = sorted(self.routes.items(), key=lambda item: item[1]["blocked_total"], reverse=True)[:limit]
+            rows = []
+            for route, totals in ranked:
+                requests = totals["requests"] or 1
+                rows.append({
+                    "route": route,
+                    "requests": totals["requests"],
+                    "avg_wall_ms": round(totals["wall_total"] / requests * 1000, 2),
+                    "max_wall_ms": round(totals["wall_max"] * 1000, 2),
+                    "avg_loop_busy_ms": round(totals["busy_total"] / requests * 1000, 2),
+                    "blocks": totals["blocks"],
+                    "blocked_total_ms": round(totals["blocked_total"] * 1000, 2),
+                    "max_block_ms": round(totals["block_max"] * 1000, 2),
+                    "top_stacks": [
+                        {"count": count, "stack": list(stack)}
+                        for stack, count in totals["stacks"].most_common(_TOP_STACKS)
+                    ],
+                })
+            return rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            blocks = sum(t["blocks"] for t in self.routes.values())
+            blocked = sum(t["blocked_total"] for t in self.routes.values())
+        return {
+            "enabled": self.started,
+            "threshold_ms": self.threshold * 1000,
+            "lag": self.lag.stats(),
+            "blocks": blocks,
+            "blocked_total_ms": round(blocked * 1000, 2),
+        }
+
+
+loop_monitor = LoopMonitor()
+
+
+class LoopMonitorMiddleware:
+    """Charges loop time to the request's route (the path template, so ids do not split routes)."""
+
+    def __init__(self, app, monitor: LoopMonitor = loop_monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.monitor.started:
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        # Not reset afterwards: the callback running this code is timed only
+        # after it returns, and must still find the request in its context
+        _current_request.set(timing)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            label = f"{scope['method']} {route.path if route is not None else '(unmatched)'}"
+            self.monitor.end_request(label, timing, time.perf_counter() - started)
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from typing import Any, Awaitable, Callable, List, Optional, Union
+
+import aiosmtplib
+
+from tasks import BackgroundTaskQueue
+
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))
+# Idle connections older than this are closed instead of reused (servers drop them)
+MAIL_IDLE_TIMEOUT_SECONDS = float(os.getenv("MAIL_IDLE_TIMEOUT_SECONDS", 120))
+# Idle connections older than this get a NOOP before reuse
+MAIL_KEEPALIVE_CHECK_SECONDS = float(os.getenv("MAIL_KEEPALIVE_CHECK_SECONDS", 30))
+MAIL_QUEUE_CONCURRENCY = int(os.getenv("MAIL_QUEUE_CONCURRENCY", MAIL_POOL_SIZE))
+MAIL_RATE_PER_MINUTE = float(os.getenv("MAIL_RATE_PER_MINUTE", 60))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", 2))
+
+
+class RawMessage:
+    """Already serialized message (headers + MIME body) that is sent byte for byte."""
+
+    __slots__ = ("sender", "recipients", "subject", "data")
+
+    def __init__(self, sender: str, recipients: List[str], subject: str, data: bytes):
+        self.sender = sender
+        self.recipients = recipients
+        self.subject = subject
+        self.data = data
+
+    def __getitem__(self, header: str) -> Optional[str]:
+        return {"From": self.sender, "To": ", ".join(self.recipients), "Subject": self.subject}.get(header)
+
+
+OutboundMessage = Union[EmailMessage, RawMessage]
+
+
+class PermanentMailError(Exception):
+    """Delivery failed in a way retrying will not fix (bad recipient, auth, 5xx)."""
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, PermanentMailError):
+        return False
+    if isinstance(exc, aiosmtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(exc, aiosmtplib.SMTPResponseException):
+        return 400 <= exc.code < 500
+    return True
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open and hands them out
+    one caller at a time, so consecutive messages skip connect/STARTTLS/login.
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable[aiosmtplib.SMTP]], size: int = MAIL_POOL_SIZE):
+        self._connect = connect
+        self.size = size
+        # Created on first use so it binds to the serving event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[tuple] = []  # (connection, last_used)
+        self.connections_opened = 0
+
+    async def _open(self) -> aiosmtplib.SMTP:
+        smtp = await self._connect()
+        self.connections_opened += 1
+        return smtp
+
+    async def _discard(self, smtp: aiosmtplib.SMTP) -> None:
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            smtp, last_used = self._idle.pop()
+            idle_for = time.monotonic() - last_used
+            if not smtp.is_connected or idle_for > MAIL_IDLE_TIMEOUT_SECONDS:
+                await self._discard(smtp)
+                continue
+            if idle_for > MAIL_KEEPALIVE_CHECK_SECONDS:
+                try:
+                    await smtp.noop()
+                except Exception:
+                    smtp.close()
+                    continue
+            return smtp
+        return await self._open()
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            smtp = await self._checkout()
+            try:
+                yield smtp
+            except Exception:
+                # Unknown protocol state after a failure: do not reuse
+                await self._discard(smtp)
+                raise
+            else:
+                self._idle.append((smtp, time.monotonic()))
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            await self._discard(smtp)
+
+
+class RateLimiter:
+    """Token bucket limiting sends to the provider's per-minute quota."""
+
+    def __init__(self, per_minute: float = MAIL_RATE_PER_MINUTE):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, min(per_minute, 10.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class MailQueue(BackgroundTaskQueue):
+    """
+    Outbound mail queue: bounded concurrency, rate limiting, and retries with
+    exponential backoff for transient failures (BackgroundTaskQueue). Dead
+    letters keep the subject and error but never the recipients, since they
+    are reported on /api/metrics.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[OutboundMessage], Awaitable[Any]],
+        concurrency: int = MAIL_QUEUE_CONCURRENCY,
+        rate_per_minute: float = MAIL_RATE_PER_MINUTE,
+        max_attempts: int = MAIL_MAX_ATTEMPTS,
+    ):
+        super().__init__(workers=concurrency, max_attempts=max_attempts, retry_base_seconds=MAIL_RETRY_BASE_SECONDS)
+        self._deliver = deliver
+        self.rate_limiter = RateLimiter(rate_per_minute)
+
+    def enqueue_message(self, message: OutboundMessage) -> "asyncio.Future[bool]":
+        """Queue a message; the returned future resolves to True once sent, False if it never was."""
+        return self.enqueue(f"mail '{message['Subject']}'", self._send, message)
+
+    async def _send(self, message: OutboundMessage) -> None:
+        await self.rate_limiter.acquire()
+        await self._deliver(message)
+
+    def _is_retryable(self, exc: Exception) -> bool:
+        return is_transient(exc)
+
+    def _error_summary(self, exc: Exception) -> str:
+        # Server replies often quote the recipient address
+        if isinstance(exc, aiosmtplib.SMTPResponseException):
+            return f"{type(exc).__name__} {exc.code}"
+        return type(exc).__name__
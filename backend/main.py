@@ -1,8 +1,11 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Response
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from firebase_admin import firestore
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+import asyncio
+import logging
 import uuid
 import json
 import os
@@ -15,7 +18,7 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 # Import Beanie models
 from models import (
     InterviewConfig, InterviewState, UserResponse, Message, COMPANY_PROFILES,
-    User, Interview, UserSettings
+    User, Interview, InterviewSummary
 )
 from agent import (
     interview_agent, feedback_agent, improvement_agent,
@@ -27,13 +30,36 @@ from firebase_admin import firestore
 from auth import (
     UserCreate, UserLogin, Token, UserResponse as AuthUserResponse,
     create_user, authenticate_user, get_user_by_email, create_access_token,
-    get_current_user, require_auth
+    get_current_user, require_auth, password_hasher,
+    FIREBASE_AUTH_REPAIR_INTERVAL_MINUTES, firebase_auth_queue, repair_firebase_auth
 )
 from resume_parser import parse_resume, generate_resume_context
 from speech_analyzer import analyze_all_responses
 from jd_parser import parse_job_description, generate_jd_context
-from pdf_generator import generate_pdf_report
+from pdf_generator import invalidate_pdf_cache
+from pdf_pool import (
+    PdfPoolBusy, PdfRenderTimeout, TempFileResponse, pdf_pool_stats, render_pdf_file,
+    render_pdf_report, shutdown_pdf_pool, start_pdf_pool, stream_reports_zip
+)
 from email_service import EmailService
+from leader import LeaderElector, get_lease_store
+from loop_monitor import LOOP_MONITOR_ENABLED, LoopMonitorMiddleware, loop_monitor
+from response_cache import response_cache, session_scope, user_scope
+from repositories import HistoryCursor, close_repositories, get_repositories, init_repositories
+from settings_store import load_settings, save_settings
+from pagination import InvalidCursor, decode_cursor, encode_cursor, query_scope
+from user_stats import load_user_stats, stats_response
+from reminders import REMINDER_INTERVAL_HOURS, dispatch_due_reminders, dispatch_reminders, next_reminder_at
+from telemetry import TracingMiddleware, init_telemetry, shutdown_telemetry, span, tag_session
+from storage import (
+    UPLOAD_DIR, AudioStaticFiles, StorageError, StorageQuotaExceeded, get_audio_storage
+)
+
+# Newer modules log through `logging`; uvicorn only configures its own loggers
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 
 app = FastAPI(title="InterviewFlow AI API", version="2.0.0")
 
@@ -81,91 +107,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static directory for audio uploads
-UPLOAD_DIR = "uploads"
+# Charges event-loop time and blocking callbacks to routes (see loop_monitor.py)
+app.add_middleware(LoopMonitorMiddleware)
+
+# Route spans and latency histograms, exported per TELEMETRY_EXPORTER (see telemetry.py)
+app.add_middleware(TracingMiddleware)
+
+# Diagnostics that expose internals (stack samples); off unless DEBUG_ENDPOINTS=true
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+
+# Mount static directory for audio uploads (served by the local storage backend)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/uploads", AudioStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 
 # Services
 email_service = EmailService()
 scheduler = AsyncIOScheduler()
+# Every worker runs the scheduler, but only the lease holder executes jobs
+scheduler_leader = LeaderElector("scheduler")
 
-async def check_reminders():
+async def check_reminders(fence):
     """Background task to send reminders based on user settings."""
     print("⏰ Checking for reminders...")
     
-    db = get_db()
-    if not db:
-        print("❌ Database not initialized, skipping reminders")
-        return
-        
-    # Query users who have enabled email reminders
-    docs = db.collection('user_settings').where('email_reminders', '==', True).stream()
-    
-    count = 0
-    now = datetime.utcnow()
+    repos = get_repositories()
+    if repos.name == "firestore":
+        result = await dispatch_reminders(get_db(), email_service, fence=fence)
+    else:
+        result = await dispatch_due_reminders(repos, email_service, fence=fence)
     
-    for doc in docs:
-        settings_data = doc.to_dict()
-        user_id = settings_data.get('user_id')
-        frequency = settings_data.get('reminder_frequency', 'weekly')
-        last_sent = settings_data.get('last_reminder_sent')
-        
-        # Calculate if reminder should be sent based on frequency
-        should_send = False
-        if last_sent is None:
-            should_send = True
-        else:
-            # Handle Firestore timestamp
-            if hasattr(last_sent, 'timestamp'):
-                last_sent = datetime.fromtimestamp(last_sent.timestamp())
-            
-            days_since = (now - last_sent).days
-            
-            if frequency == 'daily' and days_since >= 1:
-                should_send = True
-            elif frequency == 'weekly' and days_since >= 7:
-                should_send = True
-            elif frequency == 'monthly' and days_since >= 30:
-                should_send = True
-        
-        if not should_send:
-            continue
-            
-        # Fetch user to get email
-        user_doc = db.collection('users').document(user_id).get()
-        
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            email = user_data.get('email')
-            full_name = user_data.get('full_name')
-            
-            # Send reminder
-            success = await email_service.send_reminder(email, full_name)
-            
-            if success:
-                # Update last_reminder_sent timestamp
-                db.collection('user_settings').document(doc.id).update({
-                    'last_reminder_sent': now
-                })
-                count += 1
-    
-    if count > 0:
-        print(f"✅ Sent {count} reminders.")
+    if result["sent"] > 0:
+        print(f"✅ Sent {result['sent']} reminders ({result['failed']} failed).")
     else:
         print("ℹ️ No reminders to send at this time.")
 
 # Initialize DB and Scheduler on startup
 @app.on_event("startup")
 async def on_startup():
+    init_telemetry()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
     await init_db()
+    await init_repositories()
+    start_pdf_pool()
     
     # Start scheduler
-    scheduler.add_job(check_reminders, 'interval', hours=24) # Daily check
+    scheduler_leader.start(get_lease_store(get_db()))
+    # Only due settings are queried, so frequent checks stay cheap
+    scheduler.add_job(
+        scheduler_leader.run_job, 'interval', hours=REMINDER_INTERVAL_HOURS,
+        args=["check_reminders", check_reminders]
+    )
+    if get_repositories().name == "firestore":
+        scheduler.add_job(
+            scheduler_leader.run_job, 'interval', minutes=FIREBASE_AUTH_REPAIR_INTERVAL_MINUTES,
+            args=["repair_firebase_auth", repair_firebase_auth]
+        )
     scheduler.start()
     print("🚀 Scheduler started.")
 
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    scheduler.shutdown(wait=False)
+    await scheduler_leader.stop()
+    shutdown_pdf_pool()
+    await email_service.close()
+    await firebase_auth_queue.stop()
+    await close_repositories()
+    await loop_monitor.stop()
+    shutdown_telemetry()
+
 # Test endpoint to trigger reminder manually
 @app.post("/api/test-reminder")
 async def test_reminder(user: User = Depends(require_auth)):
@@ -188,41 +201,26 @@ def parse_interview_completion(raw_text: str) -> tuple[str, bool]:
 
 
 async def finalize_completed_interview(session_id: str, state: InterviewState):
-    db = get_db()
-    docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-    for doc in docs:
-        doc_ref = db.collection('interviews').document(doc.id)
-        doc_ref.update({
-            'completed_at': datetime.utcnow(),
-            'transcript': [m.model_dump() for m in state.conversation_history]
-        })
-        break
+    await get_repositories().interviews.update_by_session(session_id, {
+        'completed_at': datetime.utcnow(),
+        'transcript': [m.model_dump() for m in state.conversation_history]
+    })
 
 
 async def restore_session(session_id: str) -> Optional[InterviewState]:
     """Restore session state from database if missing in memory."""
-    db = get_db()
-    docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-    
-    interview_data = None
-    for doc in docs:
-        interview_data = doc.to_dict()
-        break
-        
-    if not interview_data:
-        return None
-    
-    if not interview_data.get('config_json'):
+    interview = await get_repositories().interviews.get_by_session(session_id)
+    if not interview or not interview.config_json:
         return None
 
     try:
-        config = InterviewConfig(**interview_data['config_json'])
+        config = InterviewConfig(**interview.config_json)
         state = InterviewState(
             interview_config=config,
             max_questions=config.max_questions
         )
         
-        transcript = interview_data.get('transcript', [])
+        transcript = interview.transcript or []
         if transcript:
             state.conversation_history = [Message(**m) for m in transcript]
             
@@ -230,7 +228,7 @@ async def restore_session(session_id: str) -> Optional[InterviewState]:
         state.question_count = len([m for m in state.conversation_history if m.role == "model" and "?" in m.content])
         
         # Check completion
-        state.is_completed = interview_data.get('score') is not None
+        state.is_completed = interview.score is not None
         
         sessions[session_id] = state
         return state
@@ -241,14 +239,9 @@ async def restore_session(session_id: str) -> Optional[InterviewState]:
 
 async def save_session_state(session_id: str, state: InterviewState):
     """Persist current session state to database."""
-    db = get_db()
-    docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-    
-    for doc in docs:
-        db.collection('interviews').document(doc.id).update({
-            'transcript': [m.model_dump() for m in state.conversation_history]
-        })
-        break
+    await get_repositories().interviews.update_by_session(session_id, {
+        'transcript': [m.model_dump() for m in state.conversation_history]
+    })
 
 
 class StartSessionRequest(BaseModel):
@@ -264,6 +257,27 @@ async def health_check():
     return {"status": "healthy", "version": "2.0.0"}
 
 
+@app.get("/api/metrics")
+async def get_metrics():
+    return {
+        "password_hashing": password_hasher.stats(),
+        "mail": email_service.stats(),
+        "firebase_auth": firebase_auth_queue.stats(),
+        "pdf_pool": pdf_pool_stats(),
+        "scheduler": await scheduler_leader.stats(),
+        "response_cache": response_cache.stats(),
+        "event_loop": loop_monitor.stats(),
+    }
+
+
+@app.get("/api/debug/event-loop")
+async def get_event_loop_offenders(limit: int = 10):
+    """Routes that held the event loop longest, with their most common blocking stacks."""
+    if not DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {**loop_monitor.stats(), "routes": loop_monitor.worst_routes(max(1, min(limit, 50)))}
+
+
 @app.post("/api/auth/register", response_model=Token)
 async def register(user_data: UserCreate):
     existing = await get_user_by_email(user_data.email)
@@ -273,8 +287,8 @@ async def register(user_data: UserCreate):
     user = await create_user(user_data)
     access_token = create_access_token(data={"sub": user.email})
     
-    # Send welcome email
-    await email_service.send_email(
+    # Send welcome email after responding (retried by the mail queue)
+    email_service.queue_email(
         [user.email], 
         "Welcome to InterviewFlow.ai! 🚀", 
         f"<h1>Welcome {user.full_name}!</h1><p>We're excited to help you ace your next interview.</p>"
@@ -334,15 +348,21 @@ async def parse_jd_endpoint(req: JDParseRequest):
 
 
 @app.get("/api/companies")
-async def get_companies():
-    return {
-        name: {
-            "name": profile.name,
-            "interview_style": profile.interview_style,
-            "focus_areas": profile.focus_areas
+async def get_companies(request: Request):
+    async def build():
+        return {
+            name: {
+                "name": profile.name,
+                "interview_style": profile.interview_style,
+                "focus_areas": profile.focus_areas
+            }
+            for name, profile in COMPANY_PROFILES.items()
         }
-        for name, profile in COMPANY_PROFILES.items()
-    }
+    
+    # Static per deploy: cacheable by browsers and proxies, ETag covers redeploys
+    return await response_cache.respond(
+        request, "companies", build, cache_control="public, max-age=3600", ttl=0
+    )
 
 
 @app.post("/api/interview/start")
@@ -351,19 +371,8 @@ async def start_interview(
     user: Optional[User] = Depends(get_current_user)
 ):
     session_id = str(uuid.uuid4())
+    tag_session(session_id)
     
-    # Apply user settings if available and not overridden
-    if user:
-        db = get_db()
-        settings_refs = db.collection('user_settings').where('user_id', '==', user.id).stream()
-        for ref in settings_refs:
-            settings = UserSettings(**ref.to_dict())
-            # If the request didn't explicitly specify timer settings (or used defaults), we could apply user settings.
-            # However, since config comes from frontend, it's safer to rely on frontend sending the right values.
-            # We'll trust config but maybe log or ensure consistency.
-            # Actually, let's just use the config provided by the user.
-            break
-
     config = req.config
     state = InterviewState(
         interview_config=config,
@@ -386,9 +395,10 @@ async def start_interview(
         started_at=datetime.utcnow()
     )
     
-    db = get_db()
-    interview_dict = interview_model.model_dump(exclude={"id"})
-    update_time, doc_ref = db.collection('interviews').add(interview_dict)
+    # Also counts the interview in the owner's dashboard stats
+    await get_repositories().interviews.create(interview_model)
+    if user:
+        response_cache.bump(user_scope(user.id, "stats"), user_scope(user.id, "interviews"))
     
     response = await run_interview_with_fallback(
         "Please start the interview by introducing yourself and asking the first question.",
@@ -407,6 +417,7 @@ async def start_interview(
 
 @app.post("/api/interview/chat")
 async def chat(req: UserResponse):
+    tag_session(req.session_id)
     state = sessions.get(req.session_id)
     if not state:
         state = await restore_session(req.session_id)
@@ -485,83 +496,115 @@ async def chat(req: UserResponse):
 
 @app.post("/api/interview/{session_id}/upload-audio")
 async def upload_audio(session_id: str, blob: UploadFile = File(...)):
-    db = get_db()
-    docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-    
-    interview_doc = None
-    for doc in docs:
-        interview_doc = doc
-        break
-
-    if not interview_doc:
+    tag_session(session_id)
+    interviews = get_repositories().interviews
+    interview = await interviews.get_by_session(session_id)
+    if not interview:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    bucket = get_bucket()
-    if not bucket:
-        raise HTTPException(status_code=500, detail="Storage bucket not initialized")
-        
-    filename = f"uploads/{session_id}/{datetime.now().timestamp()}.webm"
-    blob_ref = bucket.blob(filename)
-    
-    # Upload from file-like object
-    blob_ref.upload_from_file(blob.file, content_type="audio/webm")
+    try:
+        storage = get_audio_storage()
+        with span("storage.save", **{"storage.backend": storage.name}):
+            key = storage.save(session_id, blob.file, content_type="audio/webm")
+    except StorageQuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     
-    # Make public so frontend can access (or use signed URLs, using public for ease here)
-    blob_ref.make_public()
-    url = blob_ref.public_url
+    audio_urls = interview.audio_urls or {}
+    current_idx = len(interview.transcript or [])
     
-    interview_data = interview_doc.to_dict()
-    audio_urls = interview_data.get('audio_urls', {})
-    transcript = interview_data.get('transcript', [])
-    current_idx = len(transcript)
+    # Store the object key; playback URLs are signed when the report is read
+    audio_urls[str(current_idx)] = key
     
-    audio_urls[str(current_idx)] = url
+    await interviews.update(interview.id, {'audio_urls': audio_urls})
+    response_cache.bump(session_scope(session_id))
     
-    db.collection('interviews').document(interview_doc.id).update({
-        'audio_urls': audio_urls
-    })
-    
-    return {"status": "uploaded", "url": url}
+    return {"status": "uploaded", "url": storage.sign_url(key)}
+
+
+def sign_audio_urls(audio_urls: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Turn stored audio object keys into short-lived playback URLs."""
+    try:
+        return get_audio_storage().sign_urls(audio_urls)
+    except StorageError as e:
+        print(f"⚠️ Could not sign audio URLs: {e}")
+        return audio_urls or {}
 
 
 class FeedbackRequest(BaseModel):
     session_id: str
 
 
+def stored_feedback(interview: Interview) -> dict:
+    """Feedback payload for an interview whose report was already generated."""
+    return {
+        "score": interview.score or 0,
+        "summary": interview.summary or '',
+        "strengths": interview.strengths or [],
+        "improvements": interview.improvements or [],
+        "communication_score": interview.communication_score or 0,
+        "technical_score": interview.technical_score or 0,
+        "problem_solving_score": interview.problem_solving_score or 0,
+        "culture_fit_score": interview.culture_fit_score or 0,
+        "improvement_tips": interview.improvement_tips or [],
+        "voice_metrics": interview.voice_metrics,
+        "transcript": interview.transcript or [],
+        "audio_urls": sign_audio_urls(interview.audio_urls)
+    }
+
+
+def feedback_written(session_id: str, user_id: Optional[str]) -> None:
+    """Invalidate everything derived from an interview's feedback."""
+    invalidate_pdf_cache(session_id)
+    response_cache.bump(session_scope(session_id))
+    if user_id:
+        response_cache.bump(user_scope(user_id, "stats"), user_scope(user_id, "interviews"))
+
+
+async def winning_feedback(interviews, session_id: str) -> dict:
+    """Feedback stored by a concurrent request whose write_feedback got there first."""
+    interview = await interviews.get_by_session(session_id)
+    if not interview or interview.score is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return stored_feedback(interview)
+
+
+@app.get("/api/interview/{session_id}/feedback")
+async def get_stored_feedback(session_id: str, request: Request):
+    """Previously generated feedback, with ETag revalidation; 404 until it exists."""
+    tag_session(session_id)
+    async def build():
+        interview = await get_repositories().interviews.get_by_session(session_id)
+        if not interview or interview.score is None:
+            raise HTTPException(status_code=404, detail="Feedback not generated yet")
+        return stored_feedback(interview)
+    
+    return await response_cache.respond(request, ("feedback", session_id), build, scope=session_scope(session_id))
+
+
 @app.post("/api/interview/feedback")
-async def get_feedback(req: FeedbackRequest):
+async def get_feedback(req: FeedbackRequest, request: Request):
     session_id = req.session_id
+    tag_session(session_id)
     
-    # First check if feedback already exists in database
-    db = get_db()
-    docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-    
-    existing_interview = None
-    existing_doc_id = None
-    for doc in docs:
-        existing_interview = doc.to_dict()
-        existing_doc_id = doc.id
-        break
+    cached = response_cache.lookup(request, ("feedback", session_id), scope=session_scope(session_id))
+    if cached is not None:
+        return cached
     
+    # First check if feedback already exists in database
+    interviews = get_repositories().interviews
+    existing_interview = await interviews.get_by_session(session_id)
     if not existing_interview:
         raise HTTPException(status_code=404, detail="Session not found")
     
     # If feedback already exists (score is set), return cached data
-    if existing_interview.get('score') is not None:
-        return {
-            "score": existing_interview.get('score', 0),
-            "summary": existing_interview.get('summary', ''),
-            "strengths": existing_interview.get('strengths', []),
-            "improvements": existing_interview.get('improvements', []),
-            "communication_score": existing_interview.get('communication_score', 0),
-            "technical_score": existing_interview.get('technical_score', 0),
-            "problem_solving_score": existing_interview.get('problem_solving_score', 0),
-            "culture_fit_score": existing_interview.get('culture_fit_score', 0),
-            "improvement_tips": existing_interview.get('improvement_tips', []),
-            "voice_metrics": existing_interview.get('voice_metrics'),
-            "transcript": existing_interview.get('transcript', []),
-            "audio_urls": existing_interview.get('audio_urls', {})
-        }
+    if existing_interview.score is not None:
+        async def build():
+            return stored_feedback(existing_interview)
+        return await response_cache.respond(
+            request, ("feedback", session_id), build, scope=session_scope(session_id)
+        )
     
     # No cached feedback, need to generate it
     state = sessions.get(session_id)
@@ -589,12 +632,11 @@ async def get_feedback(req: FeedbackRequest):
             "voice_metrics": None
         }
         
-        # Update DB for short interview
-        db = get_db()
-        docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-        for doc in docs:
-            db.collection('interviews').document(doc.id).update(fallback_data)
-            break
+        # Update DB (and the owner's dashboard stats) for short interview
+        # False: another request already stored feedback, so answer with that one
+        if not await interviews.write_feedback(existing_interview.id, fallback_data):
+            return await winning_feedback(interviews, session_id)
+        feedback_written(session_id, existing_interview.user_id)
             
         return fallback_data
     
@@ -609,34 +651,26 @@ async def get_feedback(req: FeedbackRequest):
         
         data["voice_metrics"] = voice_metrics.model_dump()
         
-        db = get_db()
-        docs = db.collection('interviews').where('session_id', '==', session_id).stream()
-        
-        interview_data = None
-        for doc in docs:
-            interview_doc = doc
-            interview_data = doc.to_dict()
-            
-            db.collection('interviews').document(doc.id).update({
-                'score': data.get("score", 0),
-                'communication_score': data.get("communication_score", 0),
-                'technical_score': data.get("technical_score", 0),
-                'problem_solving_score': data.get("problem_solving_score", 0),
-                'culture_fit_score': data.get("culture_fit_score", 0),
-                'summary': data.get("summary", ""),
-                'strengths': data.get("strengths", []),
-                'improvements': data.get("improvements", []),
-                'improvement_tips': data.get("improvement_tips", []),
-                'voice_metrics': voice_metrics.model_dump()
-            })
-            break
-            
-        if not interview_data:
-             raise HTTPException(status_code=404, detail="Session not found during feedback")
+        # Interview fields and the owner's dashboard stats are written in one transaction
+        written = await interviews.write_feedback(existing_interview.id, {
+            'score': data.get("score", 0),
+            'communication_score': data.get("communication_score", 0),
+            'technical_score': data.get("technical_score", 0),
+            'problem_solving_score': data.get("problem_solving_score", 0),
+            'culture_fit_score': data.get("culture_fit_score", 0),
+            'summary': data.get("summary", ""),
+            'strengths': data.get("strengths", []),
+            'improvements': data.get("improvements", []),
+            'improvement_tips': data.get("improvement_tips", []),
+            'voice_metrics': voice_metrics.model_dump()
+        })
+        if not written:
+            return await winning_feedback(interviews, session_id)
+        feedback_written(session_id, existing_interview.user_id)
         
         # Add transcript and audio URLs to response
         data["transcript"] = [m.model_dump() for m in state.conversation_history]
-        data["audio_urls"] = interview_data.get('audio_urls', {})
+        data["audio_urls"] = sign_audio_urls(existing_interview.audio_urls)
         
         return data
     except Exception as e:
@@ -655,23 +689,9 @@ async def get_feedback(req: FeedbackRequest):
         }
 
 
-@app.post("/api/interview/export-pdf")
-async def export_pdf(req: FeedbackRequest):
-    db = get_db()
-    docs = db.collection('interviews').where('session_id', '==', req.session_id).stream()
-    
-    interview_data = None
-    for doc in docs:
-        interview_data = doc.to_dict()
-        break
-        
-    if not interview_data:
-        raise HTTPException(status_code=404, detail="Interview not found")
-        
-    # Create Interview object to access fields easily
-    interview_model = Interview(**interview_data)
-    
-    pdf_bytes = generate_pdf_report(
+def interview_report_fields(interview_model: Interview) -> dict:
+    """Keyword arguments for the PDF renderer built from a stored interview."""
+    return dict(
         session_id=interview_model.session_id,
         role=interview_model.role,
         experience_level=interview_model.experience_level or "Mid-Level",
@@ -687,136 +707,205 @@ async def export_pdf(req: FeedbackRequest):
         transcript=interview_model.transcript or [],
         voice_metrics=interview_model.voice_metrics
     )
+
+
+class ExportPdfRequest(FeedbackRequest):
+    # Include every transcript message instead of the first 24 (sent from a temp file)
+    full_transcript: bool = False
+
+
+@app.post("/api/interview/export-pdf")
+async def export_pdf(req: ExportPdfRequest):
+    tag_session(req.session_id)
+    interview_model = await get_repositories().interviews.get_by_session(req.session_id)
+    if not interview_model:
+        raise HTTPException(status_code=404, detail="Interview not found")
+    
+    report_fields = interview_report_fields(interview_model)
+    filename = f"interviewflow_report_{req.session_id[:8]}.pdf"
+
+    try:
+        if req.full_transcript:
+            # Long transcripts are rendered to a temp file in the pool and sent
+            # from disk instead of being built in one buffer. The response only
+            # starts once the render has finished; see render_pdf_file.
+            path = await render_pdf_file(**report_fields)
+            return TempFileResponse(
+                path,
+                media_type="application/pdf",
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+
+        # Re-rendered only when the scored content changed since the last export.
+        # Rendering is CPU-bound, so it runs in the PDF process pool, not on the loop.
+        pdf_bytes = await render_pdf_report(**report_fields)
+    except PdfPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except PdfRenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=interviewflow_report_{req.session_id[:8]}.pdf"}
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+# Only the fields the report needs; skips resume_data, config_json and audio_urls
+REPORT_FIELDS = [
+    'session_id', 'role', 'experience_level', 'score', 'summary', 'strengths',
+    'improvements', 'communication_score', 'technical_score', 'problem_solving_score',
+    'culture_fit_score', 'improvement_tips', 'transcript', 'voice_metrics', 'started_at'
+]
+EXPORT_PAGE_SIZE = 25
+
+
+async def iter_user_reports(user_id: str):
+    """Yield (archive name, report fields) for every interview of a user, one page at a time."""
+    reports = get_repositories().interviews.iter_for_user(user_id, REPORT_FIELDS, page_size=EXPORT_PAGE_SIZE)
+    async for data in reports:
+        interview_model = Interview(**data)
+        safe_role = re.sub(r"[^A-Za-z0-9]+", "_", interview_model.role).strip("_") or "interview"
+        name = f"{interview_model.started_at:%Y-%m-%d}_{safe_role}_{interview_model.session_id[:8]}.pdf"
+        yield name, interview_report_fields(interview_model)
+
+
+@app.get("/api/interview/export-all")
+async def export_all_pdfs(user: User = Depends(require_auth)):
+    return StreamingResponse(
+        stream_reports_zip(iter_user_reports(user.id)),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=interviewflow_reports.zip"}
+    )
+
+
+HISTORY_PAGE_MAX = 100
+# Upper bound on documents read per page when a score range is filtered in-process
+HISTORY_MAX_SCAN = 500
+
+
+def summary_row(i: InterviewSummary) -> dict:
+    return {
+        **i.model_dump(exclude={"id", "started_at", "completed_at"}),
+        "started_at": i.started_at.isoformat() if i.started_at else None,
+        "completed_at": i.completed_at.isoformat() if i.completed_at else None
+    }
+
+
+async def fetch_history_page(
+    user_id: str,
+    limit: int,
+    after: Optional[HistoryCursor] = None,
+    company: Optional[str] = None,
+    interview_type: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+):
+    """
+    One page of a user's interviews, newest first. Equality filters run in
+    the database. The score range is checked here, because Firestore would
+    need the score to be the first sort key. Returns (rows, last row
+    consumed, more left).
+    """
+    interviews = get_repositories().interviews
+
+    def matches(summary: InterviewSummary) -> bool:
+        if min_score is not None and (summary.score is None or summary.score < min_score):
+            return False
+        if max_score is not None and (summary.score is None or summary.score > max_score):
+            return False
+        return True
+
+    rows, last, scanned = [], None, 0
+    while scanned < HISTORY_MAX_SCAN:
+        chunk_size = limit + 1
+        cursor = (last.started_at, last.id) if last is not None else after
+        chunk = await interviews.page_for_user(user_id, chunk_size, cursor, company, interview_type)
+        for summary in chunk:
+            scanned += 1
+            if matches(summary):
+                if len(rows) == limit:
+                    # One match past the page: there is more, resume after `last`
+                    return rows, last, True
+                rows.append(summary)
+            last = summary
+        if len(chunk) < chunk_size:
+            return rows, last, False
+    return rows, last, True
+
+
+@app.get("/api/dashboard/history")
+async def get_interview_history(
+    user: User = Depends(require_auth),
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    company: Optional[str] = None,
+    interview_type: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None
+):
+    """Cursor-paginated interview history; pass next_cursor back to get the following page."""
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    scope = query_scope(company=company, interview_type=interview_type, min_score=min_score, max_score=max_score)
+    try:
+        after = decode_cursor(cursor, scope) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows, last, has_more = await fetch_history_page(
+        user.id, limit, after, company, interview_type, min_score, max_score
     )
+    next_cursor = None
+    if has_more and last is not None:
+        next_cursor = encode_cursor(last.started_at, last.id, scope)
+    
+    return {
+        "items": [summary_row(i) for i in rows],
+        "next_cursor": next_cursor
+    }
 
 
 @app.get("/api/dashboard/interviews")
 async def get_user_interviews(
+    request: Request,
     user: User = Depends(require_auth),
     limit: int = 20
 ):
-    db = get_db()
-    print(f"🔍 Fetching interviews for user_id: '{user.id}'")
-    
-    # Simple query without order_by (avoids index issues)
-    docs = db.collection('interviews')\
-        .where('user_id', '==', user.id)\
-        .limit(limit)\
-        .stream()
-        
-    interviews = []
-    for doc in docs:
-        d = doc.to_dict()
-        print(f"  📝 Found interview: {d.get('session_id', 'N/A')[:8]}...")
-        interviews.append(Interview(**d))
-    
-    print(f"✅ Total interviews found: {len(interviews)}")
-    
-    # Sort in Python instead of Firestore
-    interviews.sort(key=lambda x: x.started_at or datetime.min, reverse=True)
-    
-    return [
-        {
-            "session_id": i.session_id,
-            "role": i.role,
-            "experience_level": i.experience_level,
-            "interview_type": i.interview_type,
-            "company": i.company,
-            "score": i.score,
-            "communication_score": i.communication_score,
-            "technical_score": i.technical_score,
-            "problem_solving_score": i.problem_solving_score,
-            "culture_fit_score": i.culture_fit_score,
-            "started_at": i.started_at.isoformat() if i.started_at else None,
-            "completed_at": i.completed_at.isoformat() if i.completed_at else None
-        }
-        for i in interviews
-    ]
+    """Most recent interviews (first page of /api/dashboard/history)."""
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    
+    async def build():
+        rows, _, _ = await fetch_history_page(user.id, limit)
+        return [summary_row(i) for i in rows]
+    
+    return await response_cache.respond(
+        request, ("interviews", user.id, limit), build, scope=user_scope(user.id, "interviews")
+    )
 
 
 @app.get("/api/dashboard/stats")
-async def get_user_stats(user: User = Depends(require_auth)):
-    db = get_db()
-    docs = db.collection('interviews').where('user_id', '==', user.id).stream()
-    
-    interviews = [Interview(**doc.to_dict()) for doc in docs]
-    
-    completed = [i for i in interviews if i.score is not None]
-    
-    if not completed:
-        return {
-            "total_interviews": len(interviews),
-            "average_score": 0,
-            "best_score": 0,
-            "recent_trend": "neutral",
-            "category_averages": {}
-        }
-    
-    scores = [i.score for i in completed]
+async def get_user_stats(request: Request, user: User = Depends(require_auth)):
+    async def build():
+        stats = await load_user_stats(get_repositories(), user.id)
+        return stats_response(stats)
     
-    # Sort locally for trend (if not sorted by DB)
-    completed.sort(key=lambda x: x.started_at)
-    
-    recent = completed[-5:] if len(completed) >= 5 else completed
-    if len(recent) >= 2:
-        first_half_avg = sum(i.score for i in recent[:len(recent)//2]) / (len(recent)//2)
-        second_half_avg = sum(i.score for i in recent[len(recent)//2:]) / (len(recent) - len(recent)//2)
-        trend = "improving" if second_half_avg > first_half_avg else "declining" if second_half_avg < first_half_avg else "stable"
-    else:
-        trend = "neutral"
-    
-    return {
-        "total_interviews": len(interviews),
-        "completed_interviews": len(completed),
-        "average_score": round(sum(scores) / len(scores), 1),
-        "best_score": max(scores),
-        "recent_trend": trend,
-        "category_averages": {
-            "communication": round(sum(i.communication_score or 0 for i in completed) / len(completed), 1),
-            "technical": round(sum(i.technical_score or 0 for i in completed) / len(completed), 1),
-            "problem_solving": round(sum(i.problem_solving_score or 0 for i in completed) / len(completed), 1),
-            "culture_fit": round(sum(i.culture_fit_score or 0 for i in completed) / len(completed), 1)
-        }
-    }
+    return await response_cache.respond(request, ("stats", user.id), build, scope=user_scope(user.id, "stats"))
 
 
 @app.get("/api/settings")
-async def get_settings(user: User = Depends(require_auth)):
-    db = get_db()
-    docs = db.collection('user_settings').where('user_id', '==', user.id).stream()
-    
-    settings_data = None
-    settings_doc_id = None
-    
-    for doc in docs:
-        settings_data = doc.to_dict()
-        settings_doc_id = doc.id
-        break
-        
-    if not settings_data:
-        # Create default
-        new_settings = UserSettings(user_id=user.id)
-        settings_dict = new_settings.model_dump(exclude={"id"})
-        _, ref = db.collection('user_settings').add(settings_dict)
-        settings_data = settings_dict
-        settings_doc_id = ref.id
-    
-    settings = UserSettings(**settings_data)
-    settings.id = settings_doc_id
+async def get_settings(request: Request, user: User = Depends(require_auth)):
+    async def build():
+        settings = await load_settings(get_repositories(), user.id)
+        return {
+            "theme": settings.theme,
+            "language": settings.language,
+            "enable_timer": settings.enable_timer,
+            "time_per_question": settings.time_per_question,
+            "email_reminders": settings.email_reminders,
+            "reminder_frequency": settings.reminder_frequency
+        }
     
-    return {
-        "theme": settings.theme,
-        "language": settings.language,
-        "enable_timer": settings.enable_timer,
-        "time_per_question": settings.time_per_question,
-        "email_reminders": settings.email_reminders,
-        "reminder_frequency": settings.reminder_frequency
-    }
+    return await response_cache.respond(request, ("settings", user.id), build, scope=user_scope(user.id, "settings"))
 
 
 class UpdateSettingsRequest(BaseModel):
@@ -833,23 +922,13 @@ async def update_settings(
     req: UpdateSettingsRequest,
     user: User = Depends(require_auth)
 ):
-    db = get_db()
-    docs = db.collection('user_settings').where('user_id', '==', user.id).stream()
-    
-    doc_ref = None
-    settings = None
-    
-    for doc in docs:
-        doc_ref = db.collection('user_settings').document(doc.id)
-        settings = UserSettings(**doc.to_dict())
-        break
-        
-    if not doc_ref:
-        new_settings = UserSettings(user_id=user.id)
-        settings_dict = new_settings.model_dump(exclude={"id"})
-        _, ref = db.collection('user_settings').add(settings_dict)
-        doc_ref = db.collection('user_settings').document(ref.id)
-        settings = new_settings
+    repos = get_repositories()
+    reminders_changed = req.email_reminders is not None or req.reminder_frequency is not None
+    # Only a reminder change needs the current settings: next_reminder_at builds on
+    # last_reminder_sent, which the reminder job writes from whichever worker leads, so
+    # it is read from the stored document. Other fields go straight to the merge-set.
+    # (Legacy auto-id settings are moved by `settings_store.py migrate`.)
+    settings = await load_settings(repos, user.id, fresh=True) if reminders_changed else None
     
     updates = {}
     if req.theme is not None:
@@ -864,8 +943,17 @@ async def update_settings(
         updates['email_reminders'] = req.email_reminders
     if req.reminder_frequency is not None:
         updates['reminder_frequency'] = req.reminder_frequency
+    if reminders_changed:
+        updates['next_reminder_at'] = next_reminder_at(
+            updates.get('email_reminders', settings.email_reminders),
+            updates.get('reminder_frequency', settings.reminder_frequency),
+            settings.last_reminder_sent,
+            datetime.utcnow()
+        )
     
     if updates:
-        doc_ref.update(updates)
+        # Merge-set: one round trip, creates the document for users without settings
+        await save_settings(repos, user.id, updates)
+        response_cache.bump(user_scope(user.id, "settings"))
     
     return {"status": "updated"}
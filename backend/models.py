@@ -93,6 +93,8 @@ class User(BaseModel):
     full_name: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
+    # Set at registration until the Firebase Auth record exists (see auth.repair_firebase_auth)
+    firebase_auth_pending: bool = False
 
 
 class UserSettings(BaseModel):
@@ -105,6 +107,9 @@ class UserSettings(BaseModel):
     time_per_question: int = 120
     email_reminders: bool = False
     reminder_frequency: str = "weekly"
+    last_reminder_sent: Optional[datetime] = None
+    # Maintained by reminders.next_reminder_at(); None while reminders are off
+    next_reminder_at: Optional[datetime] = None
 
 
 class Interview(BaseModel):
@@ -144,6 +149,25 @@ class Interview(BaseModel):
     audio_urls: Optional[Dict] = None
 
 
+class InterviewSummary(BaseModel):
+    """Dashboard listing row, read with a select() projection (no transcript, resume or config)."""
+    id: Optional[str] = None
+    session_id: str
+    role: str
+    experience_level: Optional[str] = None
+    interview_type: str = "Mixed"
+    company: Optional[str] = None
+    
+    score: Optional[int] = None
+    communication_score: Optional[int] = None
+    technical_score: Optional[int] = None
+    problem_solving_score: Optional[int] = None
+    culture_fit_score: Optional[int] = None
+    
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+
 COMPANY_PROFILES = {
     "google": CompanyProfile(
         name="Google",
@@ -0,0 +1,32 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Tuple
+
+
+class InvalidCursor(ValueError):
+    """Cursor token is malformed or was issued for a different query."""
+
+
+def query_scope(**params: Any) -> str:
+    """Short fingerprint of the query parameters a cursor is valid for."""
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:12]
+
+
+def encode_cursor(started_at: datetime, doc_id: str, scope: str) -> str:
+    payload = {"t": started_at.isoformat(), "id": doc_id, "q": scope}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, scope: str) -> Tuple[datetime, str]:
+    """(started_at, document id) of the last row the cursor was issued for."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        values = (datetime.fromisoformat(payload["t"]), str(payload["id"]))
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    if payload.get("q") != scope:
+        raise InvalidCursor("Cursor does not match the query filters")
+    return values
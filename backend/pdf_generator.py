@@ -1,7 +1,10 @@
+import hashlib
+import json
+import os
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, List, Optional, Union
 
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_LEFT
@@ -22,6 +25,8 @@ from reportlab.platypus import (
 )
 from reportlab.lib.utils import ImageReader
 
+from cache import TTLCache
+
 PAGE_BG = colors.HexColor("#0b0b0e")
 CARD_BG = colors.HexColor("#101015")
 BORDER = colors.HexColor("#23232d")
@@ -41,6 +46,42 @@ RING_CONFIG = [
 
 WORDMARK_PATH = Path(__file__).resolve().parents[1] / "frontend" / "public" / "wordmark.png"
 
+# Transcript messages included in the regular (non full-transcript) report
+TRANSCRIPT_PREVIEW_MESSAGES = 24
+
+# Number of rendered reports kept in memory (one entry per session)
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", 128))
+
+_pdf_cache = TTLCache(maxsize=PDF_CACHE_SIZE, ttl=None)
+
+
+def _build_styles() -> Dict[str, ParagraphStyle]:
+    styles = getSampleStyleSheet()
+    return {
+        "brand": ParagraphStyle("brand", parent=styles["Heading1"], fontName="Helvetica-Bold", fontSize=22, textColor=TEXT, leading=24, spaceAfter=2),
+        "title": ParagraphStyle("title", parent=styles["Heading1"], fontName="Helvetica-Bold", fontSize=24, textColor=TEXT, leading=28, spaceAfter=6),
+        "h2": ParagraphStyle("h2", parent=styles["Heading2"], fontName="Helvetica-Bold", fontSize=13, textColor=TEXT, leading=16, spaceBefore=8, spaceAfter=6),
+        "body": ParagraphStyle("body", parent=styles["BodyText"], fontName="Helvetica", fontSize=10.2, textColor=TEXT, leading=14),
+        "muted": ParagraphStyle("muted", parent=styles["BodyText"], fontName="Helvetica", fontSize=9, textColor=MUTED, leading=12),
+    }
+
+
+STYLES = _build_styles()
+
+
+def _load_wordmark():
+    """Read and decode the wordmark once; returns (raw bytes, ImageReader) or (None, None)."""
+    if not WORDMARK_PATH.exists():
+        return None, None
+    try:
+        raw = WORDMARK_PATH.read_bytes()
+        return raw, ImageReader(BytesIO(raw))
+    except Exception:
+        return None, None
+
+
+WORDMARK_BYTES, WORDMARK_READER = _load_wordmark()
+
 
 class Card(Flowable):
     def __init__(self, width: float, height: float):
@@ -151,9 +192,9 @@ def _page_bg(canv: canvas.Canvas, doc: Any):
     canv.rect(0, 0, letter[0], letter[1], fill=1, stroke=0)
 
     footer_y = 14
-    if WORDMARK_PATH.exists():
+    if WORDMARK_READER is not None:
         try:
-            mark = ImageReader(str(WORDMARK_PATH))
+            mark = WORDMARK_READER
             iw, ih = mark.getSize()
             target_w = 94
             target_h = target_w * (ih / iw) if iw else 16
@@ -174,7 +215,8 @@ def _page_bg(canv: canvas.Canvas, doc: Any):
     canv.restoreState()
 
 
-def generate_pdf_report(
+def _build_pdf_report(
+    target: Union[str, BinaryIO],
     session_id: str,
     role: str,
     experience_level: str,
@@ -189,10 +231,10 @@ def generate_pdf_report(
     improvement_tips: Optional[List[str]] = None,
     transcript: Optional[List[Dict[str, Any]]] = None,
     voice_metrics: Optional[Dict[str, Any]] = None,
-) -> bytes:
-    buffer = BytesIO()
+    full_transcript: bool = False,
+) -> None:
     doc = SimpleDocTemplate(
-        buffer,
+        target,
         pagesize=letter,
         topMargin=0.6 * inch,
         bottomMargin=0.6 * inch,
@@ -200,12 +242,11 @@ def generate_pdf_report(
         rightMargin=0.55 * inch,
     )
 
-    styles = getSampleStyleSheet()
-    brand = ParagraphStyle("brand", parent=styles["Heading1"], fontName="Helvetica-Bold", fontSize=22, textColor=TEXT, leading=24, spaceAfter=2)
-    title = ParagraphStyle("title", parent=styles["Heading1"], fontName="Helvetica-Bold", fontSize=24, textColor=TEXT, leading=28, spaceAfter=6)
-    h2 = ParagraphStyle("h2", parent=styles["Heading2"], fontName="Helvetica-Bold", fontSize=13, textColor=TEXT, leading=16, spaceBefore=8, spaceAfter=6)
-    body = ParagraphStyle("body", parent=styles["BodyText"], fontName="Helvetica", fontSize=10.2, textColor=TEXT, leading=14)
-    muted = ParagraphStyle("muted", parent=styles["BodyText"], fontName="Helvetica", fontSize=9, textColor=MUTED, leading=12)
+    brand = STYLES["brand"]
+    title = STYLES["title"]
+    h2 = STYLES["h2"]
+    body = STYLES["body"]
+    muted = STYLES["muted"]
 
     ring_values = [communication_score, technical_score, problem_solving_score, culture_fit_score]
 
@@ -213,9 +254,9 @@ def generate_pdf_report(
 
     # Starter cover page
     story.append(Spacer(1, 2.0 * inch))
-    if WORDMARK_PATH.exists():
+    if WORDMARK_BYTES is not None:
         try:
-            cover = Image(str(WORDMARK_PATH))
+            cover = Image(BytesIO(WORDMARK_BYTES))
             cover._restrictSize(4.2 * inch, 1.0 * inch)
             cover.hAlign = "CENTER"
             story.append(cover)
@@ -334,11 +375,63 @@ def generate_pdf_report(
             story.append(Paragraph(f"<b>{prefix}:</b> {content}", body))
             story.append(Spacer(1, 5))
             shown += 1
-            if shown >= 24:
+            if not full_transcript and shown >= TRANSCRIPT_PREVIEW_MESSAGES:
                 story.append(Paragraph("<i>Transcript truncated in PDF for readability.</i>", muted))
                 break
 
     doc.build(story, onFirstPage=_page_bg, onLaterPages=_page_bg)
+
+
+def generate_pdf_report(**fields: Any) -> bytes:
+    """Render the report in memory; see _build_pdf_report for the fields."""
+    buffer = BytesIO()
+    _build_pdf_report(buffer, **fields)
     pdf_bytes = buffer.getvalue()
     buffer.close()
     return pdf_bytes
+
+
+def write_pdf_report(path: str, **fields: Any) -> int:
+    """
+    Render the report with the complete transcript straight to a file and
+    return its size. Used for full-transcript exports so the document never
+    has to be held in memory as one bytes object.
+    """
+    _build_pdf_report(path, full_transcript=True, **fields)
+    return os.path.getsize(path)
+
+
+def report_content_hash(fields: Dict[str, Any]) -> str:
+    """Stable hash of the fields that end up in the rendered report."""
+    payload = json.dumps(fields, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup_pdf_report(session_id: str, content_hash: str) -> Optional[bytes]:
+    cached = _pdf_cache.get(session_id)
+    if cached is not None and cached[0] == content_hash:
+        return cached[1]
+    return None
+
+
+def store_pdf_report(session_id: str, content_hash: str, pdf_bytes: bytes) -> None:
+    _pdf_cache.set(session_id, (content_hash, pdf_bytes))
+
+
+def get_cached_pdf_report(**fields: Any) -> bytes:
+    """
+    Same arguments as generate_pdf_report, but returns the previously rendered
+    document when nothing in the report changed since the last export.
+    """
+    session_id = fields["session_id"]
+    content_hash = report_content_hash(fields)
+
+    pdf_bytes = lookup_pdf_report(session_id, content_hash)
+    if pdf_bytes is None:
+        pdf_bytes = generate_pdf_report(**fields)
+        store_pdf_report(session_id, content_hash, pdf_bytes)
+    return pdf_bytes
+
+
+def invalidate_pdf_cache(session_id: str) -> None:
+    _pdf_cache.pop(session_id)
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from opentelemetry import trace
+from starlette.responses import FileResponse
+
+from pdf_generator import (
+    generate_pdf_report, lookup_pdf_report, report_content_hash, store_pdf_report,
+    write_pdf_report
+)
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Worker processes used for ReportLab rendering (0 renders in a thread instead)
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", 2))
+# Renders allowed to be running or queued before new exports are rejected
+PDF_POOL_MAX_PENDING = int(os.getenv("PDF_POOL_MAX_PENDING", 8))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", 30))
+PDF_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class PdfPoolBusy(Exception):
+    pass
+
+
+class PdfRenderTimeout(Exception):
+    pass
+
+
+def _warm_worker():
+    """Process initializer: import reportlab and decode the wordmark up front."""
+    import pdf_generator  # noqa: F401  (module import loads styles and wordmark)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_stats = {"renders": 0, "cache_hits": 0, "rejected": 0, "timeouts": 0, "in_flight": 0}
+
+
+def start_pdf_pool(warm: bool = True) -> None:
+    """Create the pool and (with warm=True) spawn every worker so the first export is not cold."""
+    global _executor
+    if PDF_POOL_WORKERS <= 0 or _executor is not None:
+        return
+    # spawn, not fork: the parent holds gRPC/Firebase threads that must not be forked
+    _executor = ProcessPoolExecutor(
+        max_workers=PDF_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_worker,
+    )
+    if not warm:
+        return
+    for future in [_executor.submit(_ping) for _ in range(PDF_POOL_WORKERS)]:
+        future.result()
+    logger.info("PDF render pool ready (%d workers)", PDF_POOL_WORKERS)
+
+
+def shutdown_pdf_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def pdf_pool_stats() -> dict:
+    return {**_stats, "workers": PDF_POOL_WORKERS, "max_pending": PDF_POOL_MAX_PENDING}
+
+
+def _submit(fn, *args: Any, **kwargs: Any) -> Future:
+    global _executor
+    if PDF_POOL_WORKERS <= 0:
+        future: Future = Future()
+        asyncio.get_running_loop().run_in_executor(None, _run_into, future, fn, args, kwargs)
+        return future
+    if _executor is None:
+        start_pdf_pool(warm=False)
+    try:
+        return _executor.submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        logger.warning("PDF render pool broken, restarting")
+        _executor = None
+        start_pdf_pool(warm=False)
+        return _executor.submit(fn, *args, **kwargs)
+
+
+def _run_into(future: Future, fn, args, kwargs) -> None:
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except BaseException as exc:
+        future.set_exception(exc)
+
+
+def _release(_: Future) -> None:
+    _stats["in_flight"] -= 1
+
+
+def submit_to_pdf_pool(fn, *args: Any, **kwargs: Any) -> Future:
+    """
+    Queue a rendering function on the pool, raising PdfPoolBusy right away
+    when too many renders are already pending.
+    """
+    if _stats["in_flight"] >= PDF_POOL_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise PdfPoolBusy("PDF renderer is busy, try again shortly")
+
+    future = _submit(fn, *args, **kwargs)
+    _stats["in_flight"] += 1
+    # The slot is freed when the worker is really done, not when we stop waiting,
+    # so timed-out renders still count against the pending limit.
+    loop = asyncio.get_running_loop()
+    future.add_done_callback(lambda f: loop.call_soon_threadsafe(_release, f))
+    return future
+
+
+async def wait_for_render(future: Future) -> Any:
+    # Covers queueing behind other renders as well as the render itself
+    with span("pdf.render"):
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), PDF_RENDER_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            _stats["timeouts"] += 1
+            future.cancel()
+            raise PdfRenderTimeout(f"PDF render exceeded {PDF_RENDER_TIMEOUT_SECONDS:.0f}s")
+
+
+async def run_in_pdf_pool(fn, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a rendering function off the event loop with backpressure and a timeout.
+    Raises PdfPoolBusy when too many renders are pending and PdfRenderTimeout
+    when the render does not finish in time.
+    """
+    return await wait_for_render(submit_to_pdf_pool(fn, *args, **kwargs))
+
+
+async def render_pdf_report(**fields: Any) -> bytes:
+    """Cached, pooled equivalent of generate_pdf_report for request handlers."""
+    session_id = fields["session_id"]
+    content_hash = report_content_hash(fields)
+
+    pdf_bytes = lookup_pdf_report(session_id, content_hash)
+    trace.get_current_span().set_attribute("pdf.cache_hit", pdf_bytes is not None)
+    if pdf_bytes is not None:
+        _stats["cache_hits"] += 1
+        return pdf_bytes
+
+    pdf_bytes = await run_in_pdf_pool(generate_pdf_report, **fields)
+    _stats["renders"] += 1
+    store_pdf_report(session_id, content_hash, pdf_bytes)
+    return pdf_bytes
+
+
+async def render_pdf_file(**fields: Any) -> str:
+    """
+    Render a full-transcript report into a temp file in the pool and return
+    its path; serve it with TempFileResponse, which removes the file.
+
+    ReportLab only writes the document when it is closed, so nothing can be
+    sent before the render finishes: this bounds memory, not time to first byte. Awaiting it here (rather than inside the
+    response body) keeps PdfPoolBusy / PdfRenderTimeout and render errors
+    before the status line, so they become 503/504s instead of a truncated 200.
+    """
+    fd, path = tempfile.mkstemp(prefix="interviewflow_", suffix=".pdf")
+    os.close(fd)
+    try:
+        await wait_for_render(submit_to_pdf_pool(write_pdf_report, path, **fields))
+    except BaseException:
+        remove_file(path)
+        raise
+    _stats["renders"] += 1
+    return path
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class TempFileResponse(FileResponse):
+    """Sends a finished file in fixed-size chunks and deletes it afterwards, also when the client disconnects."""
+
+    chunk_size = PDF_STREAM_CHUNK_BYTES
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            remove_file(self.path)
+
+
+class _ZipSink:
+    """Unseekable write target for zipfile; collected bytes are drained after each entry."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def tell(self) -> int:
+        # Forces zipfile into streaming mode (data descriptors, no seeking back)
+        raise OSError("unseekable")
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _render_with_retry(fields: dict) -> bytes:
+    # A bulk export waits for pool capacity instead of failing half-way through
+    while True:
+        try:
+            return await render_pdf_report(**fields)
+        except PdfPoolBusy:
+            await asyncio.sleep(0.25)
+
+
+async def stream_reports_zip(
+    reports: AsyncIterator[Tuple[str, dict]],
+    window: int = 0,
+) -> AsyncIterator[bytes]:
+    """
+    Render (name, report_fields) pairs from `reports` and stream them as a zip
+    archive, emitting each PDF as soon as it finishes. At most `window` renders
+    are outstanding, so memory does not grow with the number of reports.
+    """
+    window = window or max(1, min(PDF_POOL_WORKERS, PDF_POOL_MAX_PENDING))
+    sink = _ZipSink()
+    failed: List[str] = []
+    pending: Dict[asyncio.Task, str] = {}
+    source = reports.__aiter__()
+    exhausted = False
+
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            while pending or not exhausted:
+                while not exhausted and len(pending) < window:
+                    try:
+                        name, fields = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending[asyncio.ensure_future(_render_with_retry(fields))] = name
+
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        archive.writestr(name, task.result())
+                    except Exception as e:
+                        logger.warning("Bulk export skipped %s: %s", name, e)
+                        failed.append(name)
+                    yield sink.drain()
+
+            if failed:
+                archive.writestr("export_errors.txt", "Could not render:\n" + "\n".join(failed) + "\n")
+        yield sink.drain()
+    finally:
+        # Client went away: stop rendering what is left of the window
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,277 @@
+"""
+Practice reminder dispatch.
+
+Every user_settings document carries next_reminder_at. It is derived from
+reminder_frequency and last_reminder_sent, and is None while reminders are
+off. A run only queries documents with next_reminder_at <= now, ordered by
+(next_reminder_at, __name__), so its cost follows the number of reminders
+that are due, not the number of opted-in users. This needs only the
+automatic single-field index on next_reminder_at. Do not exempt that field
+from indexing.
+
+The users of a page are fetched in one get_all, and reminders go through
+the mail queue concurrently. The new last_reminder_sent/next_reminder_at
+values for a page are committed in one batch together with the run
+checkpoint (jobs/reminders). A crashed run therefore resumes after the last
+committed page. When the scheduler passes a lease fence, it is checked
+before each page is sent, so a run that lost leadership stops instead of
+racing the new leader.
+
+Maintenance (from backend/):
+    python reminders.py backfill   # set next_reminder_at on existing settings
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from settings_store import invalidate_settings
+
+logger = logging.getLogger(__name__)
+
+# Page size doubles as the write batch size (Firestore caps a batch at 500 writes)
+REMINDER_PAGE_SIZE = min(int(os.getenv("REMINDER_PAGE_SIZE", 200)), 499)
+# A "running" checkpoint older than this is treated as abandoned and a new run starts
+REMINDER_RESUME_WINDOW_HOURS = float(os.getenv("REMINDER_RESUME_WINDOW_HOURS", 12))
+# How often the scheduler looks for due reminders
+REMINDER_INTERVAL_HOURS = float(os.getenv("REMINDER_INTERVAL_HOURS", 1))
+# Failed sends (after the mail queue's own retries) are tried again this much later
+REMINDER_FAILURE_RETRY_HOURS = float(os.getenv("REMINDER_FAILURE_RETRY_HOURS", 24))
+
+FREQUENCY_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+JOBS_COLLECTION = "jobs"
+CHECKPOINT_DOC = "reminders"
+SETTINGS_FIELDS = ["user_id", "reminder_frequency", "next_reminder_at"]
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    # Firestore returns timezone-aware timestamps; compare in naive UTC like the rest of the app
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):
+        return datetime.utcfromtimestamp(value.timestamp())
+    return value
+
+
+def next_reminder_at(enabled: bool, frequency: Optional[str], last_sent, now: datetime) -> Optional[datetime]:
+    """When the next reminder is due; a first reminder is due right away."""
+    if not enabled:
+        return None
+    last_sent = _as_datetime(last_sent)
+    if last_sent is None:
+        return now
+    return last_sent + timedelta(days=FREQUENCY_DAYS.get(frequency, FREQUENCY_DAYS["weekly"]))
+
+
+def _load_checkpoint(db, now: datetime) -> Dict[str, Any]:
+    snapshot = db.collection(JOBS_COLLECTION).document(CHECKPOINT_DOC).get()
+    checkpoint = snapshot.to_dict() if snapshot.exists else None
+    if checkpoint and checkpoint.get("status") == "running":
+        started = _as_datetime(checkpoint.get("run_started_at"))
+        if started and now - started < timedelta(hours=REMINDER_RESUME_WINDOW_HOURS):
+            return {**checkpoint, "run_started_at": started, "resumed": True}
+    return {"status": "running", "run_started_at": now, "cursor": None, "sent": 0, "failed": 0, "resumed": False}
+
+
+def _fetch_page(db, now: datetime, cursor: Optional[Dict[str, Any]]):
+    query = (
+        db.collection("user_settings")
+        .where("next_reminder_at", "<=", now)
+        .select(SETTINGS_FIELDS)
+        .order_by("next_reminder_at")
+        .order_by("__name__")
+        .limit(REMINDER_PAGE_SIZE)
+    )
+    if cursor:
+        query = query.start_after(cursor)
+    return list(query.stream())
+
+
+def _fetch_users(db, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    refs = [db.collection("users").document(uid) for uid in user_ids]
+    return {
+        snapshot.id: snapshot.to_dict()
+        for snapshot in db.get_all(refs, field_paths=["email", "full_name"])
+        if snapshot.exists
+    }
+
+
+def _commit_page(db, updates: Dict[str, Dict[str, Any]], checkpoint: Dict[str, Any]) -> None:
+    batch = db.batch()
+    for doc_id, fields in updates.items():
+        batch.update(db.collection("user_settings").document(doc_id), fields)
+    batch.set(db.collection(JOBS_COLLECTION).document(CHECKPOINT_DOC), {
+        key: value for key, value in checkpoint.items() if key != "resumed"
+    })
+    batch.commit()
+    for doc_id in updates:
+        invalidate_settings(doc_id)
+
+
+async def _send_page(
+    email_service, due: List[tuple], users: Dict[str, Dict[str, Any]], now: datetime, counts: Dict[str, Any]
+) -> Dict[str, Dict[str, Any]]:
+    """Queue the reminders of one page of (settings id, settings) and return the settings updates."""
+    updates: Dict[str, Dict[str, Any]] = {}
+    recipients = []
+    for doc_id, data in due:
+        user = users.get(data.get("user_id"), {})
+        if user.get("email"):
+            recipients.append((doc_id, data, user))
+        else:
+            # Orphaned settings: stop matching the due query
+            updates[doc_id] = {"next_reminder_at": None}
+
+    results = await asyncio.gather(*[
+        email_service.queue_reminder(user["email"], user.get("full_name"))
+        for _, _, user in recipients
+    ])
+    for (doc_id, data, _), ok in zip(recipients, results):
+        if ok:
+            counts["sent"] += 1
+            updates[doc_id] = {
+                "last_reminder_sent": now,
+                "next_reminder_at": next_reminder_at(True, data.get("reminder_frequency"), now, now),
+            }
+        else:
+            counts["failed"] += 1
+            updates[doc_id] = {"next_reminder_at": now + timedelta(hours=REMINDER_FAILURE_RETRY_HOURS)}
+    return updates
+
+
+async def dispatch_reminders(
+    db, email_service, fence: Optional[Callable[[], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """Send all due reminders; returns counts for the run. `fence` raises to stop between pages."""
+    if not email_service.configured:
+        logger.warning("Mail is not configured, skipping reminders")
+        return {"sent": 0, "failed": 0, "skipped": "mail not configured"}
+
+    checkpoint = await asyncio.to_thread(_load_checkpoint, db, datetime.utcnow())
+    now = checkpoint["run_started_at"]
+    if checkpoint["resumed"]:
+        logger.info("Resuming reminder run from %s after %s", now, checkpoint["cursor"])
+
+    pages = 0
+    while True:
+        page = await asyncio.to_thread(_fetch_page, db, now, checkpoint["cursor"])
+        if not page:
+            break
+        pages += 1
+
+        due = [(doc.id, doc.to_dict()) for doc in page]
+        user_ids = list({data["user_id"] for _, data in due if data.get("user_id")})
+        users = await asyncio.to_thread(_fetch_users, db, user_ids) if user_ids else {}
+        if fence is not None:
+            await fence()
+        updates = await _send_page(email_service, due, users, now, checkpoint)
+
+        last = page[-1]
+        checkpoint["cursor"] = {"next_reminder_at": last.get("next_reminder_at"), "__name__": last.id}
+        checkpoint["updated_at"] = datetime.utcnow()
+        if len(page) < REMINDER_PAGE_SIZE:
+            checkpoint["status"] = "done"
+        await asyncio.to_thread(_commit_page, db, updates, checkpoint)
+
+        if checkpoint["status"] == "done":
+            break
+
+    if checkpoint["status"] != "done":
+        # Last page was exactly full (or nothing was due); mark the run finished
+        checkpoint["status"] = "done"
+        checkpoint["updated_at"] = datetime.utcnow()
+        await asyncio.to_thread(_commit_page, db, {}, checkpoint)
+
+    return {"sent": checkpoint["sent"], "failed": checkpoint["failed"], "pages": pages, "resumed": checkpoint["resumed"]}
+
+
+async def dispatch_due_reminders(
+    repos, email_service, fence: Optional[Callable[[], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """
+    dispatch_reminders for the sqlite and memory data backends, through the
+    repositories. Every committed page leaves the due set (sent, retried
+    later or orphaned), so a run needs no cursor or checkpoint: an
+    interrupted one simply finds the rest still due next time.
+    """
+    if not email_service.configured:
+        logger.warning("Mail is not configured, skipping reminders")
+        return {"sent": 0, "failed": 0, "skipped": "mail not configured"}
+
+    now = datetime.utcnow()
+    counts = {"sent": 0, "failed": 0}
+    pages = 0
+    while True:
+        page = await repos.settings.due_for_reminder(now, REMINDER_PAGE_SIZE)
+        if not page:
+            break
+        pages += 1
+
+        due = [(settings.user_id, settings.model_dump()) for settings in page]
+        users = {
+            user_id: {"email": user.email, "full_name": user.full_name}
+            for user_id, user in (await repos.users.get_many([user_id for user_id, _ in due])).items()
+        }
+        if fence is not None:
+            await fence()
+        updates = await _send_page(email_service, due, users, now, counts)
+        for user_id, fields in updates.items():
+            await repos.settings.merge(user_id, fields)
+            invalidate_settings(user_id)
+
+        if len(page) < REMINDER_PAGE_SIZE:
+            break
+
+    return {**counts, "pages": pages, "resumed": False}
+
+
+def backfill_next_reminder_at(db) -> Dict[str, int]:
+    """Compute next_reminder_at for settings written before the field existed."""
+    now = datetime.utcnow()
+    stats = {"settings": 0, "updated": 0}
+    query = (
+        db.collection("user_settings")
+        .select(["email_reminders", "reminder_frequency", "last_reminder_sent", "next_reminder_at"])
+        .order_by("__name__")
+        .limit(REMINDER_PAGE_SIZE)
+    )
+    cursor = None
+    while True:
+        page = list((query.start_after(cursor) if cursor else query).stream())
+        batch = db.batch()
+        pending = 0
+        for doc in page:
+            stats["settings"] += 1
+            data = doc.to_dict()
+            value = next_reminder_at(
+                data.get("email_reminders", False), data.get("reminder_frequency"), data.get("last_reminder_sent"), now
+            )
+            if _as_datetime(data.get("next_reminder_at")) != value:
+                batch.update(doc.reference, {"next_reminder_at": value})
+                pending += 1
+        if pending:
+            batch.commit()
+            stats["updated"] += pending
+        if len(page) < REMINDER_PAGE_SIZE:
+            return stats
+        cursor = page[-1]
+
+
+def main():
+    from db import init_db, get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    asyncio.run(init_db())
+    db = get_db()
+    if not db:
+        raise SystemExit("Database not initialized")
+    print(f"✅ Backfill finished: {backfill_next_reminder_at(db)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,980 @@
+"""
+Async data access for request handlers.
+
+Handlers go through these repositories instead of a database client, so a
+request waiting on the database yields the event loop instead of blocking it
+(the sync Firestore client blocked the loop, or needed a thread per call).
+
+Backends (DATA_BACKEND):
+    firestore  the asyncio AsyncClient created in db.init_db() (default)
+    sqlite     one local file via aiosqlite; runs the API without a Firebase project
+    memory     single process only; for tests, benchmarks and local runs
+
+Maintenance CLIs and the Firestore reminder job still use the sync Firestore
+client from worker threads; they are not on the request path. Reminder runs
+on the other backends go through `due_for_reminder` and `get_many`.
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache import TTLCache
+from email_index import EMAILS_COLLECTION, normalize_email
+from models import Interview, InterviewSummary, User, UserSettings
+from settings_store import SETTINGS_COLLECTION
+from telemetry import TELEMETRY_ENABLED, TracedRepository
+from user_stats import USER_STATS_COLLECTION, apply_feedback
+
+logger = logging.getLogger(__name__)
+
+# firestore (default), sqlite (a local file, no Firebase project needed) or memory (single process)
+DATA_BACKEND = os.getenv("DATA_BACKEND", "firestore").lower()
+DATA_SQLITE_PATH = os.getenv("DATA_SQLITE_PATH", "data.db")
+
+INTERVIEWS_COLLECTION = "interviews"
+USERS_COLLECTION = "users"
+# Fall back to an email query for users created before the email index existed
+EMAIL_INDEX_FALLBACK = os.getenv("EMAIL_INDEX_FALLBACK", "true").lower() == "true"
+# Dashboard rows are read with a projection (no transcript, resume or config)
+INTERVIEW_SUMMARY_FIELDS = [name for name in InterviewSummary.model_fields if name != "id"]
+# (started_at, document id) of the last row of the previous page
+HistoryCursor = Tuple[datetime, str]
+
+
+class DuplicateEmail(Exception):
+    pass
+
+
+class InterviewRepository(ABC):
+    """Interview documents, looked up by session id or listed per user."""
+
+    @abstractmethod
+    async def create(self, interview: Interview) -> str:
+        """Store a new interview (and count it in the owner's stats); returns its id."""
+
+    @abstractmethod
+    async def get_by_session(self, session_id: str) -> Optional[Interview]:
+        ...
+
+    @abstractmethod
+    async def update(self, interview_id: str, fields: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def update_by_session(self, session_id: str, fields: Dict[str, Any]) -> bool:
+        """Update the interview of a session; False if there is none."""
+
+    @abstractmethod
+    async def write_feedback(self, interview_id: str, updates: Dict[str, Any]) -> bool:
+        """
+        Write feedback fields and fold the scores into the owner's stats,
+        atomically. Returns False (and writes nothing) if the interview
+        already had a score, so retries are not counted twice.
+        """
+
+    @abstractmethod
+    async def page_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[HistoryCursor] = None,
+        company: Optional[str] = None,
+        interview_type: Optional[str] = None,
+    ) -> List[InterviewSummary]:
+        """Up to `limit` summaries, newest first (started_at desc, id desc), after the cursor."""
+
+    @abstractmethod
+    def iter_for_user(self, user_id: str, fields: List[str], page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """Every interview of a user, restricted to `fields`, fetched a page at a time."""
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[User]:
+        ...
+
+    @abstractmethod
+    async def create(self, user: User, settings: UserSettings, stats: Dict[str, Any]) -> None:
+        """Store a user with their settings and stats; raises DuplicateEmail if the email is taken."""
+
+    @abstractmethod
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def list_ids(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, user_ids: List[str]) -> Dict[str, User]:
+        """Users by id; ids without a user are left out."""
+
+
+class SettingsRepository(ABC):
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[UserSettings]:
+        ...
+
+    @abstractmethod
+    async def merge(self, user_id: str, fields: Dict[str, Any]) -> None:
+        """Set `fields` on the user's settings, creating the record if needed."""
+
+    @abstractmethod
+    async def due_for_reminder(self, now: datetime, limit: int) -> List[UserSettings]:
+        """Up to `limit` settings whose next_reminder_at is <= now, longest overdue first."""
+
+
+class StatsRepository(ABC):
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def put(self, user_id: str, stats: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def replace_if_unchanged(
+        self, user_id: str, expected: Optional[Dict[str, Any]], stats: Dict[str, Any]
+    ) -> bool:
+        """Store `stats` only if the document still equals `expected` (None: no document)."""
+
+
+class Repositories:
+    def __init__(
+        self,
+        name: str,
+        interviews: InterviewRepository,
+        users: UserRepository,
+        settings: SettingsRepository,
+        stats: StatsRepository,
+        on_close: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.name = name
+        self.interviews = interviews
+        self.users = users
+        self.settings = settings
+        self.stats = stats
+        self._on_close = on_close
+
+    async def close(self) -> None:
+        if self._on_close is not None:
+            await self._on_close()
+
+
+# --- Firestore (AsyncClient) ---
+
+class FirestoreInterviewRepository(InterviewRepository):
+    def __init__(self, client):
+        self.client = client
+        # session_id -> document id never changes, so updates skip the lookup query
+        self._ids = TTLCache(maxsize=10000, ttl=3600)
+
+    def _collection(self):
+        return self.client.collection(INTERVIEWS_COLLECTION)
+
+    async def create(self, interview: Interview) -> str:
+        from firebase_admin import firestore
+
+        ref = self._collection().document()
+        batch = self.client.batch()
+        batch.set(ref, interview.model_dump(exclude={"id"}))
+        if interview.user_id:
+            stats_ref = self.client.collection(USER_STATS_COLLECTION).document(interview.user_id)
+            batch.set(stats_ref, {"total_interviews": firestore.Increment(1)}, merge=True)
+        await batch.commit()
+        self._ids.set(interview.session_id, ref.id)
+        return ref.id
+
+    async def get_by_session(self, session_id: str) -> Optional[Interview]:
+        query = self._collection().where("session_id", "==", session_id).limit(1)
+        async for doc in query.stream():
+            self._ids.set(session_id, doc.id)
+            return Interview(**{**doc.to_dict(), "id": doc.id})
+        return None
+
+    async def _find_id(self, session_id: str) -> Optional[str]:
+        doc_id = self._ids.get(session_id)
+        if doc_id is None:
+            query = self._collection().where("session_id", "==", session_id).select(["session_id"]).limit(1)
+            async for doc in query.stream():
+                doc_id = doc.id
+                self._ids.set(session_id, doc_id)
+        return doc_id
+
+    async def update(self, interview_id: str, fields: Dict[str, Any]) -> None:
+        await self._collection().document(interview_id).update(fields)
+
+    async def update_by_session(self, session_id: str, fields: Dict[str, Any]) -> bool:
+        doc_id = await self._find_id(session_id)
+        if doc_id is None:
+            return False
+        await self.update(doc_id, fields)
+        return True
+
+    async def write_feedback(self, interview_id: str, updates: Dict[str, Any]) -> bool:
+        from firebase_admin import firestore
+
+        interview_ref = self._collection().document(interview_id)
+        stats_collection = self.client.collection(USER_STATS_COLLECTION)
+
+        @firestore.async_transactional
+        async def write(transaction):
+            snapshot = await interview_ref.get(transaction=transaction)
+            interview = snapshot.to_dict() if snapshot.exists else None
+            if not interview or interview.get("score") is not None:
+                return False
+            user_id = interview.get("user_id")
+            stats = None
+            if user_id:
+                stats_snapshot = await stats_collection.document(user_id).get(transaction=transaction)
+                stats = stats_snapshot.to_dict() if stats_snapshot.exists else None
+
+            transaction.update(interview_ref, updates)
+            if stats and stats.get("initialized_at"):
+                transaction.set(stats_collection.document(user_id), apply_feedback(stats, updates))
+            elif user_id:
+                # Not counted yet, but a rebuild that already read the interviews must see a change
+                transaction.set(stats_collection.document(user_id), {"updated_at": datetime.utcnow()}, merge=True)
+            return True
+
+        return await write(self.client.transaction())
+
+    async def page_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[HistoryCursor] = None,
+        company: Optional[str] = None,
+        interview_type: Optional[str] = None,
+    ) -> List[InterviewSummary]:
+        from firebase_admin import firestore
+
+        # Served by the composite indexes in firestore.indexes.json
+        query = self._collection().where("user_id", "==", user_id)
+        if company:
+            query = query.where("company", "==", company)
+        if interview_type:
+            query = query.where("interview_type", "==", interview_type)
+        query = query\
+            .select(INTERVIEW_SUMMARY_FIELDS)\
+            .order_by("started_at", direction=firestore.Query.DESCENDING)\
+            .order_by("__name__", direction=firestore.Query.DESCENDING)\
+            .limit(limit)
+        if after:
+            query = query.start_after({"started_at": after[0], "__name__": after[1]})
+        return [InterviewSummary(**doc.to_dict(), id=doc.id) async for doc in query.stream()]
+
+    async def iter_for_user(self, user_id: str, fields: List[str], page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        query = self._collection()\
+            .where("user_id", "==", user_id)\
+            .select(fields)\
+            .order_by("__name__")\
+            .limit(page_size)
+
+        last_doc = None
+        while True:
+            page_query = query.start_after(last_doc) if last_doc else query
+            docs = [doc async for doc in page_query.stream()]
+            for doc in docs:
+                yield doc.to_dict()
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+
+
+class FirestoreUserRepository(UserRepository):
+    def __init__(self, client, index_fallback: bool = EMAIL_INDEX_FALLBACK):
+        self.client = client
+        self.index_fallback = index_fallback
+
+    def _collection(self):
+        return self.client.collection(USERS_COLLECTION)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        # Direct document reads through the emails/{email} -> uid index
+        index_ref = self.client.collection(EMAILS_COLLECTION).document(normalize_email(email))
+        index_doc = await index_ref.get()
+        if index_doc.exists:
+            user_doc = await self._collection().document(index_doc.to_dict()["uid"]).get()
+            if user_doc.exists:
+                return User(**{**user_doc.to_dict(), "id": user_doc.id})
+
+        if not self.index_fallback:
+            return None
+
+        async for doc in self._collection().where("email", "==", email).limit(1).stream():
+            # Repair the index so the next lookup is a direct read
+            await index_ref.set({"uid": doc.id, "created_at": datetime.utcnow()})
+            return User(**{**doc.to_dict(), "id": doc.id})
+        return None
+
+    async def create(self, user: User, settings: UserSettings, stats: Dict[str, Any]) -> None:
+        from google.api_core.exceptions import AlreadyExists
+
+        # User document, email index entry, settings and dashboard stats go out as one atomic batch.
+        # create() on the index entry fails if the email is taken, so two concurrent
+        # registrations for the same email cannot both succeed.
+        batch = self.client.batch()
+        batch.create(
+            self.client.collection(EMAILS_COLLECTION).document(normalize_email(user.email)),
+            {"uid": user.id, "created_at": datetime.utcnow()}
+        )
+        batch.set(self._collection().document(user.id), user.model_dump(exclude={"id"}))
+        batch.set(self.client.collection(SETTINGS_COLLECTION).document(user.id), settings.model_dump(exclude={"id"}))
+        batch.set(self.client.collection(USER_STATS_COLLECTION).document(user.id), stats)
+        try:
+            await batch.commit()
+        except AlreadyExists:
+            raise DuplicateEmail(user.email)
+
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        await self._collection().document(user_id).update(fields)
+
+    async def list_ids(self) -> List[str]:
+        return [ref.id async for ref in self._collection().list_documents()]
+
+    async def get_many(self, user_ids: List[str]) -> Dict[str, User]:
+        refs = [self._collection().document(user_id) for user_id in user_ids]
+        return {
+            snapshot.id: User(**{**snapshot.to_dict(), "id": snapshot.id})
+            async for snapshot in self.client.get_all(refs)
+            if snapshot.exists
+        }
+
+
+class FirestoreSettingsRepository(SettingsRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def _collection(self):
+        return self.client.collection(SETTINGS_COLLECTION)
+
+    async def _migrate_legacy(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Move an auto-id settings document to user_settings/{user_id}; returns its data or None."""
+        legacy = [doc async for doc in self._collection().where("user_id", "==", user_id).limit(1).stream()]
+        if not legacy or legacy[0].id == user_id:
+            return legacy[0].to_dict() if legacy else None
+        data = legacy[0].to_dict()
+        batch = self.client.batch()
+        batch.set(self._collection().document(user_id), data)
+        batch.delete(legacy[0].reference)
+        await batch.commit()
+        return data
+
+    async def get(self, user_id: str) -> Optional[UserSettings]:
+        snapshot = await self._collection().document(user_id).get()
+        data = snapshot.to_dict() if snapshot.exists else await self._migrate_legacy(user_id)
+        if data is None:
+            return None
+        return UserSettings(**{**data, "id": user_id, "user_id": user_id})
+
+    async def merge(self, user_id: str, fields: Dict[str, Any]) -> None:
+        await self._collection().document(user_id).set({**fields, "user_id": user_id}, merge=True)
+
+    async def due_for_reminder(self, now: datetime, limit: int) -> List[UserSettings]:
+        query = self._collection().where("next_reminder_at", "<=", now).order_by("next_reminder_at").limit(limit)
+        return [UserSettings(**{**doc.to_dict(), "id": doc.id, "user_id": doc.id}) async for doc in query.stream()]
+
+
+class FirestoreStatsRepository(StatsRepository):
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        snapshot = await self.client.collection(USER_STATS_COLLECTION).document(user_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    async def put(self, user_id: str, stats: Dict[str, Any]) -> None:
+        await self.client.collection(USER_STATS_COLLECTION).document(user_id).set(stats)
+
+    async def replace_if_unchanged(
+        self, user_id: str, expected: Optional[Dict[str, Any]], stats: Dict[str, Any]
+    ) -> bool:
+        from firebase_admin import firestore
+
+        ref = self.client.collection(USER_STATS_COLLECTION).document(user_id)
+
+        @firestore.async_transactional
+        async def replace(transaction):
+            snapshot = await ref.get(transaction=transaction)
+            if (snapshot.to_dict() if snapshot.exists else None) != expected:
+                return False
+            transaction.set(ref, stats)
+            return True
+
+        return await replace(self.client.transaction())
+
+
+def firestore_repositories(client, index_fallback: bool = EMAIL_INDEX_FALLBACK) -> Repositories:
+    return Repositories(
+        "firestore",
+        interviews=FirestoreInterviewRepository(client),
+        users=FirestoreUserRepository(client, index_fallback=index_fallback),
+        settings=FirestoreSettingsRepository(client),
+        stats=FirestoreStatsRepository(client),
+    )
+
+
+# --- In-memory (single process; tests, benchmarks and local runs) ---
+
+def _summary_sort_key(data: Dict[str, Any]) -> tuple:
+    return (data["started_at"], data["id"])
+
+
+class MemoryInterviewRepository(InterviewRepository):
+    def __init__(self, stats: "MemoryStatsRepository"):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._by_session: Dict[str, str] = {}
+        self._stats = stats
+
+    async def create(self, interview: Interview) -> str:
+        interview_id = uuid.uuid4().hex
+        self._docs[interview_id] = interview.model_dump(exclude={"id"})
+        self._by_session.setdefault(interview.session_id, interview_id)
+        if interview.user_id:
+            self._stats.increment_total(interview.user_id)
+        return interview_id
+
+    async def get_by_session(self, session_id: str) -> Optional[Interview]:
+        interview_id = self._by_session.get(session_id)
+        if interview_id is None:
+            return None
+        return Interview(**copy.deepcopy(self._docs[interview_id]), id=interview_id)
+
+    async def update(self, interview_id: str, fields: Dict[str, Any]) -> None:
+        self._docs[interview_id].update(copy.deepcopy(fields))
+
+    async def update_by_session(self, session_id: str, fields: Dict[str, Any]) -> bool:
+        interview_id = self._by_session.get(session_id)
+        if interview_id is None:
+            return False
+        await self.update(interview_id, fields)
+        return True
+
+    async def write_feedback(self, interview_id: str, updates: Dict[str, Any]) -> bool:
+        # No await between the check and the writes, so this is atomic on the event loop
+        interview = self._docs.get(interview_id)
+        if not interview or interview.get("score") is not None:
+            return False
+        interview.update(copy.deepcopy(updates))
+        user_id = interview.get("user_id")
+        stats = self._stats.peek(user_id) if user_id else None
+        if stats and stats.get("initialized_at"):
+            self._stats.replace(user_id, apply_feedback(stats, updates))
+        elif user_id:
+            self._stats.touch(user_id)
+        return True
+
+    async def page_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[HistoryCursor] = None,
+        company: Optional[str] = None,
+        interview_type: Optional[str] = None,
+    ) -> List[InterviewSummary]:
+        matching = [
+            {**data, "id": interview_id}
+            for interview_id, data in self._docs.items()
+            if data.get("user_id") == user_id
+            and data.get("started_at") is not None
+            and (not company or data.get("company") == company)
+            and (not interview_type or data.get("interview_type") == interview_type)
+        ]
+        matching.sort(key=_summary_sort_key, reverse=True)
+        if after:
+            matching = [data for data in matching if _summary_sort_key(data) < after]
+        return [
+            InterviewSummary(**{field: data[field] for field in INTERVIEW_SUMMARY_FIELDS if field in data}, id=data["id"])
+            for data in matching[:limit]
+        ]
+
+    async def iter_for_user(self, user_id: str, fields: List[str], page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        for interview_id in sorted(self._docs):
+            data = self._docs.get(interview_id)
+            if data and data.get("user_id") == user_id:
+                yield copy.deepcopy({field: data[field] for field in fields if field in data})
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, settings: "MemorySettingsRepository", stats: "MemoryStatsRepository"):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._emails: Dict[str, str] = {}
+        self._settings = settings
+        self._stats = stats
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        user_id = self._emails.get(normalize_email(email))
+        if user_id is None or user_id not in self._docs:
+            return None
+        return User(**copy.deepcopy(self._docs[user_id]), id=user_id)
+
+    async def create(self, user: User, settings: UserSettings, stats: Dict[str, Any]) -> None:
+        key = normalize_email(user.email)
+        if key in self._emails:
+            raise DuplicateEmail(user.email)
+        self._emails[key] = user.id
+        self._docs[user.id] = user.model_dump(exclude={"id"})
+        await self._settings.merge(user.id, settings.model_dump(exclude={"id"}))
+        await self._stats.put(user.id, stats)
+
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        self._docs[user_id].update(copy.deepcopy(fields))
+
+    async def list_ids(self) -> List[str]:
+        return list(self._docs)
+
+    async def get_many(self, user_ids: List[str]) -> Dict[str, User]:
+        return {
+            user_id: User(**copy.deepcopy(self._docs[user_id]), id=user_id)
+            for user_id in user_ids if user_id in self._docs
+        }
+
+
+class MemorySettingsRepository(SettingsRepository):
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+
+    async def get(self, user_id: str) -> Optional[UserSettings]:
+        data = self._docs.get(user_id)
+        if data is None:
+            return None
+        return UserSettings(**{**copy.deepcopy(data), "id": user_id, "user_id": user_id})
+
+    async def merge(self, user_id: str, fields: Dict[str, Any]) -> None:
+        self._docs.setdefault(user_id, {}).update({**copy.deepcopy(fields), "user_id": user_id})
+
+    async def due_for_reminder(self, now: datetime, limit: int) -> List[UserSettings]:
+        due = sorted(
+            (data["next_reminder_at"], user_id) for user_id, data in self._docs.items()
+            if data.get("next_reminder_at") is not None and data["next_reminder_at"] <= now
+        )
+        return [await self.get(user_id) for _, user_id in due[:limit]]
+
+
+class MemoryStatsRepository(StatsRepository):
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+
+    def peek(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._docs.get(user_id)
+
+    def replace(self, user_id: str, stats: Dict[str, Any]) -> None:
+        self._docs[user_id] = stats
+
+    def increment_total(self, user_id: str) -> None:
+        stats = self._docs.setdefault(user_id, {})
+        stats["total_interviews"] = stats.get("total_interviews", 0) + 1
+
+    def touch(self, user_id: str) -> None:
+        self._docs.setdefault(user_id, {})["updated_at"] = datetime.utcnow()
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._docs.get(user_id))
+
+    async def put(self, user_id: str, stats: Dict[str, Any]) -> None:
+        self._docs[user_id] = copy.deepcopy(stats)
+
+    async def replace_if_unchanged(
+        self, user_id: str, expected: Optional[Dict[str, Any]], stats: Dict[str, Any]
+    ) -> bool:
+        if self._docs.get(user_id) != expected:
+            return False
+        self._docs[user_id] = copy.deepcopy(stats)
+        return True
+
+
+def memory_repositories() -> Repositories:
+    settings, stats = MemorySettingsRepository(), MemoryStatsRepository()
+    return Repositories(
+        "memory",
+        interviews=MemoryInterviewRepository(stats),
+        users=MemoryUserRepository(settings, stats),
+        settings=settings,
+        stats=stats,
+    )
+
+
+# --- SQLite (aiosqlite; one file per host, small deployments) ---
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interviews (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    user_id TEXT,
+    company TEXT,
+    interview_type TEXT,
+    started_at TEXT,
+    score INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interviews_session ON interviews (session_id);
+CREATE INDEX IF NOT EXISTS interviews_user_started ON interviews (user_id, started_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, email_key TEXT NOT NULL UNIQUE, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS user_settings (user_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS user_stats (user_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+"""
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=_json_default, separators=(",", ":"))
+
+
+def _sortable_time(value: Any) -> Optional[str]:
+    """started_at as text that sorts chronologically (fixed microsecond precision)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.isoformat(timespec="microseconds") if value else None
+
+
+def _json_projection(fields: List[str]) -> str:
+    """SQL expression building a JSON object of the given document fields (like a Firestore select())."""
+    return "json_object(" + ", ".join(f"'{field}', json_extract(data, '$.{field}')" for field in fields) + ")"
+
+
+def _projected(raw: str) -> Dict[str, Any]:
+    # Missing fields come back as null; drop them like Firestore omits them
+    return {key: value for key, value in json.loads(raw).items() if value is not None}
+
+
+class SQLiteConnection:
+    """Statements on one aiosqlite connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        async with self.conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        async with self.conn.execute(sql, params) as cursor:
+            return list(await cursor.fetchall())
+
+    async def execute(self, sql: str, params: tuple = ()) -> None:
+        await self.conn.execute(sql, params)
+
+
+class SQLiteDatabase:
+    """
+    Two aiosqlite connections per process. Writes go through `transaction()`:
+    it takes an asyncio lock and runs an IMMEDIATE transaction on the writer
+    connection, so coroutines never interleave statements inside someone
+    else's transaction. Plain reads use the reader connection and, in WAL
+    mode, only ever see committed data (theirs or another worker's).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer: Optional[SQLiteConnection] = None
+        self.reader: Optional[SQLiteConnection] = None
+        self._write_lock = asyncio.Lock()
+
+    async def connect(self) -> None:
+        import aiosqlite
+
+        writer = await aiosqlite.connect(self.path, isolation_level=None)
+        await writer.execute("PRAGMA journal_mode=WAL")
+        await writer.execute("PRAGMA busy_timeout=10000")
+        await writer.executescript(SQLITE_SCHEMA)
+        reader = await aiosqlite.connect(self.path, isolation_level=None)
+        await reader.execute("PRAGMA busy_timeout=10000")
+        self.writer, self.reader = SQLiteConnection(writer), SQLiteConnection(reader)
+
+    async def close(self) -> None:
+        for connection in (self.reader, self.writer):
+            if connection is not None:
+                await connection.conn.close()
+        self.writer = self.reader = None
+
+    async def fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        return await self.reader.fetchone(sql, params)
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return await self.reader.fetchall(sql, params)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[SQLiteConnection]:
+        async with self._write_lock:
+            await self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.writer
+            except BaseException:
+                await self.writer.execute("ROLLBACK")
+                raise
+            await self.writer.execute("COMMIT")
+
+
+def _interview_row(interview_id: str, data: Dict[str, Any]) -> tuple:
+    return (
+        interview_id, data["session_id"], data.get("user_id"), data.get("company"),
+        data.get("interview_type"), _sortable_time(data.get("started_at")), data.get("score"), _dumps(data),
+    )
+
+
+_UPSERT_INTERVIEW = (
+    "INSERT OR REPLACE INTO interviews (id, session_id, user_id, company, interview_type, started_at, score, data)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class SQLiteInterviewRepository(InterviewRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def create(self, interview: Interview) -> str:
+        interview_id = uuid.uuid4().hex
+        async with self.db.transaction() as tx:
+            await tx.execute(_UPSERT_INTERVIEW, _interview_row(interview_id, interview.model_dump(exclude={"id"})))
+            if interview.user_id:
+                # Same shape as Firestore's merge Increment: creates a bare counter if there are no stats yet
+                await tx.execute(
+                    "INSERT INTO user_stats (user_id, data) VALUES (?, '{\"total_interviews\":1}')"
+                    " ON CONFLICT (user_id) DO UPDATE SET data = json_set(data, '$.total_interviews',"
+                    " coalesce(json_extract(data, '$.total_interviews'), 0) + 1)",
+                    (interview.user_id,),
+                )
+        return interview_id
+
+    async def get_by_session(self, session_id: str) -> Optional[Interview]:
+        row = await self.db.fetchone("SELECT id, data FROM interviews WHERE session_id = ? LIMIT 1", (session_id,))
+        return Interview(**json.loads(row[1]), id=row[0]) if row else None
+
+    async def _update(self, tx: SQLiteConnection, interview_id: str, fields: Dict[str, Any]) -> bool:
+        row = await tx.fetchone("SELECT data FROM interviews WHERE id = ?", (interview_id,))
+        if row is None:
+            return False
+        await tx.execute(_UPSERT_INTERVIEW, _interview_row(interview_id, {**json.loads(row[0]), **fields}))
+        return True
+
+    async def update(self, interview_id: str, fields: Dict[str, Any]) -> None:
+        async with self.db.transaction() as tx:
+            await self._update(tx, interview_id, fields)
+
+    async def update_by_session(self, session_id: str, fields: Dict[str, Any]) -> bool:
+        row = await self.db.fetchone("SELECT id FROM interviews WHERE session_id = ? LIMIT 1", (session_id,))
+        if row is None:
+            return False
+        await self.update(row[0], fields)
+        return True
+
+    async def write_feedback(self, interview_id: str, updates: Dict[str, Any]) -> bool:
+        async with self.db.transaction() as tx:
+            row = await tx.fetchone("SELECT user_id, score FROM interviews WHERE id = ?", (interview_id,))
+            if row is None or row[1] is not None:
+                return False
+            user_id = row[0]
+            await self._update(tx, interview_id, updates)
+            stats_row = await tx.fetchone("SELECT data FROM user_stats WHERE user_id = ?", (user_id,)) if user_id else None
+            stats = json.loads(stats_row[0]) if stats_row else None
+            if stats and stats.get("initialized_at"):
+                await tx.execute(
+                    "UPDATE user_stats SET data = ? WHERE user_id = ?", (_dumps(apply_feedback(stats, updates)), user_id)
+                )
+            elif user_id:
+                await tx.execute(
+                    "INSERT INTO user_stats (user_id, data) VALUES (?, ?) ON CONFLICT (user_id) DO UPDATE"
+                    " SET data = json_set(data, '$.updated_at', json_extract(excluded.data, '$.updated_at'))",
+                    (user_id, _dumps({"updated_at": datetime.utcnow()})),
+                )
+            return True
+
+    async def page_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[HistoryCursor] = None,
+        company: Optional[str] = None,
+        interview_type: Optional[str] = None,
+    ) -> List[InterviewSummary]:
+        where, params = ["user_id = ?", "started_at IS NOT NULL"], [user_id]
+        if company:
+            where.append("company = ?")
+            params.append(company)
+        if interview_type:
+            where.append("interview_type = ?")
+            params.append(interview_type)
+        if after:
+            started_at = _sortable_time(after[0])
+            where.append("(started_at < ? OR (started_at = ? AND id < ?))")
+            params += [started_at, started_at, after[1]]
+        rows = await self.db.fetchall(
+            f"SELECT id, {_json_projection(INTERVIEW_SUMMARY_FIELDS)} FROM interviews"
+            f" WHERE {' AND '.join(where)} ORDER BY started_at DESC, id DESC LIMIT ?",
+            (*params, limit),
+        )
+        return [InterviewSummary(**_projected(raw), id=interview_id) for interview_id, raw in rows]
+
+    async def iter_for_user(self, user_id: str, fields: List[str], page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        last_id = ""
+        while True:
+            rows = await self.db.fetchall(
+                f"SELECT id, {_json_projection(fields)} FROM interviews WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (user_id, last_id, page_size),
+            )
+            for _, raw in rows:
+                yield _projected(raw)
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        row = await self.db.fetchone("SELECT id, data FROM users WHERE email_key = ?", (normalize_email(email),))
+        return User(**json.loads(row[1]), id=row[0]) if row else None
+
+    async def create(self, user: User, settings: UserSettings, stats: Dict[str, Any]) -> None:
+        import sqlite3
+
+        try:
+            async with self.db.transaction() as tx:
+                await tx.execute(
+                    "INSERT INTO users (id, email_key, data) VALUES (?, ?, ?)",
+                    (user.id, normalize_email(user.email), _dumps(user.model_dump(exclude={"id"}))),
+                )
+                await tx.execute(
+                    "INSERT OR REPLACE INTO user_settings (user_id, data) VALUES (?, ?)",
+                    (user.id, _dumps(settings.model_dump(exclude={"id"}))),
+                )
+                await tx.execute("INSERT OR REPLACE INTO user_stats (user_id, data) VALUES (?, ?)", (user.id, _dumps(stats)))
+        except sqlite3.IntegrityError:
+            raise DuplicateEmail(user.email)
+
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        async with self.db.transaction() as tx:
+            row = await tx.fetchone("SELECT data FROM users WHERE id = ?", (user_id,))
+            if row is not None:
+                await tx.execute("UPDATE users SET data = ? WHERE id = ?", (_dumps({**json.loads(row[0]), **fields}), user_id))
+
+    async def list_ids(self) -> List[str]:
+        return [row[0] for row in await self.db.fetchall("SELECT id FROM users ORDER BY id")]
+
+    async def get_many(self, user_ids: List[str]) -> Dict[str, User]:
+        if not user_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in user_ids)
+        rows = await self.db.fetchall(f"SELECT id, data FROM users WHERE id IN ({placeholders})", tuple(user_ids))
+        return {row[0]: User(**json.loads(row[1]), id=row[0]) for row in rows}
+
+
+class SQLiteSettingsRepository(SettingsRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def get(self, user_id: str) -> Optional[UserSettings]:
+        row = await self.db.fetchone("SELECT data FROM user_settings WHERE user_id = ?", (user_id,))
+        return UserSettings(**{**json.loads(row[0]), "id": user_id, "user_id": user_id}) if row else None
+
+    async def merge(self, user_id: str, fields: Dict[str, Any]) -> None:
+        async with self.db.transaction() as tx:
+            row = await tx.fetchone("SELECT data FROM user_settings WHERE user_id = ?", (user_id,))
+            data = {**(json.loads(row[0]) if row else {}), **fields, "user_id": user_id}
+            await tx.execute("INSERT OR REPLACE INTO user_settings (user_id, data) VALUES (?, ?)", (user_id, _dumps(data)))
+
+    async def due_for_reminder(self, now: datetime, limit: int) -> List[UserSettings]:
+        # Stored as ISO text, which sorts chronologically; null (reminders off) never matches
+        rows = await self.db.fetchall(
+            "SELECT user_id, data FROM user_settings WHERE json_extract(data, '$.next_reminder_at') <= ?"
+            " ORDER BY json_extract(data, '$.next_reminder_at'), user_id LIMIT ?",
+            (now.isoformat(), limit),
+        )
+        return [UserSettings(**{**json.loads(row[1]), "id": row[0], "user_id": row[0]}) for row in rows]
+
+
+class SQLiteStatsRepository(StatsRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = await self.db.fetchone("SELECT data FROM user_stats WHERE user_id = ?", (user_id,))
+        return json.loads(row[0]) if row else None
+
+    async def put(self, user_id: str, stats: Dict[str, Any]) -> None:
+        async with self.db.transaction() as tx:
+            await tx.execute("INSERT OR REPLACE INTO user_stats (user_id, data) VALUES (?, ?)", (user_id, _dumps(stats)))
+
+    async def replace_if_unchanged(
+        self, user_id: str, expected: Optional[Dict[str, Any]], stats: Dict[str, Any]
+    ) -> bool:
+        async with self.db.transaction() as tx:
+            row = await tx.fetchone("SELECT data FROM user_stats WHERE user_id = ?", (user_id,))
+            if (json.loads(row[0]) if row else None) != expected:
+                return False
+            await tx.execute("INSERT OR REPLACE INTO user_stats (user_id, data) VALUES (?, ?)", (user_id, _dumps(stats)))
+            return True
+
+
+async def sqlite_repositories(path: str = DATA_SQLITE_PATH) -> Repositories:
+    db = SQLiteDatabase(path)
+    await db.connect()
+    return Repositories(
+        "sqlite",
+        interviews=SQLiteInterviewRepository(db),
+        users=SQLiteUserRepository(db),
+        settings=SQLiteSettingsRepository(db),
+        stats=SQLiteStatsRepository(db),
+        on_close=db.close,
+    )
+
+
+_repositories: Optional[Repositories] = None
+
+
+async def init_repositories(backend: str = DATA_BACKEND) -> Optional[Repositories]:
+    """Create the repositories for DATA_BACKEND; call after db.init_db() and close them on shutdown."""
+    global _repositories
+    if _repositories is not None:
+        return _repositories
+
+    if backend == "memory":
+        _repositories = memory_repositories()
+    elif backend == "sqlite":
+        _repositories = await sqlite_repositories()
+    elif backend == "firestore":
+        from db import get_async_db
+
+        client = get_async_db()
+        if client is None:
+            return None
+        _repositories = firestore_repositories(client)
+    else:
+        raise RuntimeError(f"Unknown DATA_BACKEND '{backend}'")
+
+    if TELEMETRY_ENABLED:
+        for collection in ("interviews", "users", "settings", "stats"):
+            repository = getattr(_repositories, collection)
+            setattr(_repositories, collection, TracedRepository(repository, collection, _repositories.name))
+
+    logger.info("Data backend: %s", _repositories.name)
+    return _repositories
+
+
+def get_repositories() -> Repositories:
+    if _repositories is None:
+        raise RuntimeError("Database not initialized")
+    return _repositories
+
+
+async def close_repositories() -> None:
+    global _repositories
+    if _repositories is not None:
+        await _repositories.close()
+        _repositories = None
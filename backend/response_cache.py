@@ -0,0 +1,111 @@
+import hashlib
+import os
+import random
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from cache import TTLCache
+
+# Other workers only see a write once their copy expires, so keep this short
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 30))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2048))
+
+# Per-user data: the browser may store it but must revalidate (cheap 304s)
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison is what If-None-Match uses
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    """
+    Serialised JSON responses with strong ETags, keyed by a resource key plus
+    the version of the scope the resource belongs to. Write paths call
+    `bump(scope)`, which makes every cached entry of that scope unreachable.
+
+    Versions are random epochs kept in a bounded TTL map like the entries. A
+    scope whose version was evicted gets a fresh epoch, which only costs a
+    cache miss: entries under the old epoch can no longer be reached.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.not_modified = 0
+
+    def version(self, scope: str) -> int:
+        with self._lock:
+            version = self._versions.get(scope)
+            if version is None:
+                version = random.getrandbits(64)
+                self._versions.set(scope, version)
+            return version
+
+    def bump(self, *scopes: str) -> None:
+        with self._lock:
+            for scope in scopes:
+                self._versions.set(scope, random.getrandbits(64))
+
+    def _response(self, request: Request, entry: tuple, cache_control: str) -> Response:
+        body, etag = entry
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def _key(self, key: Hashable, scope: Optional[str]) -> tuple:
+        return (key, scope, self.version(scope) if scope else 0)
+
+    def lookup(
+        self, request: Request, key: Hashable, scope: Optional[str] = None, cache_control: str = PRIVATE_REVALIDATE
+    ) -> Optional[Response]:
+        """Cached response (or 304) if there is a current entry, else None."""
+        entry = self._entries.get(self._key(key, scope))
+        return self._response(request, entry, cache_control) if entry else None
+
+    async def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        build: Callable[[], Awaitable[Any]],
+        scope: Optional[str] = None,
+        cache_control: str = PRIVATE_REVALIDATE,
+        ttl: Optional[float] = None,
+    ) -> Response:
+        """Serve `build()`'s JSON from cache when possible, or a 304 if the client has it."""
+        cache_key = self._key(key, scope)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            body = JSONResponse(jsonable_encoder(await build())).body
+            entry = (body, _etag(body))
+            self._entries.set(cache_key, entry, ttl=ttl)
+        return self._response(request, entry, cache_control)
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "not_modified": self.not_modified, "scopes": len(self._versions)}
+
+
+response_cache = ResponseCache()
+
+
+def user_scope(user_id: str, resource: str) -> str:
+    return f"user:{user_id}:{resource}"
+
+
+def session_scope(session_id: str) -> str:
+    return f"session:{session_id}"
@@ -0,0 +1,102 @@
+"""
+user_settings/{user_id}: one settings document per user, addressed directly
+by id and served from a per-user read-through cache (write-through on update).
+
+Settings written before this used auto-generated ids and were found with a
+user_id query; they are moved to their user_id document the first time they
+are read, or all at once with (from backend/):
+    python settings_store.py migrate
+"""
+import argparse
+import asyncio
+import os
+from typing import Any, Dict
+
+from cache import TTLCache
+from models import UserSettings
+
+SETTINGS_COLLECTION = "user_settings"
+# Other workers (and the reminder job's writes) only show up once a copy expires, like the response cache
+SETTINGS_CACHE_TTL_SECONDS = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", 30))
+_BATCH_SIZE = 200
+
+_settings_cache = TTLCache(maxsize=4096, ttl=SETTINGS_CACHE_TTL_SECONDS)
+
+
+def settings_ref(db, user_id: str):
+    return db.collection(SETTINGS_COLLECTION).document(user_id)
+
+
+async def load_settings(repos, user_id: str, fresh: bool = False) -> UserSettings:
+    """Settings for a user, creating the defaults on first access. `fresh` skips (and refreshes) the cache."""
+    cached = None if fresh else _settings_cache.get(user_id)
+    if cached is not None:
+        return cached.model_copy()
+
+    settings = await repos.settings.get(user_id)
+    if settings is None:
+        settings = UserSettings(id=user_id, user_id=user_id)
+        await repos.settings.merge(user_id, settings.model_dump(exclude={"id"}))
+
+    _settings_cache.set(user_id, settings)
+    return settings.model_copy()
+
+
+async def save_settings(repos, user_id: str, updates: Dict[str, Any]) -> None:
+    """Apply `updates` with a single merge-set (creates the document if needed) and refresh the cached copy."""
+    await repos.settings.merge(user_id, updates)
+    cached = _settings_cache.get(user_id)
+    if cached is not None:
+        _settings_cache.set(user_id, cached.model_copy(update=updates))
+
+
+def invalidate_settings(user_id: str) -> None:
+    _settings_cache.pop(user_id)
+
+
+def migrate_settings(db) -> Dict[str, int]:
+    """Move every auto-id settings document to its user_id document."""
+    stats = {"settings": 0, "migrated": 0, "duplicates_removed": 0}
+    batch = db.batch()
+    pending = 0
+    seen = set()
+    for doc in db.collection(SETTINGS_COLLECTION).stream():
+        stats["settings"] += 1
+        user_id = (doc.to_dict() or {}).get("user_id")
+        if not user_id or doc.id == user_id:
+            seen.add(doc.id)
+            continue
+        if user_id in seen or settings_ref(db, user_id).get().exists:
+            # Older duplicate: the user_id document already holds the settings
+            stats["duplicates_removed"] += 1
+        else:
+            batch.set(settings_ref(db, user_id), doc.to_dict())
+            stats["migrated"] += 1
+            seen.add(user_id)
+        batch.delete(doc.reference)
+        pending += 2
+        if pending >= _BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return stats
+
+
+def main():
+    from db import init_db, get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+
+    asyncio.run(init_db())
+    db = get_db()
+    if not db:
+        raise SystemExit("Database not initialized")
+    print(f"✅ Migration finished: {migrate_settings(db)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import hashlib
+import hmac
+import logging
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, Optional
+from urllib.parse import parse_qs
+
+from fastapi.responses import PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+
+from cache import TTLCache
+from db import get_bucket
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+AUDIO_STORAGE_BACKEND = os.getenv("AUDIO_STORAGE_BACKEND", "firebase").lower()
+# Per-object and total quotas for uploaded audio (bytes, 0 disables the check)
+AUDIO_MAX_OBJECT_BYTES = int(os.getenv("AUDIO_MAX_OBJECT_BYTES", 25 * 1024 * 1024))
+AUDIO_STORAGE_QUOTA_BYTES = int(os.getenv("AUDIO_STORAGE_QUOTA_BYTES", 5 * 1024 * 1024 * 1024))
+# Lifetime of the signed playback URLs handed to the frontend
+AUDIO_URL_TTL_SECONDS = int(os.getenv("AUDIO_URL_TTL_SECONDS", 3600))
+AUDIO_URL_SIGNING_KEY = os.getenv(
+    "AUDIO_URL_SIGNING_KEY",
+    os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production"),
+)
+
+# Recordings are never rewritten, so caches and CDNs may keep them forever.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class StorageError(Exception):
+    pass
+
+
+class StorageQuotaExceeded(StorageError):
+    pass
+
+
+class AudioStorage(ABC):
+    """Interface for the audio recording store used by upload_audio."""
+
+    name = "base"
+
+    def __init__(self):
+        # Signed URLs are reused for half their lifetime so repeated report loads
+        # hand out identical (browser/CDN cacheable) URLs.
+        self._signed = TTLCache(maxsize=4096, ttl=AUDIO_URL_TTL_SECONDS / 2)
+
+    @abstractmethod
+    def save(self, session_id: str, fileobj: BinaryIO, content_type: str = "audio/webm") -> str:
+        """Store the recording and return its object key."""
+
+    @abstractmethod
+    def _sign(self, key: str) -> str:
+        ...
+
+    def sign_url(self, key: str) -> str:
+        """Return a short-lived playback URL for a stored object key."""
+        # Legacy documents stored public URLs directly.
+        if not key or key.startswith(("http://", "https://")):
+            return key
+        url = self._signed.get(key)
+        if url is None:
+            url = self._sign(key)
+            self._signed.set(key, url)
+        return url
+
+    def sign_urls(self, audio_urls: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Sign every entry of an interview's audio_urls map in one pass."""
+        return {idx: self.sign_url(key) for idx, key in (audio_urls or {}).items()}
+
+
+class FirebaseAudioStorage(AudioStorage):
+    name = "firebase"
+
+    def __init__(self, bucket):
+        super().__init__()
+        self.bucket = bucket
+
+    def save(self, session_id: str, fileobj: BinaryIO, content_type: str = "audio/webm") -> str:
+        filename = f"uploads/{session_id}/{datetime.now().timestamp()}.webm"
+        blob_ref = self.bucket.blob(filename)
+        # Sent as object metadata with the upload itself, no extra API call.
+        blob_ref.cache_control = IMMUTABLE_CACHE_CONTROL
+
+        # Upload from file-like object
+        blob_ref.upload_from_file(fileobj, content_type=content_type)
+        return filename
+
+    def _sign(self, key: str) -> str:
+        # V4 signing with service account credentials is a local RSA signature,
+        # there is no round-trip to the storage API.
+        return self.bucket.blob(key).generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=AUDIO_URL_TTL_SECONDS),
+            method="GET",
+        )
+
+
+def _local_signature(path: str, expires: int) -> str:
+    message = f"{path}:{expires}".encode()
+    return hmac.new(AUDIO_URL_SIGNING_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_signature(path: str, expires: str, signature: str) -> bool:
+    try:
+        expires_at = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires_at < time.time():
+        return False
+    return hmac.compare_digest(_local_signature(path, expires_at), signature or "")
+
+
+class LocalAudioStorage(AudioStorage):
+    """
+    Stores recordings on local disk under the directory served at /uploads.
+    Paths are content-addressed (sha256 of the bytes), so re-uploading the same
+    recording is free and objects never change once written. Range requests for
+    playback are handled by the StaticFiles mount.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        root: str = UPLOAD_DIR,
+        base_url: str = "/uploads",
+        max_object_bytes: int = AUDIO_MAX_OBJECT_BYTES,
+        quota_bytes: int = AUDIO_STORAGE_QUOTA_BYTES,
+    ):
+        super().__init__()
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.max_object_bytes = max_object_bytes
+        self.quota_bytes = quota_bytes
+        self._used_bytes: Optional[int] = None
+        os.makedirs(os.path.join(self.root, "audio"), exist_ok=True)
+
+    @property
+    def used_bytes(self) -> int:
+        if self._used_bytes is None:
+            total = 0
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, "audio")):
+                for name in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                    except OSError:
+                        pass
+            self._used_bytes = total
+        return self._used_bytes
+
+    def _relative_path(self, digest: str) -> str:
+        return f"audio/{digest[:2]}/{digest}.webm"
+
+    def save(self, session_id: str, fileobj: BinaryIO, content_type: str = "audio/webm") -> str:
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = fileobj.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if self.max_object_bytes and size > self.max_object_bytes:
+                        raise StorageQuotaExceeded(
+                            f"Recording exceeds the {self.max_object_bytes} byte limit"
+                        )
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+
+            rel_path = self._relative_path(hasher.hexdigest())
+            final_path = os.path.join(self.root, rel_path)
+
+            if not os.path.exists(final_path):
+                if self.quota_bytes and self.used_bytes + size > self.quota_bytes:
+                    raise StorageQuotaExceeded("Audio storage quota exhausted")
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+                self._used_bytes = self.used_bytes + size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return rel_path
+
+    def _sign(self, key: str) -> str:
+        # Expiry is rounded up to a TTL window so every URL signed within the
+        # same window is byte-identical and stays cacheable.
+        ttl = max(AUDIO_URL_TTL_SECONDS, 1)
+        expires = (int(time.time()) // ttl + 2) * ttl
+        return f"{self.base_url}/{key}?expires={expires}&signature={_local_signature(key, expires)}"
+
+
+class AudioStaticFiles(StaticFiles):
+    """
+    StaticFiles mount for /uploads that only serves audio objects through a
+    valid signed URL and marks them immutable for browsers and CDNs.
+    """
+
+    async def get_response(self, path: str, scope):
+        if path.startswith("audio/"):
+            query = parse_qs(scope.get("query_string", b"").decode())
+            expires = query.get("expires", [None])[0]
+            signature = query.get("signature", [None])[0]
+            if not verify_local_signature(path, expires, signature):
+                return PlainTextResponse("Invalid or expired signature", status_code=403)
+
+        response = await super().get_response(path, scope)
+        if path.startswith("audio/") and response.status_code in (200, 206, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+_storage: Optional[AudioStorage] = None
+
+
+def get_audio_storage() -> AudioStorage:
+    """Return the configured audio backend (AUDIO_STORAGE_BACKEND=firebase|local)."""
+    global _storage
+    if _storage is not None:
+        return _storage
+
+    if AUDIO_STORAGE_BACKEND == "local":
+        _storage = LocalAudioStorage()
+    elif AUDIO_STORAGE_BACKEND == "firebase":
+        bucket = get_bucket()
+        if not bucket:
+            raise StorageError("Storage bucket not initialized")
+        _storage = FirebaseAudioStorage(bucket)
+    else:
+        raise StorageError(f"Unknown AUDIO_STORAGE_BACKEND '{AUDIO_STORAGE_BACKEND}'")
+
+    logger.info("Audio storage backend: %s", _storage.name)
+    return _storage
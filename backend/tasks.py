@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE_WORKERS = int(os.getenv("TASK_QUEUE_WORKERS", 4))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 5))
+TASK_RETRY_BASE_SECONDS = float(os.getenv("TASK_RETRY_BASE_SECONDS", 2))
+# How long stop() lets queued and retrying work finish before dropping it
+TASK_DRAIN_TIMEOUT_SECONDS = float(os.getenv("TASK_DRAIN_TIMEOUT_SECONDS", 10))
+_DEAD_LETTERS_KEPT = 100
+
+
+def _resolve(future: "asyncio.Future[bool]", ok: bool) -> None:
+    if not future.done():
+        future.set_result(ok)
+
+
+class BackgroundTaskQueue:
+    """
+    In-process queue for side effects that should not delay the caller. Failed
+    tasks are retried with exponential backoff (if `_is_retryable` agrees) and
+    kept in `dead_letters` once attempts run out. Sync callables run in a
+    worker thread so they never block the event loop.
+
+    `enqueue` returns a future resolving to True once the task succeeded and
+    False when it was dead-lettered or still pending when `stop()` gave up.
+    The queue only lives in memory: anything that must survive a restart
+    needs its own persisted state.
+    """
+
+    def __init__(
+        self,
+        workers: int = TASK_QUEUE_WORKERS,
+        max_attempts: int = TASK_MAX_ATTEMPTS,
+        retry_base_seconds: float = TASK_RETRY_BASE_SECONDS,
+        drain_timeout: float = TASK_DRAIN_TIMEOUT_SECONDS,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.drain_timeout = drain_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        self._futures: Set[asyncio.Future] = set()
+        self.dead_letters: List[Dict[str, Any]] = []
+        self._stats = {"enqueued": 0, "succeeded": 0, "retried": 0, "dead": 0, "dropped": 0}
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def join(self) -> None:
+        """Wait until every queued task, including pending retries, has finished."""
+        if self._queue is not None:
+            await self._queue.join()
+            while self._retries:
+                await asyncio.gather(*list(self._retries), return_exceptions=True)
+                await self._queue.join()
+
+    async def stop(self) -> None:
+        """Drain for up to `drain_timeout` seconds, then cancel; unfinished tasks resolve to False."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "%s: %d tasks still pending after %.1fs, dropping them",
+                type(self).__name__, len(self._futures), self.drain_timeout,
+            )
+        pending = self._workers + list(self._retries)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        for future in list(self._futures):
+            if not future.done():
+                self._stats["dropped"] += 1
+                future.set_result(False)
+
+    def enqueue(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "asyncio.Future[bool]":
+        """Schedule fn(*args, **kwargs); returns immediately."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        self._stats["enqueued"] += 1
+        self._queue.put_nowait({"name": name, "fn": fn, "args": args, "kwargs": kwargs, "attempt": 1, "future": future})
+        return future
+
+    def _is_retryable(self, exc: Exception) -> bool:
+        return True
+
+    def _error_summary(self, exc: Exception) -> str:
+        """What logs and dead letters record about a failure."""
+        return str(exc)
+
+    async def _run(self, task: Dict[str, Any]) -> Any:
+        fn = task["fn"]
+        if asyncio.iscoroutinefunction(fn):
+            return await fn(*task["args"], **task["kwargs"])
+        return await asyncio.to_thread(fn, *task["args"], **task["kwargs"])
+
+    async def _retry_later(self, task: Dict[str, Any], delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._queue.put_nowait(task)
+
+    def _failed(self, task: Dict[str, Any], exc: Exception) -> None:
+        error = self._error_summary(exc)
+        if self._is_retryable(exc) and task["attempt"] < self.max_attempts:
+            delay = self.retry_base_seconds * 2 ** (task["attempt"] - 1)
+            logger.warning("Task %s failed (%s), retry %d in %.1fs", task["name"], error, task["attempt"], delay)
+            task["attempt"] += 1
+            self._stats["retried"] += 1
+            retry = asyncio.create_task(self._retry_later(task, delay))
+            self._retries.add(retry)
+            retry.add_done_callback(self._retries.discard)
+            return
+
+        logger.error("Task %s failed permanently after %d attempts: %s", task["name"], task["attempt"], error)
+        self._stats["dead"] += 1
+        self.dead_letters.append({
+            "name": task["name"], "error": error, "attempts": task["attempt"], "failed_at": time.time(),
+        })
+        del self.dead_letters[:-_DEAD_LETTERS_KEPT]
+        _resolve(task["future"], False)
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            task = await queue.get()
+            try:
+                await self._run(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed(task, e)
+            else:
+                self._stats["succeeded"] += 1
+                _resolve(task["future"], True)
+            finally:
+                queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "retrying": len(self._retries),
+            "workers": len(self._workers),
+            "dead_letters": self.dead_letters[-10:],
+        }
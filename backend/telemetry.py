@@ -0,0 +1,327 @@
+"""
+OpenTelemetry tracing and per-route latency histograms.
+
+- TracingMiddleware opens a server span per request, named after the route
+  template ("POST /api/interview/chat"), and records its duration in the
+  http.server.request.duration histogram (per route, method and status).
+- Child spans cover the model fallback loop (agent.py), repository calls,
+  audio uploads, PDF renders and SMTP sends. Handlers call tag_session(), so
+  every span of a request carries session.id.
+- pydantic-ai's own instrumentation adds a span per model request (tokens,
+  model name) under the fallback attempt spans. Prompts are left out unless
+  TELEMETRY_LLM_CONTENT=true.
+
+TELEMETRY_EXPORTER picks where spans and metrics go: none (default, no
+overhead), console, file (JSON lines, readable without a collector) or otlp
+(OTEL_EXPORTER_OTLP_* variables). Summarize a trace file with (from backend/):
+    python telemetry.py report traces.jsonl --route "POST /api/interview/chat"
+"""
+import argparse
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from opentelemetry import metrics, propagate, trace
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_EXPORTER = os.getenv("TELEMETRY_EXPORTER", "none").lower()
+TELEMETRY_ENABLED = TELEMETRY_EXPORTER != "none"
+TELEMETRY_TRACES_FILE = os.getenv("TELEMETRY_TRACES_FILE", "traces.jsonl")
+TELEMETRY_METRICS_FILE = os.getenv("TELEMETRY_METRICS_FILE", "metrics.jsonl")
+TELEMETRY_METRICS_INTERVAL_SECONDS = float(os.getenv("TELEMETRY_METRICS_INTERVAL_SECONDS", 60))
+TELEMETRY_LLM_CONTENT = os.getenv("TELEMETRY_LLM_CONTENT", "false").lower() == "true"
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "interviewflow-api")
+
+# Span attribute names shared by the instrumented modules
+SESSION_ID = "session.id"
+MODEL = "gen_ai.request.model"
+FALLBACK_DEPTH = "llm.fallback_depth"
+
+# Chat turns wait on the model, so the buckets reach well past the usual 10s
+_DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60]
+
+tracer = trace.get_tracer("interviewflow")
+_meter = metrics.get_meter("interviewflow")
+_request_duration = _meter.create_histogram(
+    "http.server.request.duration",
+    unit="s",
+    description="Duration of HTTP requests by route",
+    explicit_bucket_boundaries_advisory=_DURATION_BUCKETS,
+)
+
+_session_id: ContextVar[Optional[str]] = ContextVar("telemetry_session_id", default=None)
+_providers: List[Any] = []
+
+
+def _exporters():
+    if TELEMETRY_EXPORTER == "console":
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter(), ConsoleMetricExporter()
+    if TELEMETRY_EXPORTER == "file":
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        # One JSON document per line; spans and metrics are flushed from different threads
+        return (
+            ConsoleSpanExporter(
+                out=open(TELEMETRY_TRACES_FILE, "a", encoding="utf-8"),
+                formatter=lambda span: span.to_json(indent=None) + "\n",
+            ),
+            ConsoleMetricExporter(
+                out=open(TELEMETRY_METRICS_FILE, "a", encoding="utf-8"),
+                formatter=lambda data: data.to_json(indent=None) + "\n",
+            ),
+        )
+    if TELEMETRY_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(), OTLPMetricExporter()
+    raise RuntimeError(f"Unknown TELEMETRY_EXPORTER '{TELEMETRY_EXPORTER}'")
+
+
+def init_telemetry() -> None:
+    """Install the tracer and meter providers (once, before the app serves requests)."""
+    if not TELEMETRY_ENABLED or _providers:
+        return
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from pydantic_ai import Agent
+    from pydantic_ai.models.instrumented import InstrumentationSettings
+
+    span_exporter, metric_exporter = _exporters()
+    resource = Resource.create({"service.name": SERVICE_NAME})
+
+    # Sampling follows OTEL_TRACES_SAMPLER / OTEL_TRACES_SAMPLER_ARG
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(_SessionSpanProcessor())
+    tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    meter_provider = MeterProvider(
+        resource=resource,
+        metric_readers=[PeriodicExportingMetricReader(
+            metric_exporter, export_interval_millis=TELEMETRY_METRICS_INTERVAL_SECONDS * 1000
+        )],
+    )
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(meter_provider)
+    Agent.instrument_all(InstrumentationSettings(
+        tracer_provider=tracer_provider,
+        meter_provider=meter_provider,
+        include_content=TELEMETRY_LLM_CONTENT,
+        include_binary_content=False,
+    ))
+    _providers.extend([tracer_provider, meter_provider])
+    logger.info("Telemetry exporting to %s", TELEMETRY_EXPORTER)
+
+
+def shutdown_telemetry() -> None:
+    """Flush pending spans and metrics."""
+    for provider in _providers:
+        provider.shutdown()
+    _providers.clear()
+
+
+class _SessionSpanProcessor(SpanProcessor):
+    """Copies the request's session id onto every span started while handling it."""
+
+    def on_start(self, span, parent_context=None) -> None:
+        session_id = _session_id.get()
+        if session_id:
+            span.set_attribute(SESSION_ID, session_id)
+
+
+def tag_session(session_id: str) -> None:
+    """Tag the current request (and the spans it starts from now on) with its interview session."""
+    _session_id.set(session_id)
+    trace.get_current_span().set_attribute(SESSION_ID, session_id)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+class TracedRepository:
+    """Runs a repository's coroutine methods in client spans named db.<collection>.<method>."""
+
+    def __init__(self, repository, collection: str, system: str):
+        self._repository = repository
+        self._collection = collection
+        self._system = system
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._repository, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        span_name = f"db.{self._collection}.{name}"
+        attributes = {
+            "db.system.name": self._system,
+            "db.collection.name": self._collection,
+            "db.operation.name": name,
+        }
+
+        @functools.wraps(attr)
+        async def traced(*args, **kwargs):
+            with tracer.start_as_current_span(span_name, kind=SpanKind.CLIENT, attributes=attributes):
+                return await attr(*args, **kwargs)
+
+        # Cached on the instance, so __getattr__ only runs once per method
+        setattr(self, name, traced)
+        return traced
+
+
+class TracingMiddleware:
+    """Server span and duration histogram per request, labelled with the route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TELEMETRY_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        # Unset until the response starts: an exception before that ends up as a 500
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _session_id.set(None)
+        started = time.perf_counter()
+        try:
+            with tracer.start_as_current_span(
+                method,
+                context=propagate.extract(carrier),
+                kind=SpanKind.SERVER,
+                attributes={"http.request.method": method, "url.path": scope["path"]},
+            ) as current:
+                try:
+                    await self.app(scope, receive, send_with_status)
+                finally:
+                    route = scope.get("route")
+                    route_path = route.path if route is not None else None
+                    if route_path:
+                        current.update_name(f"{method} {route_path}")
+                        current.set_attribute("http.route", route_path)
+                    current.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        current.set_status(Status(StatusCode.ERROR))
+                    labels = {"http.request.method": method, "http.response.status_code": status_code}
+                    if route_path:
+                        labels["http.route"] = route_path
+                    _request_duration.record(time.perf_counter() - started, labels)
+        finally:
+            _session_id.reset(token)
+
+
+# --- Trace file report ---
+
+def _span_time(value: str) -> float:
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            raw = json.loads(line)
+            spans.append({
+                "name": raw["name"],
+                "trace_id": raw["context"]["trace_id"],
+                "span_id": raw["context"]["span_id"],
+                "parent_id": raw.get("parent_id"),
+                "duration": _span_time(raw["end_time"]) - _span_time(raw["start_time"]),
+            })
+    return spans
+
+
+def time_breakdown(spans: List[Dict[str, Any]], route: str) -> Dict[str, Any]:
+    """
+    Where the time of `route` requests goes: per span name, the average total
+    duration and the average self time (duration minus child spans) per request.
+    """
+    by_trace: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for item in spans:
+        by_trace[item["trace_id"]].append(item)
+
+    requests = 0
+    request_total = 0.0
+    totals: Dict[str, float] = defaultdict(float)
+    self_times: Dict[str, float] = defaultdict(float)
+    for trace_spans in by_trace.values():
+        roots = [item for item in trace_spans if item["name"] == route]
+        if not roots:
+            continue
+        requests += len(roots)
+        request_total += sum(root["duration"] for root in roots)
+        children: Dict[str, float] = defaultdict(float)
+        for item in trace_spans:
+            if item["parent_id"]:
+                children[item["parent_id"]] += item["duration"]
+        for item in trace_spans:
+            totals[item["name"]] += item["duration"]
+            self_times[item["name"]] += max(0.0, item["duration"] - children[item["span_id"]])
+
+    rows = sorted(self_times, key=self_times.get, reverse=True)
+    return {
+        "route": route,
+        "requests": requests,
+        "avg_ms": round(request_total / requests * 1000, 2) if requests else 0.0,
+        "spans": [
+            {
+                "name": name,
+                "avg_total_ms": round(totals[name] / requests * 1000, 2),
+                "avg_self_ms": round(self_times[name] / requests * 1000, 2),
+                "share": round(self_times[name] / request_total, 4) if request_total else 0.0,
+            }
+            for name in rows
+        ] if requests else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("path", nargs="?", default=TELEMETRY_TRACES_FILE)
+    parser.add_argument("--route", default="POST /api/interview/chat")
+    parser.add_argument("--json", action="store_true", help="Print the breakdown as JSON")
+    args = parser.parse_args()
+
+    breakdown = time_breakdown(load_spans(args.path), args.route)
+    if args.json:
+        print(json.dumps(breakdown, indent=2))
+        return
+    print(f"🔭 {breakdown['route']}: {breakdown['requests']} requests, avg {breakdown['avg_ms']} ms")
+    print(f"  {'span':<40} {'total ms':>10} {'self ms':>10} {'share':>7}")
+    for row in breakdown["spans"]:
+        print(f"  {row['name']:<40} {row['avg_total_ms']:>10.1f} {row['avg_self_ms']:>10.1f} {row['share']:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Shared fixtures. The app runs in-process on the memory data backend with the
+model calls faked, so no Firebase project, SMTP server or Mistral key is
+needed:
+
+    cd backend && python -m pytest -q
+"""
+import json
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+
+# Before anything imports main: its modules read their settings at import time
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+os.environ["DATA_BACKEND"] = "memory"
+os.environ["AUDIO_STORAGE_BACKEND"] = "local"
+os.environ.pop("LEADER_LEASE_BACKEND", None)  # follows DATA_BACKEND, as in a default deployment
+os.environ["PDF_POOL_WORKERS"] = "0"
+os.environ["TELEMETRY_EXPORTER"] = "none"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+FEEDBACK = {
+    "score": 81, "communication_score": 80, "technical_score": 70, "problem_solving_score": 75,
+    "culture_fit_score": 90, "summary": "Clear answers.", "strengths": ["Structure"], "improvements": ["Depth"],
+}
+ANSWER = "I designed and migrated the billing service to a partitioned queue and measured the latency gains"
+
+
+class FakeResult:
+    def __init__(self, output: str):
+        self.output = output
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Replaces the model fallback chains; `llm.feedback` is the JSON the feedback model returns."""
+    import main
+
+    class FakeModels:
+        feedback = FEEDBACK
+        feedback_calls = 0
+
+        async def interview(self, prompt, deps=None):
+            return FakeResult("Tell me about a project you are proud of?")
+
+        async def feedback_run(self, prompt):
+            self.feedback_calls += 1
+            return FakeResult(json.dumps(self.feedback))
+
+    models = FakeModels()
+    monkeypatch.setattr(main, "run_interview_with_fallback", models.interview)
+    monkeypatch.setattr(main, "run_feedback_with_fallback", models.feedback_run)
+    return models
+
+
+@pytest.fixture
+async def client(llm, tmp_path, monkeypatch):
+    """httpx client for the app with startup/shutdown run around the test (fresh memory backend)."""
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    main.sessions.clear()
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            yield http
+
+
+@pytest.fixture
+async def user(client):
+    """A registered user: id, email and auth headers. Emails are unique, so per-process caches never mix tests."""
+    from main import get_repositories
+
+    email = f"candidate-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post(
+        "/api/auth/register", json={"email": email, "password": "correct-horse", "full_name": "Candidate"}
+    )
+    assert response.status_code == 200
+    record = await get_repositories().users.get_by_email(email)
+    return SimpleNamespace(
+        id=record.id, email=email, headers={"Authorization": f"Bearer {response.json()['access_token']}"}
+    )
+
+
+@pytest.fixture
+def auth_headers(user):
+    return user.headers
+
+
+async def start_interview(client, headers=None, answer: str = ANSWER, **config) -> str:
+    """Start an interview and answer one question; returns the session id."""
+    config = {"role": "Backend Engineer", **config}
+    response = await client.post("/api/interview/start", json={"config": config}, headers=headers or {})
+    assert response.status_code == 200
+    session_id = response.json()["session_id"]
+    response = await client.post("/api/interview/chat", json={"session_id": session_id, "content": answer})
+    assert response.status_code == 200
+    return session_id
@@ -0,0 +1,83 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import FEEDBACK, FakeResult, start_interview
+from models import Interview
+from repositories import memory_repositories, sqlite_repositories
+from user_stats import empty_stats
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def repos(request, tmp_path):
+    repos = memory_repositories() if request.param == "memory" else await sqlite_repositories(str(tmp_path / "data.db"))
+    yield repos
+    await repos.close()
+
+
+async def test_write_feedback_only_counts_the_first_write(repos):
+    await repos.stats.put("u1", empty_stats())
+    interview_id = await repos.interviews.create(
+        Interview(session_id="s1", user_id="u1", role="Engineer", started_at=datetime(2026, 1, 1))
+    )
+
+    assert await repos.interviews.write_feedback(interview_id, {**FEEDBACK, "score": 80}) is True
+    assert await repos.interviews.write_feedback(interview_id, {**FEEDBACK, "score": 20}) is False
+
+    interview = await repos.interviews.get_by_session("s1")
+    stats = await repos.stats.get("u1")
+    assert interview.score == 80
+    assert stats["completed_interviews"] == 1
+    assert stats["score_sum"] == 80
+
+
+async def test_concurrent_feedback_requests_return_the_stored_feedback(client, auth_headers, monkeypatch):
+    import main
+
+    session_id = await start_interview(client, auth_headers)
+    scores = iter([81, 35])
+
+    async def slow_feedback(prompt):
+        # Both requests are past the "already has a score" check before either writes
+        result = FakeResult(json.dumps({**FEEDBACK, "score": next(scores)}))
+        await asyncio.sleep(0.05)
+        return result
+
+    monkeypatch.setattr(main, "run_feedback_with_fallback", slow_feedback)
+    first, second = await asyncio.gather(*[
+        client.post("/api/interview/feedback", json={"session_id": session_id}) for _ in range(2)
+    ])
+
+    stored = (await client.get(f"/api/interview/{session_id}/feedback")).json()
+    assert first.json()["score"] == second.json()["score"] == stored["score"]
+    stats = (await client.get("/api/dashboard/stats", headers=auth_headers)).json()
+    assert stats["completed_interviews"] == 1
+
+
+async def test_stats_rebuild_retries_when_feedback_lands_meanwhile(repos):
+    from user_stats import recompute_user_stats
+
+    interview_id = await repos.interviews.create(
+        Interview(session_id="s1", user_id="u1", role="Engineer", started_at=datetime(2026, 1, 1))
+    )
+    scans = []
+    iter_for_user = repos.interviews.iter_for_user
+
+    async def racing_iter_for_user(user_id, fields):
+        async for interview in iter_for_user(user_id, fields):
+            yield interview
+        scans.append(user_id)
+        if len(scans) == 1:
+            # Scored after the rebuild read the interview unscored
+            await repos.interviews.write_feedback(interview_id, {**FEEDBACK, "score": 70})
+
+    repos.interviews.iter_for_user = racing_iter_for_user
+    stats = await recompute_user_stats(repos, "u1")
+
+    assert len(scans) == 2
+    assert stats["completed_interviews"] == 1
+    assert (await repos.stats.get("u1"))["score_sum"] == 70
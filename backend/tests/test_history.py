@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Interview
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_interviews(user_id: str, count: int, started_at=None):
+    from main import get_repositories
+
+    base = datetime(2026, 3, 1)
+    for index in range(count):
+        await get_repositories().interviews.create(Interview(
+            session_id=f"{user_id}-{index}", user_id=user_id, role=f"Role {index}",
+            started_at=started_at or base + timedelta(minutes=index),
+        ))
+
+
+async def read_all_pages(client, headers, limit: int, **params):
+    pages, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        body = (await client.get("/api/dashboard/history", params=query, headers=headers)).json()
+        pages.append([item["role"] for item in body["items"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def test_pages_cover_every_interview_once_newest_first(client, user):
+    await add_interviews(user.id, 7)
+
+    pages = await read_all_pages(client, user.headers, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == [f"Role {index}" for index in reversed(range(7))]
+
+
+async def test_identical_start_times_are_not_skipped_or_repeated(client, user):
+    await add_interviews(user.id, 5, started_at=datetime(2026, 3, 1, 12))
+
+    rows = sum(await read_all_pages(client, user.headers, limit=2), [])
+
+    assert sorted(rows) == [f"Role {index}" for index in range(5)]
+
+
+async def test_score_filter_pages_past_non_matching_rows(client, user):
+    from main import get_repositories
+
+    await add_interviews(user.id, 6)
+    interviews = get_repositories().interviews
+    for index in (1, 4):
+        interview = await interviews.get_by_session(f"{user.id}-{index}")
+        await interviews.update(interview.id, {"score": 90})
+
+    assert await read_all_pages(client, user.headers, limit=1, min_score=50) == [["Role 4"], ["Role 1"]]
+
+
+async def test_cursor_is_rejected_for_other_filters(client, user):
+    await add_interviews(user.id, 3)
+    first = (await client.get("/api/dashboard/history", params={"limit": 1}, headers=user.headers)).json()
+
+    response = await client.get(
+        "/api/dashboard/history", params={"limit": 1, "company": "google", "cursor": first["next_cursor"]},
+        headers=user.headers,
+    )
+    assert response.status_code == 400
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from leader import LeaderElector, MemoryLeaseStore, SQLiteLeaseStore, get_lease_store
+
+pytestmark = pytest.mark.anyio
+
+TTL = 0.3
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryLeaseStore() if request.param == "memory" else SQLiteLeaseStore(str(tmp_path / "leases.db"))
+
+
+async def wait_for(condition, timeout: float = 3.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_one_leader_and_takeover_after_expiry(store):
+    first, second = LeaderElector("jobs", ttl=TTL), LeaderElector("jobs", ttl=TTL)
+    first.start(store)
+    await wait_for(lambda: first.is_leader)
+    second.start(store)
+    await asyncio.sleep(TTL)
+    assert not second.is_leader
+
+    # The leader stalls (stops renewing) without releasing the lease
+    first._task.cancel()
+    await asyncio.gather(first._task, return_exceptions=True)
+    first._task = None
+    await wait_for(lambda: second.is_leader)
+    assert store.current("jobs")["holder"] == second.holder_id
+
+    await second.stop()
+    assert store.current("jobs") is None
+
+
+async def test_stop_hands_the_lease_over_right_away(store):
+    first, second = LeaderElector("jobs", ttl=30), LeaderElector("jobs", ttl=30)
+    first.start(store)
+    await wait_for(lambda: first.is_leader)
+    await first.stop()
+
+    assert store.try_acquire("jobs", second.holder_id, 30)["holder"] == second.holder_id
+
+
+async def test_fence_stops_a_job_that_lost_the_lease(store):
+    elector = LeaderElector("jobs", ttl=TTL)
+    elector.start(store)
+    await wait_for(lambda: elector.is_leader)
+    pages = []
+
+    async def job(fence):
+        for page in range(3):
+            await fence()
+            pages.append(page)
+            if page == 0:
+                # Another worker takes over while the job is still running
+                store.release("jobs", elector.holder_id)
+                store.try_acquire("jobs", "other-worker", 30)
+
+    await elector.run_job("reminders", job)
+
+    assert pages == [0]
+    assert elector.jobs["reminders"]["fenced"] == 1
+    assert elector.jobs["reminders"]["failures"] == 0
+    assert not elector.is_leader
+    await elector.stop()
+
+
+async def test_run_job_is_a_no_op_outside_the_leader(store):
+    store.try_acquire("jobs", "other-worker", 30)
+    elector = LeaderElector("jobs", ttl=TTL)
+    elector.start(store)
+    await asyncio.sleep(0.05)
+    calls = []
+
+    async def job(fence):
+        calls.append(1)
+
+    await elector.run_job("reminders", job)
+    assert calls == []
+    await elector.stop()
+
+
+def test_firestore_lease_without_firestore_is_refused(monkeypatch):
+    monkeypatch.setattr("leader.LEADER_LEASE_BACKEND", "firestore")
+    with pytest.raises(RuntimeError):
+        get_lease_store(None)
+
+
+async def test_app_starts_with_the_lease_on_the_data_backend(client):
+    import main
+
+    await wait_for(lambda: main.scheduler_leader.is_leader)
+    assert isinstance(main.scheduler_leader.store, MemoryLeaseStore)
+    response = await client.get("/api/metrics")
+    assert response.json()["scheduler"]["is_leader"]
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+import loop_monitor
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_monitor_is_off_by_default(client):
+    assert not loop_monitor.LOOP_MONITOR_ENABLED
+    assert not loop_monitor.loop_monitor.started
+    assert asyncio.events.Handle._run.__name__ == "_run"
+
+    response = await client.get("/api/metrics")
+    assert response.json()["event_loop"]["enabled"] is False
+
+
+async def test_monitor_patches_and_restores_handle_run():
+    original = asyncio.events.Handle._run
+    monitor = loop_monitor.LoopMonitor()
+    monitor.start()
+    try:
+        assert monitor.started
+        assert asyncio.events.Handle._run is not original
+        await asyncio.sleep(0)
+    finally:
+        await monitor.stop()
+    assert asyncio.events.Handle._run is original
@@ -0,0 +1,101 @@
+import asyncio
+from email.message import EmailMessage
+
+import aiosmtplib
+import pytest
+
+from mailer import MailQueue, PermanentMailError
+
+pytestmark = pytest.mark.anyio
+
+
+def message(subject: str = "Practice reminder") -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "noreply@example.com", "candidate@example.com", subject
+    msg.set_content("Time to practice.")
+    return msg
+
+
+class FlakyServer:
+    """deliver() stand-in that raises the queued errors first, then accepts."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.delivered = []
+
+    async def deliver(self, msg) -> None:
+        if self.errors:
+            raise self.errors.pop(0)
+        self.delivered.append(msg["Subject"])
+
+
+def mail_queue(server: FlakyServer, max_attempts: int = 3) -> MailQueue:
+    queue = MailQueue(server.deliver, concurrency=2, rate_per_minute=0, max_attempts=max_attempts)
+    queue.retry_base_seconds = 0.01
+    return queue
+
+
+async def test_transient_failures_are_retried_until_sent():
+    server = FlakyServer(aiosmtplib.SMTPResponseException(421, "try again"), ConnectionResetError())
+    queue = mail_queue(server)
+
+    assert await queue.enqueue_message(message()) is True
+    assert server.delivered == ["Practice reminder"]
+    assert queue.stats()["retried"] == 2
+    await queue.stop()
+
+
+async def test_permanent_failure_goes_straight_to_dead_letters():
+    server = FlakyServer(aiosmtplib.SMTPResponseException(550, "no such user candidate@example.com"))
+    queue = mail_queue(server)
+
+    assert await queue.enqueue_message(message()) is False
+    stats = queue.stats()
+    assert stats["retried"] == 0
+    assert stats["dead"] == 1
+    [letter] = stats["dead_letters"]
+    assert letter["attempts"] == 1
+    assert letter["error"] == "SMTPResponseException 550"
+    # Dead letters are shown on /api/metrics, so no recipient may leak into them
+    assert "candidate@example.com" not in str(letter)
+    await queue.stop()
+
+
+async def test_attempts_run_out_on_repeated_transient_failures():
+    server = FlakyServer(*[ConnectionResetError()] * 3)
+    queue = mail_queue(server, max_attempts=3)
+
+    assert await queue.enqueue_message(message()) is False
+    assert queue.stats()["dead_letters"][0]["attempts"] == 3
+    assert server.delivered == []
+    await queue.stop()
+
+
+async def test_permanent_mail_error_is_not_retried():
+    queue = mail_queue(FlakyServer(PermanentMailError("rejected")))
+
+    assert await queue.enqueue_message(message()) is False
+    assert queue.stats()["retried"] == 0
+    await queue.stop()
+
+
+async def test_stop_drains_queued_mail():
+    server = FlakyServer()
+    queue = mail_queue(server)
+    sent = [queue.enqueue_message(message(f"Reminder {index}")) for index in range(3)]
+
+    await queue.stop()
+
+    assert await asyncio.gather(*sent) == [True, True, True]
+    assert sorted(server.delivered) == ["Reminder 0", "Reminder 1", "Reminder 2"]
+
+
+async def test_stop_gives_up_on_mail_still_retrying_after_the_drain_timeout():
+    stuck = mail_queue(FlakyServer(*[ConnectionResetError()] * 10), max_attempts=10)
+    stuck.retry_base_seconds = 60
+    stuck.drain_timeout = 0.05
+    pending = stuck.enqueue_message(message())
+    await asyncio.sleep(0.01)
+    await stuck.stop()
+    assert await pending is False
+    assert stuck.stats()["dropped"] == 1
@@ -0,0 +1,61 @@
+import pytest
+
+import auth
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def firebase_auth(client, monkeypatch):
+    """Memory backend posing as Firestore, with the Auth import faked; collects provisioned uids."""
+    from main import get_repositories
+
+    provisioned, failures = [], []
+
+    def provision(uid, email, password_hash, full_name):
+        if failures:
+            raise failures.pop(0)
+        provisioned.append(uid)
+
+    monkeypatch.setattr(get_repositories(), "name", "firestore")
+    monkeypatch.setattr(auth, "provision_firebase_auth_user", provision)
+    monkeypatch.setattr(auth.firebase_auth_queue, "retry_base_seconds", 0.01)
+    return provisioned, failures
+
+
+async def register(client, email: str):
+    return await client.post("/api/auth/register", json={"email": email, "password": "correct-horse"})
+
+
+async def test_auth_record_is_created_after_the_user_is_stored(client, firebase_auth):
+    from main import get_repositories
+
+    provisioned, failures = firebase_auth
+    failures.append(ConnectionError("Auth backend unavailable"))
+
+    response = await register(client, "new@example.com")
+    assert response.status_code == 200
+    user = await get_repositories().users.get_by_email("new@example.com")
+    assert user.firebase_auth_pending
+
+    await auth.firebase_auth_queue.join()
+    assert provisioned == [user.id]
+    assert not (await get_repositories().users.get_by_email("new@example.com")).firebase_auth_pending
+
+
+async def test_duplicate_registration_creates_no_auth_record(client, firebase_auth):
+    provisioned, _ = firebase_auth
+    assert (await register(client, "twice@example.com")).status_code == 200
+    await auth.firebase_auth_queue.join()
+
+    assert (await register(client, "Twice@example.com")).status_code == 400
+    await auth.firebase_auth_queue.join()
+    assert len(provisioned) == 1
+
+
+async def test_other_backends_have_no_auth_record(client, monkeypatch):
+    from main import get_repositories
+
+    monkeypatch.setattr(auth, "provision_firebase_auth_user", lambda *args: pytest.fail("provisioned"))
+    assert (await register(client, "local@example.com")).status_code == 200
+    assert not (await get_repositories().users.get_by_email("local@example.com")).firebase_auth_pending
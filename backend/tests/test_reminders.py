@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import reminders
+from models import User, UserSettings
+from repositories import memory_repositories, sqlite_repositories
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeMail:
+    configured = True
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    async def queue_reminder(self, email, name=None) -> bool:
+        self.sent.append(email)
+        return email not in self.failing
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def repos(request, tmp_path):
+    repos = memory_repositories() if request.param == "memory" else await sqlite_repositories(str(tmp_path / "data.db"))
+    yield repos
+    await repos.close()
+
+
+async def add_user(repos, name: str, next_reminder_at, frequency: str = "weekly") -> None:
+    user = User(id=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+    settings = UserSettings(
+        user_id=name, email_reminders=next_reminder_at is not None,
+        reminder_frequency=frequency, next_reminder_at=next_reminder_at,
+    )
+    await repos.users.create(user, settings, {})
+
+
+async def test_due_reminders_are_sent_once_on_every_backend(repos, monkeypatch):
+    monkeypatch.setattr(reminders, "REMINDER_PAGE_SIZE", 2)
+    now = datetime.utcnow()
+    for index in range(3):
+        await add_user(repos, f"due{index}", now - timedelta(hours=index + 1), frequency="daily")
+    await add_user(repos, "later", now + timedelta(days=1))
+    await add_user(repos, "off", None)
+    await add_user(repos, "bounced", now - timedelta(hours=5))
+    await repos.settings.merge("orphan", {"next_reminder_at": now - timedelta(days=1)})
+    mail = FakeMail(failing={"bounced@example.com"})
+    fences = []
+
+    async def fence():
+        fences.append(1)
+
+    result = await reminders.dispatch_due_reminders(repos, mail, fence=fence)
+
+    assert result["sent"] == 3 and result["failed"] == 1
+    assert sorted(mail.sent) == ["bounced@example.com", "due0@example.com", "due1@example.com", "due2@example.com"]
+    assert len(fences) == result["pages"]
+    sent = await repos.settings.get("due0")
+    assert sent.last_reminder_sent is not None
+    assert sent.next_reminder_at > now + timedelta(hours=23)
+    assert (await repos.settings.get("bounced")).next_reminder_at > now
+    assert (await repos.settings.get("orphan")).next_reminder_at is None
+
+    again = await reminders.dispatch_due_reminders(repos, FakeMail())
+    assert again["sent"] == 0
+
+
+async def test_sqlite_reads_do_not_see_uncommitted_writes(tmp_path):
+    repos = await sqlite_repositories(str(tmp_path / "data.db"))
+    db = repos.settings.db
+    try:
+        await repos.settings.merge("u1", {"theme": "dark"})
+        async with db.transaction() as tx:
+            await tx.execute(
+                "UPDATE user_settings SET data = json_set(data, '$.theme', 'light') WHERE user_id = ?", ("u1",)
+            )
+            assert (await repos.settings.get("u1")).theme == "dark"
+        assert (await repos.settings.get("u1")).theme == "light"
+    finally:
+        await repos.close()
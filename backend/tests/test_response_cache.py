@@ -0,0 +1,65 @@
+import pytest
+
+from conftest import start_interview
+from response_cache import ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_unchanged_settings_revalidate_with_304(client, user):
+    first = await client.get("/api/settings", headers=user.headers)
+    etag = first.headers["etag"]
+
+    again = await client.get("/api/settings", headers={**user.headers, "If-None-Match": etag})
+
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    assert "no-cache" in again.headers["cache-control"]
+
+
+async def test_a_write_changes_the_etag(client, user):
+    etag = (await client.get("/api/settings", headers=user.headers)).headers["etag"]
+
+    await client.put("/api/settings", json={"theme": "light"}, headers=user.headers)
+    response = await client.get("/api/settings", headers={**user.headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["theme"] == "light"
+    assert response.headers["etag"] != etag
+
+
+async def test_feedback_invalidates_dashboard_stats(client, user):
+    etag = (await client.get("/api/dashboard/stats", headers=user.headers)).headers["etag"]
+    session_id = await start_interview(client, user.headers)
+
+    await client.post("/api/interview/feedback", json={"session_id": session_id})
+    response = await client.get("/api/dashboard/stats", headers={**user.headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["completed_interviews"] == 1
+
+
+async def test_weak_and_listed_etags_match(client, user):
+    etag = (await client.get("/api/settings", headers=user.headers)).headers["etag"]
+
+    response = await client.get("/api/settings", headers={**user.headers, "If-None-Match": f'"other", W/{etag}'})
+
+    assert response.status_code == 304
+
+
+def test_scope_versions_are_bounded():
+    cache = ResponseCache(maxsize=8, ttl=30)
+    for index in range(100):
+        cache.bump(f"user:{index}:stats")
+        cache.version(f"session:{index}")
+
+    assert cache.stats()["scopes"] <= 8
+
+
+def test_an_evicted_version_does_not_reach_old_entries():
+    cache = ResponseCache(maxsize=1, ttl=30)
+    before = cache.version("user:a:stats")
+    cache.version("user:b:stats")  # evicts user:a
+
+    assert cache.version("user:a:stats") != before
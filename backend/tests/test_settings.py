@@ -0,0 +1,38 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def settings_reads(client, monkeypatch):
+    from repositories import get_repositories
+
+    settings = get_repositories().settings
+    reads = []
+    get = settings.get
+
+    async def counting_get(user_id):
+        reads.append(user_id)
+        return await get(user_id)
+
+    monkeypatch.setattr(settings, "get", counting_get)
+    return reads
+
+
+async def test_plain_update_writes_without_reading(client, user, settings_reads):
+    assert (await client.get("/api/settings", headers=user.headers)).json()["theme"] != "light"
+    settings_reads.clear()
+
+    response = await client.put("/api/settings", json={"theme": "light"}, headers=user.headers)
+    assert response.status_code == 200
+    assert settings_reads == []
+    assert (await client.get("/api/settings", headers=user.headers)).json()["theme"] == "light"
+
+
+async def test_reminder_update_reads_the_stored_settings(client, user, settings_reads):
+    response = await client.put(
+        "/api/settings", json={"email_reminders": True, "reminder_frequency": "daily"}, headers=user.headers
+    )
+    assert response.status_code == 200
+    assert settings_reads == [user.id]
+    assert (await client.get("/api/settings", headers=user.headers)).json()["email_reminders"] is True
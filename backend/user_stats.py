@@ -0,0 +1,162 @@
+"""
+user_stats/{user_id}: running dashboard aggregates, so /api/dashboard/stats
+is a single document read instead of a scan of every interview.
+
+- total_interviews is incremented when an interview starts.
+- Score sums, the completed count, best_score and the last few scores
+  (recent_scores, oldest first) are updated in the same transaction that
+  writes an interview's feedback.
+- Documents without `initialized_at` (users created before this existed)
+  are rebuilt from their interviews on first read. The rebuild is stored
+  only if the document did not change while the interviews were read (a
+  feedback write also touches `updated_at` of stats it does not count),
+  and is retried otherwise.
+
+Repair (from backend/):
+    python user_stats.py recompute              # every user
+    python user_stats.py recompute --user UID
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+USER_STATS_COLLECTION = "user_stats"
+RECOMPUTE_ATTEMPTS = 5
+RECENT_SCORES_SIZE = 5
+CATEGORY_FIELDS = {
+    "communication": "communication_score",
+    "technical": "technical_score",
+    "problem_solving": "problem_solving_score",
+    "culture_fit": "culture_fit_score",
+}
+SCORE_FIELDS = ["score", *CATEGORY_FIELDS.values()]
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {
+        "total_interviews": 0,
+        "completed_interviews": 0,
+        "score_sum": 0,
+        "best_score": 0,
+        "recent_scores": [],
+        **{f"{field}_sum": 0 for field in CATEGORY_FIELDS.values()},
+        "initialized_at": datetime.utcnow(),
+    }
+
+
+def apply_feedback(stats: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Stats after one more completed interview with the given scores."""
+    score = result.get("score") or 0
+    updated = dict(stats)
+    updated["completed_interviews"] = stats.get("completed_interviews", 0) + 1
+    updated["score_sum"] = stats.get("score_sum", 0) + score
+    updated["best_score"] = max(stats.get("best_score", 0), score)
+    updated["recent_scores"] = (list(stats.get("recent_scores", [])) + [score])[-RECENT_SCORES_SIZE:]
+    for field in CATEGORY_FIELDS.values():
+        updated[f"{field}_sum"] = stats.get(f"{field}_sum", 0) + (result.get(field) or 0)
+    updated["updated_at"] = datetime.utcnow()
+    return updated
+
+
+def stats_response(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Dashboard payload (same shape as the old scan-based endpoint)."""
+    completed = stats.get("completed_interviews", 0)
+    if not completed:
+        return {
+            "total_interviews": stats.get("total_interviews", 0),
+            "average_score": 0,
+            "best_score": 0,
+            "recent_trend": "neutral",
+            "category_averages": {}
+        }
+
+    recent = stats.get("recent_scores", [])
+    if len(recent) >= 2:
+        half = len(recent) // 2
+        first_half_avg = sum(recent[:half]) / half
+        second_half_avg = sum(recent[half:]) / (len(recent) - half)
+        trend = "improving" if second_half_avg > first_half_avg else "declining" if second_half_avg < first_half_avg else "stable"
+    else:
+        trend = "neutral"
+
+    return {
+        "total_interviews": stats.get("total_interviews", 0),
+        "completed_interviews": completed,
+        "average_score": round(stats.get("score_sum", 0) / completed, 1),
+        "best_score": stats.get("best_score", 0),
+        "recent_trend": trend,
+        "category_averages": {
+            name: round(stats.get(f"{field}_sum", 0) / completed, 1)
+            for name, field in CATEGORY_FIELDS.items()
+        }
+    }
+
+
+async def _stats_from_interviews(repos, user_id: str) -> Dict[str, Any]:
+    interviews = [i async for i in repos.interviews.iter_for_user(user_id, [*SCORE_FIELDS, "started_at"])]
+    completed = sorted(
+        (i for i in interviews if i.get("score") is not None),
+        key=lambda i: (i.get("started_at") is not None, i.get("started_at") or 0),
+    )
+
+    stats = empty_stats()
+    for interview in completed:
+        stats = apply_feedback(stats, interview)
+    stats["total_interviews"] = len(interviews)
+    return stats
+
+
+async def recompute_user_stats(repos, user_id: str) -> Dict[str, Any]:
+    """
+    Rebuild a user's stats from their interviews and store them, unless an
+    interview was created or scored meanwhile; then read everything again.
+    """
+    for _ in range(RECOMPUTE_ATTEMPTS):
+        before = await repos.stats.get(user_id)
+        stats = await _stats_from_interviews(repos, user_id)
+        if await repos.stats.replace_if_unchanged(user_id, before, stats):
+            return stats
+    # Still correct as of the last read; the next load rebuilds it again
+    logger.warning("Stats for %s kept changing during %d rebuilds, not stored", user_id, RECOMPUTE_ATTEMPTS)
+    return stats
+
+
+async def load_user_stats(repos, user_id: str) -> Dict[str, Any]:
+    stats = await repos.stats.get(user_id)
+    if stats and stats.get("initialized_at"):
+        return stats
+    return await recompute_user_stats(repos, user_id)
+
+
+async def _recompute(user_id: Optional[str]) -> int:
+    from db import init_db
+    from repositories import close_repositories, get_repositories, init_repositories
+
+    await init_db()
+    await init_repositories()
+    try:
+        repos = get_repositories()
+        user_ids = [user_id] if user_id else await repos.users.list_ids()
+        for uid in user_ids:
+            await recompute_user_stats(repos, uid)
+        return len(user_ids)
+    finally:
+        await close_repositories()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["recompute"])
+    parser.add_argument("--user", help="only this user id")
+    args = parser.parse_args()
+
+    count = asyncio.run(_recompute(args.user))
+    print(f"✅ Recomputed stats for {count} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -200,12 +200,29 @@ export const uploadAudio = async (sessionId: string, audioBlob: Blob) => {
 };
 
 export const getFeedback = async (sessionId: string): Promise<FeedbackData> => {
+    // Stored reports come from a GET the browser can revalidate with its ETag;
+    // only generate (POST) when there is none yet.
+    try {
+        const response = await api.get(`/api/interview/${sessionId}/feedback`);
+        return response.data;
+    } catch (error) {
+        if (!axios.isAxiosError(error) || error.response?.status !== 404) {
+            throw error;
+        }
+    }
     const response = await api.post('/api/interview/feedback', { session_id: sessionId });
     return response.data;
 };
 
-export const exportPDF = async (sessionId: string): Promise<Blob> => {
-    const response = await api.post('/api/interview/export-pdf', { session_id: sessionId }, {
+export const exportPDF = async (sessionId: string, fullTranscript: boolean = false): Promise<Blob> => {
+    const response = await api.post('/api/interview/export-pdf', { session_id: sessionId, full_transcript: fullTranscript }, {
+        responseType: 'blob'
+    });
+    return response.data;
+};
+
+export const exportAllPDFs = async (): Promise<Blob> => {
+    const response = await api.get('/api/interview/export-all', {
         responseType: 'blob'
     });
     return response.data;
@@ -217,6 +234,29 @@ export const getInterviews = async (limit: number = 20): Promise<InterviewRecord
     return response.data;
 };
 
+export interface InterviewHistoryFilters {
+    company?: string;
+    interview_type?: string;
+    min_score?: number;
+    max_score?: number;
+}
+
+export interface InterviewHistoryPage {
+    items: InterviewRecord[];
+    next_cursor: string | null;
+}
+
+export const getInterviewHistory = async (
+    cursor?: string | null,
+    filters: InterviewHistoryFilters = {},
+    limit: number = 20
+): Promise<InterviewHistoryPage> => {
+    const response = await api.get('/api/dashboard/history', {
+        params: { limit, cursor: cursor || undefined, ...filters }
+    });
+    return response.data;
+};
+
 export const getDashboardStats = async (): Promise<DashboardStats> => {
     const response = await api.get('/api/dashboard/stats');
     return response.data;